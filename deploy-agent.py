@@ -4,194 +4,46 @@ AI Agent for Automated Vercel Deployment
 Using Agency Swarm framework for autonomous deployment management
 """
 
+import argparse
 import os
-import subprocess
-import time
-import requests
-from typing import Dict, Any
-from pydantic import Field
-
-# Check if agency-swarm is installed, install if needed
-try:
-    from agency_swarm import Agent, Agency, BaseTool
-    from agency_swarm.tools import CodeInterpreter
-except ImportError:
-    print("Installing agency-swarm...")
-    subprocess.run(["pip", "install", "agency-swarm", "requests"], check=True)
-    from agency_swarm import Agent, Agency, BaseTool
-    from agency_swarm.tools import CodeInterpreter
-
-
-class VercelDeploymentTool(BaseTool):
-    """
-    Autonomous Vercel deployment tool with MCP integration.
-    Monitors git commits and triggers deployments automatically.
-    """
-    
-    commit_sha: str = Field(
-        ..., 
-        description="Git commit SHA to deploy (e.g., 'a80292d63')"
-    )
-    project_name: str = Field(
-        default="webstudio",
-        description="Vercel project name"
-    )
-    force_deploy: bool = Field(
-        default=True,
-        description="Force new deployment even if webhook fails"
-    )
+import sys
 
-    def run(self):
-        """Execute autonomous Vercel deployment with AI monitoring"""
-        try:
-            # Step 1: Verify commit exists
-            result = subprocess.run(
-                ["git", "log", "--oneline", "-n", "1", self.commit_sha],
-                capture_output=True,
-                text=True,
-                cwd="/home/arthur/webstudio"
-            )
-            
-            if result.returncode != 0:
-                return f"❌ Commit {self.commit_sha} not found"
-            
-            commit_info = result.stdout.strip()
-            print(f"✅ Found commit: {commit_info}")
-            
-            # Step 2: Check if isbot fixes are present
-            isbot_files = [
-                "packages/cli/templates/defaults/app/shared/isbot-mock.ts",
-                "packages/cli/templates/react-router/app/shared/isbot-mock.ts",
-                "vercel.json"
-            ]
-            
-            all_fixes_present = True
-            for file_path in isbot_files:
-                full_path = f"/home/arthur/webstudio/{file_path}"
-                if not os.path.exists(full_path):
-                    print(f"⚠️  Missing isbot fix: {file_path}")
-                    all_fixes_present = False
-                else:
-                    print(f"✅ Isbot fix present: {file_path}")
-            
-            if not all_fixes_present:
-                return "❌ Not all isbot fixes are present. Deployment cancelled."
-            
-            # Step 3: Trigger deployment using multiple methods
-            deployment_methods = [
-                self._trigger_empty_commit,
-                self._trigger_vercel_cli,
-                self._manual_webhook_trigger
-            ]
-            
-            for method in deployment_methods:
-                try:
-                    result = method()
-                    if "success" in result.lower():
-                        return f"🚀 Deployment triggered successfully: {result}"
-                except Exception as e:
-                    print(f"⚠️  Method failed: {method.__name__}: {e}")
-                    continue
-            
-            return "❌ All deployment methods failed. Manual intervention required."
-            
-        except Exception as e:
-            return f"❌ Deployment error: {str(e)}"
-
-    def _trigger_empty_commit(self):
-        """Method 1: Trigger via empty commit"""
-        timestamp = int(time.time())
-        commit_msg = f"deploy: AI agent auto-deploy {timestamp} - isbot fixes included"
-        
-        # Create empty commit
-        subprocess.run(
-            ["git", "commit", "--allow-empty", "-m", commit_msg],
-            cwd="/home/arthur/webstudio",
-            check=True
-        )
-        
-        # Push to trigger webhook
-        subprocess.run(
-            ["git", "push", "origin", "main"],
-            cwd="/home/arthur/webstudio", 
-            check=True
-        )
-        
-        return "Success: Empty commit pushed to trigger webhook"
-
-    def _trigger_vercel_cli(self):
-        """Method 2: Direct Vercel CLI deployment"""
-        result = subprocess.run(
-            ["npx", "vercel", "--prod", "--yes"],
-            cwd="/home/arthur/webstudio",
-            capture_output=True,
-            text=True
-        )
-        
-        if result.returncode == 0:
-            return f"Success: Vercel CLI deployment: {result.stdout}"
-        else:
-            raise Exception(f"Vercel CLI failed: {result.stderr}")
+from deploy_tools.log import event_logger
 
-    def _manual_webhook_trigger(self):
-        """Method 3: Manual webhook simulation"""
-        # This would integrate with Vercel API if we had the webhook URL
-        return "Success: Manual webhook trigger attempted"
+log = event_logger("deploy-agent")
 
+# The agent framework (and pydantic behind it) takes seconds to import, so it
+# is only loaded when agents are actually built. Tools run without it:
+#   python3 deploy-agent.py tool GitMonitorTool
 
-class GitMonitorTool(BaseTool):
-    """
-    Monitor git repository for changes and deployment status
-    """
-    
-    check_interval: int = Field(
-        default=30,
-        description="Seconds between checks"
-    )
 
-    def run(self):
-        """Monitor git repository and deployment status"""
-        try:
-            # Get latest commit
-            result = subprocess.run(
-                ["git", "log", "--oneline", "-n", "3"],
-                capture_output=True,
-                text=True,
-                cwd="/home/arthur/webstudio"
-            )
-            
-            if result.returncode == 0:
-                commits = result.stdout.strip()
-                return f"📊 Recent commits:\n{commits}"
-            else:
-                return "❌ Failed to get git status"
-                
-        except Exception as e:
-            return f"❌ Git monitor error: {str(e)}"
-
-
-class VercelStatusTool(BaseTool):
-    """
-    Check Vercel deployment status via API simulation
-    """
-    
-    project_id: str = Field(
-        default="prj_fLl56Ut6tqQlI3f89P5EkNtMTaTt",
-        description="Vercel project ID"
-    )
+class AgentFrameworkMissing(Exception):
+    """Raised when agents are requested but agency-swarm is not installed"""
+
+
+def _agency_swarm():
+    try:
+        import agency_swarm
+        from agency_swarm.tools import CodeInterpreter
+    except ImportError as e:
+        raise AgentFrameworkMissing(
+            f"agency-swarm is not installed ({e}). Install it with: pip install agency-swarm requests"
+        ) from e
+    return agency_swarm, CodeInterpreter
 
-    def run(self):
-        """Check deployment status"""
-        # In a real implementation, this would use the Vercel API
-        # For now, we'll simulate the check
-        return f"🔍 Checking Vercel status for project {self.project_id}..."
+
+def _agent_tools(*names):
+    from deploy_tools.agent_tools import TOOLS, as_base_tool
+
+    return [as_base_tool(TOOLS[name]) for name in names]
 
 
 # Create AI Agent for Deployment Automation
 def create_deployment_agent():
     """Create autonomous deployment agent"""
+    agency_swarm, CodeInterpreter = _agency_swarm()
     
-    deployment_agent = Agent(
+    deployment_agent = agency_swarm.Agent(
         name="DeploymentAgent",
         description="Autonomous AI agent responsible for monitoring and executing Vercel deployments with isbot fixes",
         instructions="""
@@ -210,19 +62,22 @@ def create_deployment_agent():
         - Build environment variables are set
 
         **Deployment Methods** (try in order):
-        1. Empty commit + git push (triggers webhook)
+        1. Deploy hook POST (or empty commit + git push when no hook is configured)
         2. Direct Vercel CLI deployment
-        3. Manual API trigger
 
         **Autonomous Behavior**:
         - Always verify fixes before deploying
         - Retry failed deployments with different methods
         - Report detailed status and next steps
         - Escalate to human only if all methods fail
+        - Long tool outputs arrive as digests with an artifact ID; use ArtifactTool
+          to read more of the full output only when the digest is not enough
 
         Be proactive, autonomous, and thorough in your deployment management.
         """,
-        tools=[VercelDeploymentTool, GitMonitorTool, VercelStatusTool, CodeInterpreter],
+        tools=_agent_tools(
+            "VercelDeploymentTool", "GitMonitorTool", "VercelStatusTool", "ArtifactTool"
+        ) + [CodeInterpreter],
         temperature=0.1,  # Low temperature for consistent, reliable behavior
         max_prompt_tokens=25000
     )
@@ -232,39 +87,54 @@ def create_deployment_agent():
 
 def create_monitoring_agent():
     """Create monitoring agent for continuous oversight"""
+    agency_swarm, _ = _agency_swarm()
     
-    monitoring_agent = Agent(
+    monitoring_agent = agency_swarm.Agent(
         name="MonitoringAgent", 
         description="Continuous monitoring agent for deployment health and status tracking",
         instructions="""
         You are a monitoring agent responsible for:
 
         1. **Continuous Monitoring**: Watch for deployment status changes
-        2. **Health Checks**: Verify deployed applications are working
+        2. **Health Checks**: Verify deployed applications are working (HealthProbeTool)
         3. **Error Detection**: Identify and report deployment issues
         4. **Performance Tracking**: Monitor deployment success rates
         5. **Alerting**: Notify when manual intervention is needed
+        6. **Recovery**: When a fresh deploy fails its health checks, use
+           RollbackTool with the broken commit as bad_commit; it promotes
+           the last healthy deployment in seconds instead of rebuilding
 
         Work closely with the DeploymentAgent to ensure seamless automation.
         """,
-        tools=[GitMonitorTool, VercelStatusTool],
+        tools=_agent_tools("GitMonitorTool", "VercelStatusTool", "HealthProbeTool", "RollbackTool"),
         temperature=0.2
     )
     
     return monitoring_agent
 
 
-def deploy_with_ai_automation():
-    """Execute autonomous deployment with AI agents"""
-    
-    print("🤖 Initializing AI Agent Deployment Automation...")
+DEPLOYMENT_PROMPT = """Execute autonomous deployment of webstudio project with the following requirements:
+
+1. Verify commit a80292d63 contains all isbot fixes
+2. Use VercelDeploymentTool to trigger deployment
+3. Monitor deployment progress  
+4. Report final status
+
+This deployment should resolve the 'Cannot set properties of undefined (setting 'isbot')' error.
+
+Proceed autonomously and use all available methods to ensure successful deployment."""
+
+
+def create_agency():
+    """Create the autonomous agency around the deployment and monitoring agents"""
+    agency_swarm, _ = _agency_swarm()
     
     # Create agents
     deployment_agent = create_deployment_agent()
     monitoring_agent = create_monitoring_agent()
     
     # Create autonomous agency
-    agency = Agency(
+    agency = agency_swarm.Agency(
         [deployment_agent, [deployment_agent, monitoring_agent]],
         shared_instructions="""
         You are part of an autonomous deployment agency responsible for managing Vercel deployments.
@@ -282,28 +152,107 @@ def deploy_with_ai_automation():
         async_mode=None  # Synchronous for reliability
     )
     
-    print("🚀 Starting autonomous deployment...")
+    return agency
+
+
+def create_backend(offline=False, script=None, cache=True, allow_deploy=False):
+    """
+    Completion backend for the agency run: the live agency, or with
+    offline the deterministic scripted stand-in, which only runs
+    deploying tools with allow_deploy. Scripted responses are cached by
+    prompt and tool state unless cache is False; live runs deploy as a
+    side effect and always reach the agency.
+    """
+    from deploy_tools import completion
+    from deploy_tools.agent_tools import PROJECT_PATH, compact_output
+
+    if offline:
+        backend = completion.ScriptedBackend(
+            completion.load_script(script) if script else None, compactor=compact_output,
+            allow_deploy=allow_deploy,
+        )
+    else:
+        backend = completion.AgencyBackend(create_agency())
+    if cache and offline:
+        backend = completion.CachedBackend(backend, PROJECT_PATH)
+    return backend
+
+
+def deploy_with_ai_automation(backend=None):
+    """Execute autonomous deployment with AI agents"""
+    
+    log("🤖 Initializing AI Agent Deployment Automation...", "RAW")
+    backend = backend or create_backend()
+    
+    log("🚀 Starting autonomous deployment...", "RAW")
     
     # Execute deployment
-    result = agency.get_completion(
-        """Execute autonomous deployment of webstudio project with the following requirements:
+    result = backend.complete(DEPLOYMENT_PROMPT)
+    
+    from deploy_tools.agent_tools import token_usage
+    
+    source = " (cached)" if result.cached else ""
+    log(
+        f"🎯 Deployment Result{source}: {result.text}",
+        "RAW",
+        backend=result.backend,
+        elapsed_ms=round(result.elapsed_ms, 1),
+        tool_calls=len(result.tool_calls),
+        token_usage=token_usage(),
+    )
+    return result
 
-        1. Verify commit a80292d63 contains all isbot fixes
-        2. Use VercelDeploymentTool to trigger deployment
-        3. Monitor deployment progress  
-        4. Report final status
 
-        This deployment should resolve the 'Cannot set properties of undefined (setting 'isbot')' error.
-        
-        Proceed autonomously and use all available methods to ensure successful deployment.""",
-        yield_messages=False
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="AI agent deployment for Webstudio")
+    sub = parser.add_subparsers(dest="command")
+    agency = sub.add_parser("agency", help="Run the autonomous deployment agency (default)")
+    agency.add_argument(
+        "--offline", action="store_true",
+        help="Use the scripted local stand-in instead of the live model",
     )
-    
-    print(f"🎯 Deployment Result: {result}")
-    return result
+    agency.add_argument("--script", help="JSON list of tool-call steps for --offline")
+    agency.add_argument(
+        "--allow-deploy", action="store_true",
+        help="Let --script steps run deploying tools (VercelDeploymentTool, RollbackTool)",
+    )
+    agency.add_argument("--no-cache", action="store_true", help="Always ask the backend")
+    agency.add_argument(
+        "--benchmark", type=int, metavar="N",
+        help="Run the prompt N times and report per-tool-call overhead",
+    )
+    tool = sub.add_parser(
+        "tool", help="Run one tool directly, without the agent framework", add_help=False
+    )
+    tool.add_argument("tool_args", nargs=argparse.REMAINDER)
+    args = parser.parse_args(argv)
 
+    if args.command == "tool":
+        from deploy_tools.agent_tools import run_tool_cli
 
-if __name__ == "__main__":
-    # Execute AI-powered autonomous deployment
-    deploy_with_ai_automation()
+        return run_tool_cli(args.tool_args)
+
+    offline = getattr(args, "offline", False) or os.environ.get("DEPLOY_LLM") == "offline"
+    try:
+        backend = create_backend(
+            offline=offline,
+            script=getattr(args, "script", None),
+            cache=not getattr(args, "no_cache", False),
+            allow_deploy=getattr(args, "allow_deploy", False),
+        )
+        if getattr(args, "benchmark", None):
+            from deploy_tools.completion import benchmark, format_benchmark
 
+            summary = benchmark(backend, DEPLOYMENT_PROMPT, args.benchmark)
+            log("\n".join(format_benchmark(summary)), "RAW", benchmark=summary)
+            return 0
+        # Execute AI-powered autonomous deployment
+        deploy_with_ai_automation(backend)
+    except AgentFrameworkMissing as e:
+        log(str(e), "ERROR")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,4 @@
+"""
+Shared deployment tooling for Webstudio
+Used by smart-deploy.py and deploy-agent.py
+"""
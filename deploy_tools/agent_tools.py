@@ -0,0 +1,588 @@
+"""
+Deployment tools used by the AI agents in deploy-agent.py
+Plain classes, runnable without the agent framework or an LLM
+"""
+
+import argparse
+import dataclasses
+import functools
+import os
+import subprocess
+import sys
+import time
+from dataclasses import MISSING, dataclass
+
+from deploy_tools.build_cache import BuildCache
+from deploy_tools.deploy_queue import CLAIMED, DeployQueue
+from deploy_tools.executor import DeploymentExecutor, format_outcomes
+from deploy_tools.compaction import ArtifactStore, OutputCompactor
+from deploy_tools.fingerprint import FingerprintStore, compute_fingerprint
+from deploy_tools.git_tree import preflight_commit
+from deploy_tools.git_watch import RefWatcher
+from deploy_tools.history import open_history
+from deploy_tools.log import event_logger
+from deploy_tools.method_order import adaptive_order
+from deploy_tools.preflight import format_report
+from deploy_tools.process import run_command, stream_command
+from deploy_tools.template_check import check_templates, format_matrix
+from deploy_tools.tracing import default_trace_path, span, start_trace, stop_trace
+
+PROJECT_PATH = os.environ.get("DEPLOY_PROJECT_PATH", "/home/arthur/webstudio")
+
+log = event_logger("deploy-agent")
+
+
+def option(default=MISSING, description=""):
+    """Tool parameter with a description for the agent schema and the CLI"""
+    return dataclasses.field(default=default, metadata={"description": description})
+
+
+@dataclass
+class VercelDeploymentTool:
+    """
+    Autonomous Vercel deployment tool with MCP integration.
+    Monitors git commits and triggers deployments automatically.
+    """
+    
+    commit_sha: str = option(
+        description="Git commit SHA to deploy (e.g., 'a80292d63')"
+    )
+    project_name: str = option(
+        default="webstudio",
+        description="Vercel project name"
+    )
+    policy: str = option(
+        default="sequential",
+        description="Method execution policy: 'sequential', 'hedged' or 'race'"
+    )
+    skip_unchanged: bool = option(
+        default=True,
+        description="Skip the deploy when build inputs match the last successful deploy"
+    )
+    hedge_delay: float = option(
+        default=30.0,
+        description="Seconds before a hedged policy starts the next method"
+    )
+    
+    # Set while this tool holds the project's deploy slot (not a tool parameter)
+    deploy_queue = None
+    # Fingerprint digest of the commit being deployed; keys the prebuilt output cache
+    prebuilt_key = None
+    # Deploy-slot claim of the current deploy; keys deploy-hook idempotency
+    deploy_ticket = None
+
+    def run(self):
+        """Execute autonomous Vercel deployment with AI monitoring"""
+        trace_path = os.environ.get("DEPLOY_TRACE")
+        if trace_path is None:
+            return self._deploy()
+        
+        tracer = start_trace(tool="VercelDeploymentTool", commit=self.commit_sha)
+        try:
+            with span("deploy", commit=self.commit_sha):
+                return self._deploy()
+        finally:
+            stop_trace()
+            path = tracer.export(trace_path or default_trace_path(PROJECT_PATH, tracer))
+            log("\n".join(tracer.summary()), "RAW")
+            log(f"Trace written to {path}", "INFO", trace_id=tracer.trace_id)
+
+    def _deploy(self):
+        """Verify, fingerprint and deploy the requested commit"""
+        try:
+            fingerprint, store, message = self._prepare()
+            if message:
+                return message
+            
+            # Step 4: Take the project's deploy slot; newer requests queue behind it
+            deploy_queue = DeployQueue(PROJECT_PATH, self.project_name)
+            submission = deploy_queue.submit(fingerprint.commit, source="deploy-agent")
+            if submission.status != CLAIMED:
+                return (
+                    f"⏳ Deploy of {submission.active[:9]} in progress: "
+                    f"{fingerprint.commit[:9]} {submission.status}"
+                )
+            
+            ticket = submission.ticket
+            tool, outcomes, handed_over = self, [], False
+            while ticket:
+                try:
+                    if handed_over:
+                        # finish() claimed the queued commit for this run: deploy exactly that commit
+                        log(f"Newer commit {ticket.commit[:9]} queued; deploying it next", "DEPLOY")
+                        tool = dataclasses.replace(self, commit_sha=ticket.commit)
+                        fingerprint, store, message = tool._prepare()
+                    tool.deploy_queue = deploy_queue
+                    outcomes.append(message or tool._run_methods(ticket, fingerprint, store))
+                finally:
+                    tool.deploy_queue = None
+                    ticket = deploy_queue.finish(ticket)
+                handed_over = True
+            return "\n".join(outcomes)
+            
+        except Exception as e:
+            return f"❌ Deployment error: {str(e)}"
+
+    def _prepare(self):
+        """
+        Steps 1-3 for commit_sha: returns (fingerprint, store, message);
+        a message means there is nothing to deploy and says why
+        """
+        # Step 1: Verify commit exists
+        with span("get_commit"):
+            result = subprocess.run(
+                ["git", "log", "--oneline", "-n", "1", self.commit_sha],
+                capture_output=True,
+                text=True,
+                cwd=PROJECT_PATH
+            )
+        
+        if result.returncode != 0:
+            return None, None, f"❌ Commit {self.commit_sha} not found"
+        
+        commit_info = result.stdout.strip()
+        log(f"Found commit: {commit_info}", "SUCCESS", commit=self.commit_sha)
+        
+        # Step 2: Check isbot fixes in the commit's own tree (no checkout)
+        with span("preflight"):
+            report = preflight_commit(PROJECT_PATH, self.commit_sha)
+            matrix = check_templates(PROJECT_PATH, self.commit_sha)
+        log("\n".join(format_report(report)), "CHECK", preflight=report.to_dict())
+        log("\n".join(format_matrix(matrix)), "CHECK", templates=matrix.to_dict())
+        
+        if not report.passed or not matrix.passed:
+            return None, None, "❌ Not all isbot fixes are present. Deployment cancelled."
+        
+        # Step 3: Skip deploys whose build inputs are unchanged
+        with span("fingerprint"):
+            fingerprint = compute_fingerprint(
+                PROJECT_PATH, self.commit_sha, include_worktree=False
+            )
+        store = FingerprintStore(PROJECT_PATH)
+        if self.skip_unchanged and store.matches(self.project_name, fingerprint):
+            self._record_history("skipped", fingerprint)
+            last = store.last(self.project_name)
+            return fingerprint, store, (
+                f"⏭️  Skipped: build inputs unchanged since {last.get('commit', '?')[:9]} "
+                f"(fingerprint {fingerprint.digest[:12]})"
+            )
+        return fingerprint, store, None
+
+    def _run_methods(self, ticket, fingerprint, store):
+        """Step 5: trigger deployment using methods ordered by past success and latency"""
+        self.prebuilt_key = fingerprint.digest
+        self.deploy_ticket = ticket
+        history = open_history(PROJECT_PATH)
+        try:
+            # A deploy hook replaces the empty commit + push when one is configured
+            trigger = self._trigger_deploy_hook if os.environ.get("DEPLOY_HOOK_URL") else self._trigger_empty_commit
+            methods = adaptive_order(
+                [trigger, self._trigger_vercel_cli],
+                history,
+                self.project_name,
+                log
+            )
+        finally:
+            if history:
+                history.close()
+        executor = DeploymentExecutor(
+            methods,
+            policy=self.policy,
+            hedge_delay=self.hedge_delay,
+            is_success=lambda result: "success" in str(result).lower(),
+            log=log,
+            cancel_when=lambda: "superseded by a newer commit" if self.deploy_queue.superseded(ticket) else None
+        )
+        report = executor.run()
+        
+        log("\n".join(format_outcomes(report)), "DEPLOY", execution=report.to_dict())
+        status = "superseded" if report.cancelled else "success" if report.success else "failed"
+        self._record_history(status, fingerprint, report)
+        
+        if report.cancelled:
+            return f"⏹️  Deploy of {ticket.commit[:9]} cancelled: {report.cancelled}"
+        
+        if report.success:
+            store.record(self.project_name, fingerprint, report.winner)
+            result = report.outcome(report.winner).result
+            return f"🚀 Deployment triggered successfully: {result}"
+        
+        return "❌ All deployment methods failed. Manual intervention required."
+
+    def _record_history(self, status, fingerprint, execution=None):
+        """Append this deploy to the persistent history store"""
+        history = open_history(PROJECT_PATH)
+        if history is None:
+            return
+        with history:
+            history.record(
+                self.project_name,
+                status,
+                commit_sha=fingerprint.commit,
+                script="deploy-agent",
+                execution=execution,
+                fingerprint=fingerprint.digest
+            )
+
+    async def _trigger_empty_commit(self):
+        """Method 1: Trigger via empty commit"""
+        # A newer commit is about to deploy anyway: don't queue another build for this one
+        if self.deploy_queue and self.deploy_queue.pending():
+            raise Exception("newer commit pending; not pushing an empty commit")
+        
+        timestamp = int(time.time())
+        commit_msg = f"deploy: AI agent auto-deploy {timestamp} - isbot fixes included"
+        
+        # Create empty commit
+        result = await run_command(
+            ["git", "commit", "--allow-empty", "-m", commit_msg],
+            cwd=PROJECT_PATH
+        )
+        if result.returncode != 0:
+            raise Exception(f"git commit failed: {result.stderr}")
+        
+        # Push to trigger webhook
+        result = await run_command(
+            ["git", "push", "origin", "main"],
+            cwd=PROJECT_PATH
+        )
+        if result.returncode != 0:
+            raise Exception(f"git push failed: {result.stderr}")
+        
+        return "Success: Empty commit pushed to trigger webhook"
+
+    async def _trigger_vercel_cli(self):
+        """Method 2: Direct Vercel CLI deployment"""
+        args = ["npx", "vercel", "--prod", "--yes"]
+        # smart-deploy --prebuilt leaves the output of identical inputs in the build cache
+        key = self.prebuilt_key
+        if key and BuildCache.for_project(PROJECT_PATH).restore(key, PROJECT_PATH):
+            log(f"Uploading cached prebuilt output ({key[:12]})", "BUILD", cache="hit")
+            args = ["npx", "vercel", "deploy", "--prebuilt", "--prod", "--yes"]
+        result = await stream_command(
+            args,
+            cwd=PROJECT_PATH,
+            timeout=300,
+            on_line=lambda line, stream: log(line, "BUILD", stream=stream)
+        )
+        
+        if result.ok:
+            return f"Success: Vercel CLI deployment: {result.output}"
+        if result.aborted:
+            raise Exception(f"Vercel CLI aborted on fatal '{result.aborted}' error: {result.errors[-1]}")
+        details = "\n".join(result.errors or result.tail[-20:])
+        raise Exception(f"Vercel CLI failed: {details}")
+
+    def _trigger_deploy_hook(self):
+        """Method 1: POST to the configured deploy hook, once per deploy"""
+        from deploy_tools.deploy_hook import idempotency_key, trigger_deploy
+
+        ticket = self.deploy_ticket
+        result = trigger_deploy(PROJECT_PATH, idempotency_key(self.project_name, ticket.commit, ticket.claimed_at))
+        if result.replayed:
+            return f"Success: deploy hook already triggered for this deploy (job {result.job_id})"
+        return f"Success: deploy hook started job {result.job_id} in {result.elapsed_ms:.0f} ms"
+
+
+@dataclass
+class GitMonitorTool:
+    """
+    Monitor git repository for changes and deployment status
+    """
+    
+    check_interval: int = option(
+        default=30,
+        description="With watch, the longest time to wait for a new commit"
+    )
+    watch: bool = option(
+        default=False,
+        description="Block until the branch moves (event-driven, no polling git)"
+    )
+
+    def run(self):
+        """Monitor git repository and deployment status"""
+        try:
+            if self.watch:
+                with RefWatcher(PROJECT_PATH) as watcher:
+                    events = watcher.poll(self.check_interval)
+                if not events:
+                    return f"📊 No new commits in {self.check_interval}s"
+                moved = "\n".join(
+                    f"{e.ref}: {(e.old or '-')[:9]} → {(e.new or '-')[:9]}" for e in events
+                )
+                return f"🆕 New commits:\n{moved}\n\n{self._recent()}"
+            return self._recent()
+        except Exception as e:
+            return f"❌ Git monitor error: {str(e)}"
+
+    def _recent(self):
+        """Three most recent commits"""
+        # Get latest commit
+        result = subprocess.run(
+            ["git", "log", "--oneline", "-n", "3"],
+            capture_output=True,
+            text=True,
+            cwd=PROJECT_PATH
+        )
+        
+        if result.returncode == 0:
+            commits = result.stdout.strip()
+            return f"📊 Recent commits:\n{commits}"
+        else:
+            return "❌ Failed to get git status"
+
+
+@dataclass
+class VercelStatusTool:
+    """
+    Check Vercel deployment status via the Vercel REST API
+    """
+    
+    project_id: str = option(
+        default="prj_fLl56Ut6tqQlI3f89P5EkNtMTaTt",
+        description="Vercel project ID"
+    )
+    deployment_id: str = option(
+        default="",
+        description="Deployment ID to follow (defaults to the latest production deployment)"
+    )
+    wait_for_ready: bool = option(
+        default=False,
+        description="Keep polling until the deployment reaches a final state"
+    )
+    timeout: int = option(
+        default=900,
+        description="Seconds to wait for a final state"
+    )
+
+    def run(self):
+        """Check deployment status"""
+        # requests is only needed here, so import it on first use
+        import requests
+        
+        from deploy_tools.vercel_status import VercelAPIError, VercelStatusPoller
+        
+        try:
+            poller = VercelStatusPoller()
+            if not self.wait_for_ready:
+                if self.deployment_id:
+                    payload, _ = poller.deployment(self.deployment_id)
+                else:
+                    payload = poller.latest_deployment(self.project_id)
+                    if payload is None:
+                        return f"❌ No deployments found for project {self.project_id}"
+                state = payload.get("readyState") or payload.get("state")
+                return f"🔍 Deployment {payload.get('uid') or payload.get('id')}: {state} ({payload.get('url')})"
+            
+            lines = []
+            result = poller.wait(
+                self.deployment_id or None,
+                self.project_id,
+                on_transition=lambda t: lines.append(
+                    f"{t.elapsed_s:6.1f}s {t.previous or 'START'} → {t.state}"
+                ),
+                deadline=self.timeout
+            )
+            status = "✅" if result.ready else "❌"
+            lines.append(
+                f"{status} {result.deployment_id}: {result.state} after {result.elapsed_s:.0f}s "
+                f"({result.requests} requests, {result.not_modified} not modified)"
+            )
+            return "\n".join(lines)
+        except (VercelAPIError, requests.RequestException) as e:
+            return f"❌ Vercel status error: {str(e)}"
+
+
+@dataclass
+class HealthProbeTool:
+    """
+    Probe the deployed site: TTFB and latency percentiles, the immutable
+    Cache-Control on /assets/*, and regressions against the last good probe
+    """
+    
+    base_url: str = option(
+        description="Deployed site URL, e.g. https://webstudio-abc.vercel.app"
+    )
+    paths: str = option(
+        default="/",
+        description="Comma-separated paths to probe; /assets/ files linked from the first are added"
+    )
+    samples: int = option(
+        default=5,
+        description="Requests per path"
+    )
+    update_baseline: bool = option(
+        default=True,
+        description="Store a passing run as the new baseline"
+    )
+    project_name: str = option(
+        default="webstudio",
+        description="Project whose baseline to compare against"
+    )
+
+    def run(self):
+        """Probe the site and report percentiles and failures"""
+        from deploy_tools.probe import format_probe_report, probe_deployment
+        
+        report = probe_deployment(
+            self.base_url,
+            PROJECT_PATH,
+            self.project_name,
+            paths=[p.strip() for p in self.paths.split(",") if p.strip()],
+            samples=self.samples,
+            update_baseline=self.update_baseline
+        )
+        status = "✅ Healthy" if report.passed else "❌ Unhealthy"
+        return f"{status}: {report.base_url}\n" + "\n".join(format_probe_report(report))
+
+
+@dataclass
+class RollbackTool:
+    """
+    Put the last healthy deployment back into production without
+    rebuilding: promote it, or re-upload its cached prebuilt output
+    """
+    
+    project_name: str = option(
+        default="webstudio",
+        description="Project whose deploy history to roll back"
+    )
+    bad_commit: str = option(
+        default="",
+        description="Commit whose deploys must not be rolled back to (the broken one)"
+    )
+    to_commit: str = option(
+        default="",
+        description="Healthy commit to roll back to (default: the newest healthy deploy)"
+    )
+    provider: str = option(
+        default="vercel",
+        description="Deployment provider: 'vercel', 'netlify', 'cloudflare' or 'docker'"
+    )
+
+    def run(self):
+        """Roll back and report which deploy is live again"""
+        from deploy_tools.providers import create_provider
+        from deploy_tools.rollback import Rollback, format_rollback
+        
+        rollback = Rollback(PROJECT_PATH, self.project_name, create_provider(self.provider, PROJECT_PATH), log=log)
+        result = rollback.run(exclude_commit=self.bad_commit or None, to_commit=self.to_commit or None)
+        return format_rollback(result)
+
+
+@dataclass
+class ArtifactTool:
+    """
+    Read a stored full tool output by artifact ID (large outputs are
+    handed to the agent as digests that reference one)
+    """
+    
+    artifact_id: str = option(
+        description="Artifact ID from a compacted tool output"
+    )
+    start_line: int = option(
+        default=0,
+        description="First line to return (negative counts from the end)"
+    )
+    max_lines: int = option(
+        default=100,
+        description="Maximum number of lines to return"
+    )
+
+    def run(self):
+        """Return a slice of a stored tool output"""
+        try:
+            lines = ArtifactStore.for_project(PROJECT_PATH).get(self.artifact_id).splitlines()
+        except KeyError:
+            return f"❌ Unknown artifact {self.artifact_id}"
+        start = self.start_line if self.start_line >= 0 else max(0, len(lines) + self.start_line)
+        chunk = lines[start:start + self.max_lines]
+        return f"📄 Artifact {self.artifact_id} lines {start}-{start + len(chunk)} of {len(lines)}:\n" + "\n".join(chunk)
+
+
+TOOLS = {
+    tool.__name__: tool
+    for tool in (VercelDeploymentTool, GitMonitorTool, VercelStatusTool, HealthProbeTool, RollbackTool,
+                 ArtifactTool)
+}
+
+_compactor = None
+
+
+def compact_output(tool, output):
+    """
+    Compaction layer between tools and the agent: outputs over the token
+    budget (DEPLOY_TOOL_TOKEN_BUDGET) become digests backed by artifacts
+    """
+    global _compactor
+    if _compactor is None:
+        _compactor = OutputCompactor(PROJECT_PATH, log=log)
+    return _compactor(tool, output)
+
+
+def token_usage():
+    """Per-run token totals of tool results handed to the agent"""
+    return _compactor.ledger.summary() if _compactor else None
+
+
+@functools.lru_cache(maxsize=None)
+def as_base_tool(tool_cls):
+    """
+    Wrap a plain tool class as an agency_swarm BaseTool. The agent
+    framework and pydantic are only imported here, when agents are built.
+    """
+    from agency_swarm import BaseTool
+    from pydantic import Field
+
+    fields = dataclasses.fields(tool_cls)
+    namespace = {
+        "__doc__": tool_cls.__doc__,
+        "__module__": tool_cls.__module__,
+        "__annotations__": {f.name: f.type for f in fields},
+    }
+    for f in fields:
+        default = ... if f.default is MISSING else f.default
+        namespace[f.name] = Field(default, description=f.metadata.get("description", ""))
+
+    def run(self):
+        output = tool_cls(**{f.name: getattr(self, f.name) for f in fields}).run()
+        return compact_output(tool_cls.__name__, output)
+
+    run.__doc__ = tool_cls.run.__doc__
+    namespace["run"] = run
+    return type(tool_cls.__name__, (BaseTool,), namespace)
+
+
+def tool_parser(tool_cls):
+    """argparse parser generated from a tool's fields"""
+    parser = argparse.ArgumentParser(
+        prog=tool_cls.__name__, description=(tool_cls.__doc__ or "").strip()
+    )
+    for f in dataclasses.fields(tool_cls):
+        flag = "--" + f.name.replace("_", "-")
+        help_text = f.metadata.get("description", "")
+        if f.type is bool:
+            parser.add_argument(flag, action=argparse.BooleanOptionalAction,
+                                default=f.default, help=help_text)
+        elif f.default is MISSING:
+            parser.add_argument(flag, type=f.type, required=True, help=help_text)
+        else:
+            parser.add_argument(flag, type=f.type, default=f.default, help=help_text)
+    return parser
+
+
+def run_tool_cli(argv=None):
+    """Run one tool from the command line: <ToolName> [--field value ...]"""
+    argv = list(sys.argv[1:] if argv is None else argv)
+    if not argv or argv[0] not in TOOLS:
+        print(f"usage: <tool> [options]; tools: {', '.join(TOOLS)}", file=sys.stderr)
+        return 2
+    tool_cls = TOOLS[argv[0]]
+    args = tool_parser(tool_cls).parse_args(argv[1:])
+    output = tool_cls(**vars(args)).run()
+    log(output, "RAW")
+    return 1 if output.startswith("❌") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(run_tool_cli())
@@ -0,0 +1,391 @@
+"""
+Content-addressed local cache of build outputs
+Keyed by input hashes, shared by every deploy method, LRU-evicted by size
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import stat
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Optional
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+from deploy_tools.fingerprint import (
+    APP_DIR,
+    ROOT_INPUTS,
+    _git,
+    _vercel_build_config,
+    compute_fingerprint,
+    dependency_closure,
+    dirty_paths,
+    workspace_graph,
+)
+from deploy_tools.git_tree import object_ids
+from deploy_tools.preflight import CACHE_DIR
+from deploy_tools.tracing import span
+
+DEFAULT_MAX_MB = 4096
+PACKAGE_OUTPUT = "lib"
+APP_OUTPUT = "build"
+# `prisma generate` writes the client next to the sources, see schema.prisma
+PRISMA_DIR = "packages/prisma-client"
+PRISMA_OUTPUTS = ("src/__generated__", "lib")
+# `vercel build` output, uploadable with `vercel deploy --prebuilt`
+PREBUILT_UNIT = "vercel-prebuilt"
+PREBUILT_OUTPUT = ".vercel/output"
+
+
+@dataclass
+class CacheUnit:
+    """A set of build outputs that share one input key"""
+
+    name: str
+    key: str
+    outputs: List[str]
+    package: Optional[str] = None
+    buildable: bool = True
+
+
+def _dirty_hashes(repo_path, paths):
+    """{path: sha256} of uncommitted changes under paths, like compute_fingerprint"""
+    hashes = {}
+    for path in dirty_paths(repo_path, *paths):
+        full_path = Path(repo_path) / path
+        digest = hashlib.sha256()
+        if full_path.is_file():
+            digest.update(full_path.read_bytes())
+        hashes[path] = digest.hexdigest()
+    return hashes
+
+
+def output_units(repo_path, commit="HEAD", include_worktree=True, app_dir=APP_DIR):
+    """
+    Cacheable outputs of the workspace at a commit: each package's lib
+    dir, the generated Prisma client, the app build and the prebuilt
+    Vercel output. A unit's key hashes the git tree ids of its package,
+    its transitive workspace dependencies and the root inputs, so a
+    change anywhere else leaves the cached output valid.
+    """
+    commit = _git(repo_path, "rev-parse", "--verify", f"{commit}^{{commit}}").strip()
+    manifests, graph = workspace_graph(repo_path, commit, (app_dir,))
+    ids = object_ids(repo_path, [f"{commit}:{path}" for path in list(manifests) + ROOT_INPUTS])
+    dirty = _dirty_hashes(repo_path, list(manifests) + ROOT_INPUTS) if include_worktree else {}
+    vercel_build = hashlib.sha256(_vercel_build_config(repo_path, commit).encode()).hexdigest()
+
+    def key(package_dir, *extra):
+        digest = hashlib.sha256()
+        for path in [package_dir] + dependency_closure(graph, package_dir) + ROOT_INPUTS:
+            digest.update(f"{path}\0{ids.get(f'{commit}:{path}') or 'missing'}\n".encode())
+            for dirty_path in sorted(p for p in dirty if p == path or p.startswith(path + "/")):
+                digest.update(f"worktree:{dirty_path}\0{dirty[dirty_path]}\n".encode())
+        for value in extra:
+            digest.update(f"{value}\n".encode())
+        return digest.hexdigest()
+
+    units = []
+    for package_dir, package_json in sorted(manifests.items()):
+        scripts = package_json.get("scripts") or {}
+        name = package_json.get("name") or package_dir
+        if package_dir == app_dir:
+            units.append(CacheUnit(package_dir, key(package_dir, vercel_build),
+                                   [f"{package_dir}/{APP_OUTPUT}"], name, "build" in scripts))
+        elif package_dir == PRISMA_DIR:
+            units.append(CacheUnit(package_dir, key(package_dir), [f"{package_dir}/{o}" for o in PRISMA_OUTPUTS],
+                                   name, "generate" in scripts))
+        elif "build" in scripts:
+            units.append(CacheUnit(package_dir, key(package_dir), [f"{package_dir}/{PACKAGE_OUTPUT}"], name))
+    fingerprint = compute_fingerprint(repo_path, commit, include_worktree, app_dir)
+    units.append(CacheUnit(PREBUILT_UNIT, fingerprint.digest, [PREBUILT_OUTPUT], buildable=False))
+    return units
+
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class BuildCache:
+    """
+    Build outputs stored as content-addressed blobs plus one manifest per
+    key, so identical files in different outputs are stored once. The
+    index tracks each entry's size and last use; after a save, least
+    recently used entries are evicted until the blobs fit max_bytes.
+    """
+
+    def __init__(self, root, max_bytes=None):
+        self.root = Path(root)
+        self.blobs = self.root / "blobs"
+        self.entries = self.root / "entries"
+        self.index_path = self.root / "index.json"
+        self.lock_path = self.root / "index.lock"
+        self.max_bytes = max_bytes or int(os.environ.get("DEPLOY_BUILD_CACHE_MB", DEFAULT_MAX_MB)) * 1024 * 1024
+
+    @classmethod
+    def for_project(cls, project_path, **kwargs):
+        return cls(Path(project_path) / CACHE_DIR / "build-cache", **kwargs)
+
+    @contextmanager
+    def _locked(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        with open(self.lock_path, "a+") as lock:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                index = self._read_index()
+                yield index
+                tmp = self.index_path.with_suffix(".tmp")
+                tmp.write_text(json.dumps(index, indent=2))
+                os.replace(tmp, self.index_path)
+            finally:
+                if fcntl:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _read_index(self):
+        try:
+            index = json.loads(self.index_path.read_text())
+        except (OSError, ValueError):
+            index = {}
+        index.setdefault("entries", {})
+        index.setdefault("blobs", {})
+        return index
+
+    def _blob_path(self, digest):
+        return self.blobs / digest[:2] / digest
+
+    def has(self, key):
+        return key in self._read_index()["entries"]
+
+    def save(self, key, project_path, outputs, **meta):
+        """Store the outputs (paths relative to project_path); False if none exist"""
+        project_path = Path(project_path)
+        files = []
+        for output in outputs:
+            root = project_path / output
+            if not root.exists():
+                continue
+            paths = [root] if root.is_file() else sorted(p for p in root.rglob("*") if p.is_file() or p.is_symlink())
+            for path in paths:
+                rel = path.relative_to(project_path).as_posix()
+                if path.is_symlink():
+                    files.append({"path": rel, "link": os.readlink(path)})
+                    continue
+                digest = _file_digest(path)
+                blob = self._blob_path(digest)
+                if not blob.exists():
+                    blob.parent.mkdir(parents=True, exist_ok=True)
+                    tmp = blob.with_name(f"{digest}.{os.getpid()}.tmp")
+                    shutil.copyfile(path, tmp)
+                    os.replace(tmp, blob)
+                files.append({"path": rel, "blob": digest, "size": path.stat().st_size,
+                              "mode": stat.S_IMODE(path.stat().st_mode)})
+        if not files:
+            return False
+
+        manifest = {"key": key, "outputs": list(outputs), "files": files, "meta": meta}
+        self.entries.mkdir(parents=True, exist_ok=True)
+        (self.entries / f"{key}.json").write_text(json.dumps(manifest))
+        with self._locked() as index:
+            now = time.time()
+            index["entries"][key] = {
+                "size": sum(f.get("size", 0) for f in files),
+                "files": len(files),
+                "blobs": sorted({f["blob"] for f in files if "blob" in f}),
+                "created_at": now,
+                "last_used": now,
+                **meta,
+            }
+            for f in files:
+                if "blob" in f:
+                    index["blobs"][f["blob"]] = f["size"]
+            self._evict(index, keep=key)
+        return True
+
+    def restore(self, key, project_path):
+        """Replace the entry's outputs under project_path; False on a miss"""
+        try:
+            manifest = json.loads((self.entries / f"{key}.json").read_text())
+        except (OSError, ValueError):
+            return False
+        if any("blob" in f and not self._blob_path(f["blob"]).exists() for f in manifest["files"]):
+            return False
+        project_path = Path(project_path)
+        for output in manifest["outputs"]:
+            target = project_path / output
+            if target.is_dir() and not target.is_symlink():
+                shutil.rmtree(target)
+            elif target.exists() or target.is_symlink():
+                target.unlink()
+        for f in manifest["files"]:
+            target = project_path / f["path"]
+            target.parent.mkdir(parents=True, exist_ok=True)
+            if "link" in f:
+                os.symlink(f["link"], target)
+            else:
+                # Copy, not hardlink: builds may rewrite outputs in place
+                shutil.copyfile(self._blob_path(f["blob"]), target)
+                os.chmod(target, f["mode"])
+        with self._locked() as index:
+            if key in index["entries"]:
+                index["entries"][key]["last_used"] = time.time()
+        return True
+
+    def _evict(self, index, keep=None):
+        """Drop LRU entries until the referenced blobs fit; returns evicted keys"""
+        evicted = []
+        while True:
+            referenced = self._referenced(index)
+            total = sum(index["blobs"].get(digest, 0) for digest in referenced)
+            if total <= self.max_bytes:
+                break
+            candidates = [k for k in index["entries"] if k != keep]
+            if not candidates:
+                break
+            oldest = min(candidates, key=lambda k: index["entries"][k]["last_used"])
+            del index["entries"][oldest]
+            try:
+                (self.entries / f"{oldest}.json").unlink()
+            except FileNotFoundError:
+                pass
+            evicted.append(oldest)
+        referenced = self._referenced(index)
+        for digest in [d for d in index["blobs"] if d not in referenced]:
+            del index["blobs"][digest]
+            try:
+                self._blob_path(digest).unlink()
+            except FileNotFoundError:
+                pass
+        return evicted
+
+    @staticmethod
+    def _referenced(index):
+        return {digest for entry in index["entries"].values() for digest in entry.get("blobs", [])}
+
+    def evict(self, max_bytes=None):
+        if max_bytes is not None:
+            self.max_bytes = max_bytes
+        with self._locked() as index:
+            return self._evict(index)
+
+    def stats(self):
+        index = self._read_index()
+        return {
+            "entries": len(index["entries"]),
+            "logical_bytes": sum(entry["size"] for entry in index["entries"].values()),
+            "stored_bytes": sum(index["blobs"].values()),
+            "max_bytes": self.max_bytes,
+        }
+
+
+@dataclass
+class CacheRun:
+    """Hits and misses of one cache-assisted build"""
+
+    hits: List[str] = field(default_factory=list)
+    misses: List[str] = field(default_factory=list)
+    saved: List[str] = field(default_factory=list)
+    returncode: Optional[int] = 0
+    elapsed_s: float = 0.0
+
+
+def restore_units(cache, project_path, units):
+    """Restore every cached unit; returns (hits, misses)"""
+    hits, misses = [], []
+    with span("build_cache_restore", units=len(units)):
+        for unit in units:
+            (hits if cache.restore(unit.key, project_path) else misses).append(unit)
+    return hits, misses
+
+
+def save_units(cache, project_path, units):
+    """Store the outputs of units that now exist; returns the saved units"""
+    with span("build_cache_save", units=len(units)):
+        return [unit for unit in units
+                if cache.save(unit.key, project_path, unit.outputs, unit=unit.name)]
+
+
+def incremental_build(project_path, cache=None, commit="HEAD", log=None):
+    """
+    Restore cached package outputs and build only the packages whose
+    inputs changed, with one filtered `pnpm build`. The prebuilt Vercel
+    output is left to the deploy, which builds it with `vercel build`.
+    """
+    started = time.monotonic()
+    cache = cache or BuildCache.for_project(project_path)
+    units = [u for u in output_units(project_path, commit) if u.name != PREBUILT_UNIT]
+    hits, misses = restore_units(cache, project_path, units)
+    run = CacheRun([u.name for u in hits], [u.name for u in misses])
+    to_build = [u for u in misses if u.buildable and u.package]
+    if to_build:
+        args = ["pnpm"]
+        for unit in to_build:
+            args.append(f"--filter={unit.package}")
+        generate = [u for u in to_build if u.name == PRISMA_DIR]
+        if log:
+            log(f"Building {len(to_build)} changed package(s), {len(hits)} restored from cache", "BUILD")
+        if generate:
+            result = subprocess.run(["pnpm", f"--filter={generate[0].package}", "generate"], cwd=project_path)
+            run.returncode = result.returncode
+        if run.returncode == 0:
+            result = subprocess.run(args + ["--if-present", "run", "build"], cwd=project_path)
+            run.returncode = result.returncode
+    if run.returncode == 0:
+        run.saved = [u.name for u in save_units(cache, project_path, misses)]
+    run.elapsed_s = time.monotonic() - started
+    return run
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect and use the local build-output cache")
+    parser.add_argument("command", choices=["status", "keys", "build", "restore", "save", "evict"])
+    parser.add_argument("--path", default=os.getcwd(), help="Project checkout (default: cwd)")
+    parser.add_argument("--commit", default="HEAD")
+    parser.add_argument("--max-mb", type=int, help="Size limit for evict")
+    args = parser.parse_args(argv)
+
+    cache = BuildCache.for_project(args.path)
+    if args.command == "status":
+        json.dump(cache.stats(), sys.stdout, indent=2)
+        print()
+        return 0
+    if args.command == "evict":
+        evicted = cache.evict(args.max_mb * 1024 * 1024 if args.max_mb else None)
+        print(f"Evicted {len(evicted)} entries; {json.dumps(cache.stats())}")
+        return 0
+
+    units = output_units(args.path, args.commit)
+    if args.command == "keys":
+        for unit in units:
+            print(f"{unit.key[:16]}  {'hit ' if cache.has(unit.key) else 'miss'}  {unit.name}")
+        return 0
+    if args.command == "restore":
+        hits, misses = restore_units(cache, args.path, units)
+        print(f"Restored {len(hits)} units, {len(misses)} not cached")
+        return 0
+    if args.command == "save":
+        saved = save_units(cache, args.path, units)
+        print(f"Saved {len(saved)} of {len(units)} units")
+        return 0
+
+    run = incremental_build(args.path, cache, args.commit)
+    print(f"{len(run.hits)} restored, {len(run.misses)} rebuilt, {len(run.saved)} saved in {run.elapsed_s:.1f}s")
+    return 0 if run.returncode == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,402 @@
+"""
+Build memory profiling and NODE_OPTIONS heap sizing
+Samples RSS of the build's process tree per workspace package
+"""
+
+import asyncio
+import json
+import math
+import os
+import re
+import sys
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import List, Optional
+
+from deploy_tools.preflight import CACHE_DIR
+from deploy_tools.process import stream_command
+from deploy_tools.tracing import span
+
+WORKSPACE_GLOBS = ("packages/*", "apps/*", "fixtures/*")
+DEFAULT_INTERVAL_S = 0.25
+# Heap recommendation = peak Node RSS * headroom, rounded up to this step
+HEAP_HEADROOM = 1.3
+HEAP_STEP_MB = 512
+# Vercel's standard build machine; the heap must leave room for everything else
+DEFAULT_MACHINE_MB = 8192
+MACHINE_HEAP_SHARE = 0.75
+# Peak Node RSS above this share of the configured heap is treated as an OOM risk
+OOM_RISK_RATIO = 0.9
+
+_HEAP_FLAG = re.compile(r"--max-old-space-size=(\d+)")
+
+
+def configured_heap_mb(node_options):
+    match = _HEAP_FLAG.search(node_options or "")
+    return int(match.group(1)) if match else None
+
+
+def with_heap(node_options, heap_mb):
+    """NODE_OPTIONS with --max-old-space-size set to heap_mb, other flags kept"""
+    flag = f"--max-old-space-size={heap_mb}"
+    if _HEAP_FLAG.search(node_options or ""):
+        return _HEAP_FLAG.sub(flag, node_options)
+    return f"{node_options} {flag}".strip()
+
+
+def build_config(project_path):
+    """
+    (command, env) of the production build: vercel.json's buildCommand and
+    build.env, or the last `RUN ... build` of the Dockerfile
+    """
+    project_path = Path(project_path)
+    try:
+        vercel = json.loads((project_path / "vercel.json").read_text())
+    except (OSError, ValueError):
+        vercel = {}
+    env = dict(vercel.get("build", {}).get("env", {}))
+    if vercel.get("buildCommand"):
+        return vercel["buildCommand"], env
+    try:
+        lines = (project_path / "Dockerfile").read_text().splitlines()
+    except OSError:
+        lines = []
+    for line in reversed(lines):
+        if line.startswith("RUN ") and "build" in line:
+            return line[len("RUN "):].strip(), env
+    raise FileNotFoundError(f"No buildCommand in vercel.json and no build step in {project_path / 'Dockerfile'}")
+
+
+def workspace_packages(project_path):
+    """{absolute dir: package name} of every workspace package"""
+    packages = {}
+    for pattern in WORKSPACE_GLOBS:
+        for manifest in Path(project_path).glob(f"{pattern}/package.json"):
+            try:
+                name = json.loads(manifest.read_text()).get("name")
+            except (OSError, ValueError):
+                continue
+            packages[str(manifest.parent.resolve())] = name or manifest.parent.name
+    return packages
+
+
+@dataclass
+class ProcessSample:
+    pid: int
+    rss_kb: int
+    cwd: str
+    node: bool
+
+
+def _proc_samples(root_pid=None):
+    """
+    RSS, cwd and whether it is node, for every process in the sessions
+    led by this process's children (commands run with start_new_session)
+    """
+    parent = os.getpid() if root_pid is None else root_pid
+    stats = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                raw = f.read()
+        except OSError:
+            continue
+        # comm may contain spaces; fields after the closing paren are fixed
+        fields = raw[raw.rfind(")") + 2:].split()
+        stats[int(entry)] = (int(fields[1]), int(fields[3]))  # ppid, session
+    sessions = {pid for pid, (ppid, _) in stats.items() if ppid == parent}
+    samples = []
+    for pid, (_, session) in stats.items():
+        if session not in sessions:
+            continue
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                rss = next((int(line.split()[1]) for line in f if line.startswith("VmRSS:")), 0)
+            cwd = os.readlink(f"/proc/{pid}/cwd")
+            with open(f"/proc/{pid}/cmdline", "rb") as f:
+                argv0 = f.read().split(b"\0", 1)[0]
+        except (OSError, StopIteration):
+            continue
+        samples.append(ProcessSample(pid, rss, cwd, os.path.basename(argv0) == b"node"))
+    return samples
+
+
+@dataclass
+class PackageProfile:
+    """Peak memory and active time of the build steps run in one package"""
+
+    name: str
+    path: str
+    peak_rss_mb: float = 0.0
+    peak_node_rss_mb: float = 0.0
+    first_seen_s: Optional[float] = None
+    last_seen_s: Optional[float] = None
+
+    @property
+    def wall_s(self):
+        if self.first_seen_s is None:
+            return 0.0
+        return self.last_seen_s - self.first_seen_s
+
+
+@dataclass
+class BuildProfile:
+    """Result of one profiled build"""
+
+    command: str
+    returncode: Optional[int]
+    wall_s: float
+    peak_rss_mb: float
+    peak_node_rss_mb: float
+    configured_heap_mb: Optional[int]
+    recommended_heap_mb: Optional[int]
+    machine_mb: int
+    oom: bool
+    packages: List[PackageProfile] = field(default_factory=list)
+    errors: List[str] = field(default_factory=list)
+    sampler: str = "proc"
+
+    @property
+    def at_risk(self):
+        if self.oom:
+            return True
+        if self.configured_heap_mb is None:
+            return False
+        return self.peak_node_rss_mb > self.configured_heap_mb * OOM_RISK_RATIO
+
+    @property
+    def fits_machine(self):
+        return (self.recommended_heap_mb or 0) <= self.machine_mb * MACHINE_HEAP_SHARE
+
+    @property
+    def passed(self):
+        return self.returncode == 0 and not self.at_risk and self.fits_machine
+
+    def to_dict(self):
+        data = asdict(self)
+        data.update(at_risk=self.at_risk, fits_machine=self.fits_machine, passed=self.passed)
+        for package, profile in zip(data["packages"], self.packages):
+            package["wall_s"] = profile.wall_s
+        return data
+
+
+def recommend_heap_mb(peak_node_rss_mb):
+    return max(HEAP_STEP_MB, math.ceil(peak_node_rss_mb * HEAP_HEADROOM / HEAP_STEP_MB) * HEAP_STEP_MB)
+
+
+class BuildProfiler:
+    """
+    Run the production build locally while sampling the RSS of every
+    process it spawns. Processes are attributed to the workspace package
+    whose directory is their cwd, which is how pnpm runs each package's
+    build script. Where /proc is unavailable only the overall peak (from
+    getrusage) is recorded.
+    """
+
+    def __init__(self, project_path, command=None, env=None, heap_mb=None,
+                 interval=DEFAULT_INTERVAL_S, machine_mb=DEFAULT_MACHINE_MB, timeout=None, log=None):
+        try:
+            default_command, default_env = build_config(project_path)
+        except FileNotFoundError:
+            if command is None:
+                raise
+            default_command, default_env = command, {}
+        self.project_path = str(Path(project_path).resolve())
+        self.command = command or default_command
+        self.env = {**default_env, **(env or {})}
+        if heap_mb:
+            self.env["NODE_OPTIONS"] = with_heap(self.env.get("NODE_OPTIONS", ""), heap_mb)
+        self.interval = interval
+        self.machine_mb = machine_mb
+        self.timeout = timeout
+        self.log = log
+        self.packages = {
+            path: PackageProfile(name, path) for path, name in workspace_packages(project_path).items()
+        }
+        self.root = PackageProfile("(root)", self.project_path)
+        self.peak_rss_kb = 0
+        self.peak_node_rss_kb = 0
+
+    def _package_for(self, cwd):
+        best = None
+        for path, profile in self.packages.items():
+            if (cwd == path or cwd.startswith(path + os.sep)) and (best is None or len(path) > len(best.path)):
+                best = profile
+        return best or self.root
+
+    def _sample(self, started, stop):
+        while not stop.wait(self.interval):
+            samples = _proc_samples()
+            elapsed = time.monotonic() - started
+            self.peak_rss_kb = max(self.peak_rss_kb, sum(s.rss_kb for s in samples))
+            by_package = {}
+            for sample in samples:
+                if sample.node:
+                    self.peak_node_rss_kb = max(self.peak_node_rss_kb, sample.rss_kb)
+                totals = by_package.setdefault(id(profile := self._package_for(sample.cwd)), [profile, 0, 0])
+                totals[1] += sample.rss_kb
+                if sample.node:
+                    totals[2] = max(totals[2], sample.rss_kb)
+            for profile, rss_kb, node_kb in by_package.values():
+                profile.peak_rss_mb = max(profile.peak_rss_mb, rss_kb / 1024)
+                profile.peak_node_rss_mb = max(profile.peak_node_rss_mb, node_kb / 1024)
+                if profile.first_seen_s is None:
+                    profile.first_seen_s = elapsed
+                profile.last_seen_s = elapsed
+
+    def run(self):
+        """Profile one build and return a BuildProfile"""
+        env = {**os.environ, **self.env}
+        use_proc = os.path.isdir("/proc/self")
+        stop = threading.Event()
+        started = time.monotonic()
+        sampler = threading.Thread(target=self._sample, args=(started, stop), daemon=True)
+        if use_proc:
+            sampler.start()
+        on_line = (lambda line, stream: self.log(line, "BUILD", stream=stream)) if self.log else None
+        try:
+            with span("build_profile", command=self.command):
+                result = asyncio.run(stream_command(
+                    ["sh", "-c", self.command], cwd=self.project_path, env=env,
+                    timeout=self.timeout, on_line=on_line,
+                ))
+        finally:
+            stop.set()
+            if use_proc:
+                sampler.join()
+        wall_s = time.monotonic() - started
+
+        if not use_proc:
+            import resource
+
+            # ru_maxrss is KiB on Linux, bytes on macOS
+            peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+            self.peak_node_rss_kb = peak // 1024 if sys.platform == "darwin" else peak
+            self.peak_rss_kb = self.peak_node_rss_kb
+
+        peak_node_mb = self.peak_node_rss_kb / 1024
+        configured = configured_heap_mb(self.env.get("NODE_OPTIONS"))
+        packages = sorted(
+            [p for p in [*self.packages.values(), self.root] if p.first_seen_s is not None],
+            key=lambda p: p.peak_rss_mb,
+            reverse=True,
+        )
+        return BuildProfile(
+            command=self.command,
+            returncode=result.returncode,
+            wall_s=wall_s,
+            peak_rss_mb=self.peak_rss_kb / 1024,
+            peak_node_rss_mb=peak_node_mb,
+            configured_heap_mb=configured,
+            # Without a sampled Node process there is nothing to size from
+            recommended_heap_mb=recommend_heap_mb(peak_node_mb) if peak_node_mb else configured,
+            machine_mb=self.machine_mb,
+            oom=result.aborted in ("oom", "killed"),
+            packages=packages,
+            errors=result.errors[-10:],
+            sampler="proc" if use_proc else "rusage",
+        )
+
+
+def save_profile(project_path, profile):
+    path = Path(project_path) / CACHE_DIR / "build-profiles" / f"{int(time.time() * 1000)}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(profile.to_dict(), indent=2))
+    return path
+
+
+def latest_profile(project_path):
+    """The most recently saved profile as a dict, or None"""
+    profiles = sorted((Path(project_path) / CACHE_DIR / "build-profiles").glob("*.json"))
+    for path in reversed(profiles):
+        try:
+            return json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+    return None
+
+
+def heap_advice(project_path):
+    """
+    Compare vercel.json's configured heap with the last profiled build;
+    returns (ok, message), or None when there is nothing to compare
+    """
+    profile = latest_profile(project_path)
+    if not profile or not profile.get("peak_node_rss_mb"):
+        return None
+    _, env = build_config(project_path)
+    configured = configured_heap_mb(env.get("NODE_OPTIONS"))
+    peak = profile["peak_node_rss_mb"]
+    if configured and peak > configured * OOM_RISK_RATIO:
+        return False, (
+            f"configured heap {configured} MB is within {1 - OOM_RISK_RATIO:.0%} of the last profiled "
+            f"peak ({peak:.0f} MB); recommended {profile['recommended_heap_mb']} MB"
+        )
+    return True, f"configured heap {configured or 'default'} MB, last profiled peak {peak:.0f} MB"
+
+
+def apply_heap(project_path, heap_mb):
+    """Write heap_mb into vercel.json's build.env.NODE_OPTIONS"""
+    path = Path(project_path) / "vercel.json"
+    config = json.loads(path.read_text())
+    env = config.setdefault("build", {}).setdefault("env", {})
+    env["NODE_OPTIONS"] = with_heap(env.get("NODE_OPTIONS", ""), heap_mb)
+    path.write_text(json.dumps(config, indent=2) + "\n")
+    return env["NODE_OPTIONS"]
+
+
+def format_profile(profile):
+    """Human-readable profile lines"""
+    lines = [f"{'PACKAGE':<40} {'PEAK MB':>9} {'NODE MB':>9} {'ACTIVE S':>9}"]
+    for package in profile.packages:
+        lines.append(
+            f"{package.name[:39]:<40} {package.peak_rss_mb:9.0f} {package.peak_node_rss_mb:9.0f} {package.wall_s:9.1f}"
+        )
+    configured = f"{profile.configured_heap_mb} MB" if profile.configured_heap_mb else "default"
+    lines.append(
+        f"Build {'ok' if profile.returncode == 0 else f'exit {profile.returncode}'} in {profile.wall_s:.0f}s; "
+        f"peak tree RSS {profile.peak_rss_mb:.0f} MB, largest Node process {profile.peak_node_rss_mb:.0f} MB"
+    )
+    recommended = f"{profile.recommended_heap_mb} MB" if profile.peak_node_rss_mb else "n/a (no Node process seen)"
+    lines.append(f"Heap: configured {configured}, recommended {recommended}")
+    if profile.oom:
+        lines.append("✗ Build ran out of memory with the configured heap")
+    elif profile.at_risk:
+        lines.append(f"✗ Largest Node process used over {OOM_RISK_RATIO:.0%} of the configured heap")
+    if not profile.fits_machine:
+        lines.append(
+            f"✗ Recommended heap exceeds {MACHINE_HEAP_SHARE:.0%} of the {profile.machine_mb} MB build machine"
+        )
+    return lines
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Profile build memory and size NODE_OPTIONS")
+    parser.add_argument("project_path", nargs="?", default=os.getcwd())
+    parser.add_argument("--command", help="Build command (default: vercel.json buildCommand)")
+    parser.add_argument("--heap-mb", type=int, help="Build with this --max-old-space-size instead")
+    parser.add_argument("--machine-mb", type=int, default=DEFAULT_MACHINE_MB)
+    parser.add_argument("--interval", type=float, default=DEFAULT_INTERVAL_S, help="Sampling interval (s)")
+    parser.add_argument("--apply", action="store_true", help="Write the recommended heap to vercel.json")
+    args = parser.parse_args(argv)
+
+    profile = BuildProfiler(
+        args.project_path, args.command, heap_mb=args.heap_mb,
+        interval=args.interval, machine_mb=args.machine_mb,
+    ).run()
+    path = save_profile(args.project_path, profile)
+    print("\n".join(format_profile(profile)))
+    print(f"Profile written to {path}")
+    if args.apply and profile.returncode == 0 and profile.fits_machine and profile.peak_node_rss_mb:
+        print(f"vercel.json NODE_OPTIONS → {apply_heap(args.project_path, profile.recommended_heap_mb)}")
+    return 0 if profile.passed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
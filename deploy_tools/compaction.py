@@ -0,0 +1,211 @@
+"""
+Token-budgeted compaction of agent tool outputs
+Large outputs become short digests; the full text is kept on disk by ID
+"""
+
+import hashlib
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Optional
+
+from deploy_tools.preflight import CACHE_DIR
+from deploy_tools.process import ERROR_PATTERNS, FATAL_PATTERNS
+
+# Per tool result; create_deployment_agent caps the whole prompt at 25000
+DEFAULT_TOOL_BUDGET = 1500
+# Rough size of one token for English text and build logs
+CHARS_PER_TOKEN = 4
+MAX_ERROR_LINES = 8
+MAX_TIMING_LINES = 4
+
+_ERROR_RE = re.compile("|".join(ERROR_PATTERNS + list(FATAL_PATTERNS.values())), re.IGNORECASE)
+_TIMING_RE = re.compile(r"\b\d+(?:\.\d+)?\s?(?:ms|s|m)\b|\b(?:took|elapsed|duration|completed in)\b", re.IGNORECASE)
+
+
+def estimate_tokens(text):
+    """Cheap token estimate; good enough for budgeting, not for billing"""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def output_status(text):
+    """ok / error / unknown from the emoji convention the tools use"""
+    head = text.lstrip()[:2]
+    if head.startswith("❌"):
+        return "error"
+    if head.startswith(("✅", "🚀", "📊", "🔍", "⏭", "🆕", "📄", "⏳")):
+        return "ok"
+    return "unknown"
+
+
+class ArtifactStore:
+    """Content-addressed store of full tool outputs"""
+
+    def __init__(self, root):
+        self.root = Path(root)
+
+    @classmethod
+    def for_project(cls, project_path):
+        return cls(Path(project_path) / CACHE_DIR / "artifacts")
+
+    def put(self, text):
+        artifact_id = hashlib.sha256(text.encode()).hexdigest()[:16]
+        path = self.root / f"{artifact_id}.txt"
+        if not path.exists():
+            self.root.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(".tmp")
+            tmp.write_text(text)
+            os.replace(tmp, path)
+        return artifact_id
+
+    def get(self, artifact_id):
+        if not re.fullmatch(r"[0-9a-f]{16}", artifact_id or ""):
+            raise KeyError(artifact_id)
+        try:
+            return (self.root / f"{artifact_id}.txt").read_text()
+        except FileNotFoundError:
+            raise KeyError(artifact_id) from None
+
+
+@dataclass
+class Digest:
+    """Compacted view of one tool output"""
+
+    text: str
+    status: str
+    raw_tokens: int
+    tokens: int
+    artifact_id: Optional[str] = None
+    errors: List[str] = field(default_factory=list)
+
+    @property
+    def compacted(self):
+        return self.artifact_id is not None
+
+
+def compact(text, budget=DEFAULT_TOOL_BUDGET, store=None, tool=""):
+    """
+    Return a Digest of text that fits in budget tokens. Outputs already
+    within budget pass through unchanged. Otherwise the digest keeps the
+    first line (the tool's verdict), key error lines, timing lines and as
+    much of the tail as fits, and points at the stored full output.
+    """
+    raw_tokens = estimate_tokens(text)
+    status = output_status(text)
+    if raw_tokens <= budget:
+        return Digest(text, status, raw_tokens, raw_tokens)
+
+    artifact_id = store.put(text) if store else None
+    lines = text.splitlines()
+    errors = [line.strip() for line in lines[1:] if _ERROR_RE.search(line)]
+    timings = [line.strip() for line in lines[1:] if _TIMING_RE.search(line) and line.strip() not in errors]
+    reference = f"full output: artifact {artifact_id}" if artifact_id else "full output not stored"
+
+    parts = [
+        lines[0][:400] if lines else "",
+        f"[{tool or 'tool'} output compacted: {len(lines)} lines, ~{raw_tokens} tokens; {reference}]",
+    ]
+    if errors:
+        shown = errors[-MAX_ERROR_LINES:]
+        parts.append(f"errors ({len(errors)}, last {len(shown)}):")
+        parts.extend(f"  {line[:300]}" for line in shown)
+    if timings:
+        parts.append("timings:")
+        parts.extend(f"  {line[:200]}" for line in timings[-MAX_TIMING_LINES:])
+
+    # Fill the rest of the budget with the tail, newest lines last
+    remaining = budget - estimate_tokens("\n".join(parts)) - 8
+    tail = []
+    for line in reversed(lines[1:]):
+        cost = estimate_tokens(line) + 1
+        if cost > remaining:
+            break
+        tail.append(line)
+        remaining -= cost
+    if tail:
+        parts.append(f"last {len(tail)} lines:")
+        parts.extend(reversed(tail))
+
+    digest = "\n".join(parts)
+    return Digest(digest, status, raw_tokens, estimate_tokens(digest), artifact_id, errors)
+
+
+@dataclass
+class TurnUsage:
+    """Token accounting for one tool result handed to the agent"""
+
+    turn: int
+    tool: str
+    raw_tokens: int
+    tokens: int
+    artifact_id: Optional[str]
+    at: float
+
+
+class TokenLedger:
+    """Running per-turn token totals of tool results"""
+
+    def __init__(self, prompt_cap=25000):
+        self.prompt_cap = prompt_cap
+        self.turns: List[TurnUsage] = []
+        self.lock = threading.Lock()
+
+    def add(self, tool, digest):
+        with self.lock:
+            usage = TurnUsage(
+                len(self.turns) + 1, tool, digest.raw_tokens, digest.tokens,
+                digest.artifact_id, time.time(),
+            )
+            self.turns.append(usage)
+        return usage
+
+    @property
+    def total_tokens(self):
+        return sum(turn.tokens for turn in self.turns)
+
+    @property
+    def saved_tokens(self):
+        return sum(turn.raw_tokens - turn.tokens for turn in self.turns)
+
+    def summary(self):
+        return {
+            "turns": len(self.turns),
+            "tokens": self.total_tokens,
+            "saved_tokens": self.saved_tokens,
+            "prompt_cap": self.prompt_cap,
+            "cap_used": round(self.total_tokens / self.prompt_cap, 3) if self.prompt_cap else None,
+        }
+
+
+class OutputCompactor:
+    """Compacts tool outputs for one project and records their token cost"""
+
+    def __init__(self, project_path, budget=None, prompt_cap=25000, log=None):
+        self.store = ArtifactStore.for_project(project_path)
+        self.budget = budget or int(os.environ.get("DEPLOY_TOOL_TOKEN_BUDGET", DEFAULT_TOOL_BUDGET))
+        self.ledger = TokenLedger(prompt_cap)
+        self.log = log
+
+    def __call__(self, tool, output):
+        try:
+            digest = compact(output, self.budget, self.store, tool)
+        except OSError:
+            # The artifact could not be stored; still keep the agent's prompt small
+            digest = compact(output, self.budget, None, tool)
+        usage = self.ledger.add(tool, digest)
+        if self.log:
+            self.log(
+                f"{tool}: {digest.tokens} tokens to agent"
+                + (f" (compacted from {digest.raw_tokens}, artifact {digest.artifact_id})" if digest.compacted else ""),
+                "DEBUG",
+                turn=usage.turn,
+                tool=tool,
+                raw_tokens=digest.raw_tokens,
+                tokens=digest.tokens,
+                artifact_id=digest.artifact_id,
+                total_tokens=self.ledger.total_tokens,
+            )
+        return digest.text
@@ -0,0 +1,313 @@
+"""
+Completion backends for the deployment agency
+Live agency, a deterministic scripted stand-in and a response cache
+"""
+
+import dataclasses
+import hashlib
+import json
+import os
+import statistics
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List
+
+from deploy_tools.compaction import estimate_tokens
+from deploy_tools.preflight import CACHE_DIR
+from deploy_tools.tracing import span
+
+CACHE_FILE = "completions.json"
+DEFAULT_CACHE_TTL_S = 3600
+
+# The routine loop the agency is asked to run: look, deploy, report. Outputs
+# are canned, so the default script load-tests the orchestration without
+# running git, deploying or calling Vercel
+VERIFY_DEPLOY_REPORT = [
+    {
+        "tool": "GitMonitorTool",
+        "args": {},
+        "output": "📊 Recent commits:\n0000000 Scripted commit\n1111111 Earlier scripted commit",
+    },
+    {
+        "tool": "VercelDeploymentTool",
+        "args": {"commit_sha": "HEAD"},
+        "output": "🚀 Deployment triggered successfully: Success: deploy hook started job job_scripted",
+    },
+    {
+        "tool": "VercelStatusTool",
+        "args": {},
+        "output": "🔍 Deployment dpl_scripted: READY (webstudio-scripted.vercel.app)",
+    },
+]
+
+# Tools that change what is deployed; a completion that called one is never replayed
+DEPLOYING_TOOLS = frozenset({"VercelDeploymentTool", "RollbackTool"})
+
+
+@dataclass
+class ToolCall:
+    """One tool invocation made while producing a completion"""
+
+    tool: str
+    args: Dict
+    output: str
+    elapsed_ms: float
+    tokens: int = 0
+    canned: bool = False
+
+
+@dataclass
+class Completion:
+    """Final answer of a backend plus how it was produced"""
+
+    text: str
+    backend: str
+    elapsed_ms: float
+    tool_calls: List[ToolCall] = field(default_factory=list)
+    cached: bool = False
+
+    def to_dict(self):
+        return dataclasses.asdict(self)
+
+    @classmethod
+    def from_dict(cls, data):
+        calls = [ToolCall(**call) for call in data.get("tool_calls", [])]
+        return cls(data["text"], data["backend"], data["elapsed_ms"], calls, data.get("cached", False))
+
+
+class AgencyBackend:
+    """
+    The live model, through an agency_swarm Agency. Its tool calls (and
+    the deploys they trigger) are not visible here, so it is not cacheable.
+    """
+
+    name = "agency"
+    cacheable = False
+
+    def __init__(self, agency):
+        self.agency = agency
+
+    def complete(self, prompt):
+        started = time.perf_counter()
+        with span("completion", backend=self.name):
+            text = self.agency.get_completion(prompt, yield_messages=False)
+        return Completion(str(text), self.name, (time.perf_counter() - started) * 1000)
+
+
+class ScriptedBackend:
+    """
+    Deterministic local stand-in for the model. Runs a fixed sequence of
+    tool calls and reports their outputs. A step with an "output" key
+    returns that text instead of running the tool, which lets the
+    orchestration be load-tested without git, Vercel or the network.
+    Steps that would run one of DEPLOYING_TOOLS fail unless allow_deploy
+    is set. Outputs pass through compactor, like they would on the way to
+    a model.
+    """
+
+    name = "scripted"
+    cacheable = True
+
+    def __init__(self, script=None, tools=None, compactor=None, allow_deploy=False):
+        if tools is None:
+            from deploy_tools.agent_tools import TOOLS as tools
+        self.script = list(script if script is not None else VERIFY_DEPLOY_REPORT)
+        self.tools = tools
+        self.compactor = compactor
+        self.allow_deploy = allow_deploy
+
+    @property
+    def canned(self):
+        """Every step answers from the script; no tool ever runs"""
+        return all("output" in step for step in self.script)
+
+    def call(self, step):
+        name, args = step["tool"], dict(step.get("args", {}))
+        started = time.perf_counter()
+        with span(f"tool:{name}"):
+            if "output" in step:
+                output = step["output"]
+            elif name not in self.tools:
+                output = f"❌ Unknown tool {name}"
+            elif name in DEPLOYING_TOOLS and not self.allow_deploy:
+                output = f"❌ {name} deploys; scripted runs only run it with allow_deploy"
+            else:
+                output = self.tools[name](**args).run()
+            if self.compactor:
+                output = self.compactor(name, output)
+        return ToolCall(
+            name, args, output, (time.perf_counter() - started) * 1000, estimate_tokens(output),
+            canned="output" in step,
+        )
+
+    def complete(self, prompt):
+        started = time.perf_counter()
+        calls = []
+        with span("completion", backend=self.name, steps=len(self.script)):
+            for step in self.script:
+                call = self.call(step)
+                calls.append(call)
+                if step.get("stop_on_error", True) and call.output.startswith("❌"):
+                    break
+        text = "\n\n".join(f"[{call.tool}] {call.output}" for call in calls)
+        return Completion(text, self.name, (time.perf_counter() - started) * 1000, calls)
+
+
+def load_script(path):
+    """Read a scripted tool-call sequence from a JSON list of steps"""
+    steps = json.loads(Path(path).read_text())
+    if not isinstance(steps, list) or not all(isinstance(s, dict) and "tool" in s for s in steps):
+        raise ValueError(f"{path}: expected a JSON list of {{\"tool\": ..., \"args\": ...}} steps")
+    return steps
+
+
+def tool_state(project_path, tools=None):
+    """
+    Hash of what the tools would see: the build-input fingerprint of the
+    working tree and the tool schemas. None when the tree can't be read.
+    """
+    from deploy_tools.fingerprint import compute_fingerprint
+    from deploy_tools.git_tree import GitTreeError
+
+    if tools is None:
+        from deploy_tools.agent_tools import TOOLS as tools
+    try:
+        fingerprint = compute_fingerprint(project_path, "HEAD", include_worktree=True)
+    except (GitTreeError, OSError):
+        return None
+    schemas = {
+        name: [(f.name, str(f.default)) for f in dataclasses.fields(tool)]
+        for name, tool in sorted(tools.items())
+    }
+    return hashlib.sha256(
+        json.dumps([fingerprint.commit, fingerprint.digest, schemas]).encode()
+    ).hexdigest()
+
+
+def replayable(completion):
+    """
+    Whether a completion may be served again: none of its tool calls
+    failed or triggered a deploy. Replaying a deploy would report it
+    without running it; replaying a failure would never retry it. Canned
+    outputs triggered nothing.
+    """
+    if completion.text.startswith("❌"):
+        return False
+    return not any(
+        (call.tool in DEPLOYING_TOOLS and not call.canned) or call.output.startswith("❌")
+        for call in completion.tool_calls
+    )
+
+
+class CachedBackend:
+    """
+    Serve repeated identical completions locally. The key covers the
+    prompt, the backend and the tool state, so any commit or build-input
+    change misses. Unknown tool state, backends whose tool calls can't be
+    inspected and completions that aren't replayable are never cached.
+    """
+
+    def __init__(self, backend, project_path, cache_path=None, ttl_s=DEFAULT_CACHE_TTL_S,
+                 state=tool_state):
+        self.backend = backend
+        self.name = backend.name
+        self.project_path = project_path
+        self.cache_path = Path(cache_path or Path(project_path) / CACHE_DIR / CACHE_FILE)
+        self.ttl_s = ttl_s
+        self.state = state
+        self.hits = 0
+        self.misses = 0
+
+    def _load(self):
+        try:
+            return json.loads(self.cache_path.read_text())
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self, entries):
+        now = time.time()
+        entries = {k: v for k, v in entries.items() if now - v["stored_at"] < self.ttl_s}
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.cache_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(entries, indent=2))
+        os.replace(tmp, self.cache_path)
+
+    def key(self, prompt):
+        if not getattr(self.backend, "cacheable", False):
+            return None
+        # A fully canned script never looks at the tree, so its state doesn't matter
+        state = "canned" if getattr(self.backend, "canned", False) else self.state(self.project_path)
+        if state is None:
+            return None
+        # Scripted backends answer from their script, so it is part of the key
+        script = json.dumps(getattr(self.backend, "script", None), sort_keys=True)
+        return hashlib.sha256(f"{self.backend.name}\0{script}\0{state}\0{prompt}".encode()).hexdigest()
+
+    def complete(self, prompt):
+        started = time.perf_counter()
+        key = self.key(prompt)
+        entries = self._load() if key else {}
+        entry = entries.get(key)
+        if entry and time.time() - entry["stored_at"] < self.ttl_s:
+            self.hits += 1
+            completion = Completion.from_dict(entry["completion"])
+            completion.cached = True
+            completion.elapsed_ms = (time.perf_counter() - started) * 1000
+            return completion
+
+        self.misses += 1
+        completion = self.backend.complete(prompt)
+        if key and replayable(completion):
+            entries[key] = {"stored_at": time.time(), "completion": completion.to_dict()}
+            self._save(entries)
+        return completion
+
+
+def benchmark(backend, prompt, iterations=10):
+    """
+    Run the same prompt repeatedly and summarise per-completion and
+    per-tool-call latency
+    """
+    completions = [backend.complete(prompt) for _ in range(iterations)]
+    totals = [c.elapsed_ms for c in completions]
+    per_tool = {}
+    for completion in completions:
+        # Cached completions replay stored timings; they made no tool calls
+        if completion.cached:
+            continue
+        for call in completion.tool_calls:
+            per_tool.setdefault(call.tool, []).append(call)
+    return {
+        "iterations": iterations,
+        "cached": sum(c.cached for c in completions),
+        "completion_ms": {
+            "min": min(totals),
+            "p50": statistics.median(totals),
+            "max": max(totals),
+        },
+        "tool_calls_ms": {
+            tool: {
+                "calls": len(calls),
+                "p50": statistics.median(c.elapsed_ms for c in calls),
+                "max": max(c.elapsed_ms for c in calls),
+                "tokens": max(c.tokens for c in calls),
+            }
+            for tool, calls in per_tool.items()
+        },
+    }
+
+
+def format_benchmark(summary):
+    """Human-readable benchmark lines"""
+    c = summary["completion_ms"]
+    lines = [
+        f"{summary['iterations']} completions ({summary['cached']} cached): "
+        f"min {c['min']:.1f} ms, p50 {c['p50']:.1f} ms, max {c['max']:.1f} ms",
+        f"{'TOOL':<24} {'CALLS':>6} {'P50 MS':>10} {'MAX MS':>10} {'TOKENS':>8}",
+    ]
+    for tool, stats in summary["tool_calls_ms"].items():
+        lines.append(
+            f"{tool:<24} {stats['calls']:>6} {stats['p50']:>10.2f} {stats['max']:>10.2f} {stats['tokens']:>8}"
+        )
+    return lines
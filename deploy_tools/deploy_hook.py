@@ -0,0 +1,190 @@
+"""
+Deploy-hook trigger client
+One pooled HTTP POST per deploy, with idempotency keys instead of empty commits
+"""
+
+import hashlib
+import json
+import os
+import sys
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Optional
+
+import requests
+
+from deploy_tools.preflight import CACHE_DIR
+from deploy_tools.tracing import span
+from deploy_tools.vercel_status import Backoff, retry_after_seconds, shared_session
+
+LEDGER_FILE = "deploy-hooks.json"
+# A key seen within this window returns the recorded job instead of posting again
+DEFAULT_LEDGER_TTL_S = 3600
+DEFAULT_ATTEMPTS = 3
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class DeployHookError(Exception):
+    """The hook could not be triggered"""
+
+
+def hook_url():
+    """Configured deploy hook URL, or None"""
+    return os.environ.get("DEPLOY_HOOK_URL") or None
+
+
+def idempotency_key(project, commit, attempt=""):
+    """
+    Key for one deploy of a commit. Retries and repeated method calls for
+    the same deploy share it; attempt (e.g. the deploy-slot claim time)
+    keeps a deliberate redeploy of the same commit distinct.
+    """
+    return hashlib.sha256(f"{project}\0{commit}\0{attempt}".encode()).hexdigest()[:32]
+
+
+@dataclass
+class HookResult:
+    """Outcome of a deploy-hook trigger"""
+
+    job_id: Optional[str]
+    state: Optional[str]
+    status_code: Optional[int]
+    attempts: int
+    elapsed_ms: float
+    idempotency_key: str
+    replayed: bool = False
+
+
+class HookLedger:
+    """Jobs already started per idempotency key, shared across processes"""
+
+    def __init__(self, project_path, ttl_s=DEFAULT_LEDGER_TTL_S):
+        self.path = Path(project_path) / CACHE_DIR / LEDGER_FILE
+        self.ttl_s = ttl_s
+
+    def _load(self):
+        try:
+            return json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            return {}
+
+    def get(self, key):
+        entry = self._load().get(key)
+        if entry and time.time() - entry["at"] < self.ttl_s:
+            return entry
+        return None
+
+    def record(self, key, result):
+        now = time.time()
+        data = {k: v for k, v in self._load().items() if now - v["at"] < self.ttl_s}
+        data[key] = {"at": now, "job_id": result.job_id, "state": result.state}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(data, indent=2))
+        os.replace(tmp, self.path)
+
+
+class DeployHookClient:
+    """
+    POST to a deploy hook over the shared keep-alive session. Every request
+    carries an Idempotency-Key header; retries of transient failures reuse
+    it, and the ledger turns repeat triggers of the same key into no-ops.
+    """
+
+    def __init__(self, url=None, ledger=None, session=None, timeout=10,
+                 attempts=DEFAULT_ATTEMPTS, backoff=None, sleep=time.sleep):
+        self.url = url or hook_url()
+        if not self.url:
+            raise DeployHookError("No deploy hook configured (set DEPLOY_HOOK_URL)")
+        self.ledger = ledger
+        self.session = session or shared_session()
+        self.timeout = timeout
+        self.attempts = attempts
+        self.backoff = backoff or Backoff(initial=0.5, maximum=5.0)
+        self.sleep = sleep
+
+    def trigger(self, key):
+        """Start a deploy for key, or return the job a previous trigger started"""
+        started = time.perf_counter()
+        recorded = self.ledger.get(key) if self.ledger else None
+        if recorded:
+            return HookResult(recorded["job_id"], recorded["state"], None, 0,
+                              (time.perf_counter() - started) * 1000, key, replayed=True)
+
+        with span("deploy_hook", attempts=self.attempts) as active:
+            self.backoff.reset()
+            error = None
+            for attempt in range(1, self.attempts + 1):
+                try:
+                    response = self.session.post(
+                        self.url, headers={"Idempotency-Key": key}, timeout=self.timeout
+                    )
+                except requests.RequestException as e:
+                    # The hook may have fired before the connection dropped;
+                    # the retry carries the same key
+                    error = f"{type(e).__name__}: {e}"
+                else:
+                    if response.status_code in (200, 201):
+                        # Accepted is accepted; a body that isn't the usual JSON just has no job id
+                        try:
+                            body = response.json()
+                        except ValueError:
+                            body = None
+                        job = (body.get("job") if isinstance(body, dict) else None) or {}
+                        result = HookResult(
+                            job.get("id"), job.get("state"), response.status_code, attempt,
+                            (time.perf_counter() - started) * 1000, key,
+                        )
+                        if self.ledger:
+                            self.ledger.record(key, result)
+                        if active:
+                            active.set_attribute("job_id", result.job_id or "")
+                        return result
+                    error = f"HTTP {response.status_code}: {response.text[:200]}"
+                    if response.status_code not in RETRY_STATUSES:
+                        break
+                    # Seconds or an HTTP-date; one that can't be parsed falls back to backoff
+                    retry_after = retry_after_seconds(response.headers.get("Retry-After"), None)
+                    if retry_after is not None and attempt < self.attempts:
+                        self.sleep(retry_after)
+                        continue
+                if attempt < self.attempts:
+                    self.sleep(self.backoff.next())
+            raise DeployHookError(f"Deploy hook failed after {attempt} attempt(s): {error}")
+
+
+def trigger_deploy(project_path, key, url=None, **kwargs):
+    """Trigger the project's deploy hook once per key; returns a HookResult"""
+    client = DeployHookClient(url, ledger=HookLedger(project_path), **kwargs)
+    return client.trigger(key)
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Trigger a deploy hook")
+    parser.add_argument("--url", help="Hook URL (default: DEPLOY_HOOK_URL)")
+    parser.add_argument("--key", help="Idempotency key (default: derived from HEAD)")
+    parser.add_argument("--project", default="webstudio")
+    parser.add_argument("--path", default=os.getcwd(), help="Project checkout (default: cwd)")
+    args = parser.parse_args(argv)
+
+    key = args.key
+    if not key:
+        import subprocess
+
+        head = subprocess.run(["git", "rev-parse", "HEAD"], cwd=args.path, capture_output=True, text=True)
+        key = idempotency_key(args.project, head.stdout.strip())
+    try:
+        result = trigger_deploy(args.path, key, args.url)
+    except DeployHookError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    json.dump(asdict(result), sys.stdout, indent=2)
+    print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
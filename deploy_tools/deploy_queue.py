@@ -0,0 +1,196 @@
+"""
+Persistent per-project deploy queue
+File-locked, coalescing: one active deploy and at most one pending commit
+"""
+
+import json
+import os
+import socket
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+from deploy_tools.preflight import CACHE_DIR
+
+# An active entry older than this is assumed to belong to a crashed run
+DEFAULT_STALE_AFTER_S = 2 * 3600
+
+QUEUED = "queued"
+CLAIMED = "claimed"
+DUPLICATE = "duplicate"
+
+
+@dataclass
+class DeployTicket:
+    """A claim on the project's single deploy slot"""
+
+    project: str
+    commit: str
+    source: str
+    pid: int
+    host: str
+    claimed_at: float
+
+
+@dataclass
+class Submission:
+    """What happened to a deploy request"""
+
+    status: str  # claimed | queued | duplicate
+    ticket: Optional[DeployTicket] = None
+    active: Optional[str] = None
+    superseded: Optional[str] = None
+
+
+class DeployQueue:
+    """
+    Deploy requests for one project. A request either claims the deploy
+    slot or becomes the single pending entry, replacing any older pending
+    commit (only the newest commit is worth building). The process holding
+    the slot checks superseded() to cancel work a newer commit obsoletes,
+    and finish() hands it the pending commit as its next claim.
+    """
+
+    def __init__(self, project_path, project, stale_after_s=DEFAULT_STALE_AFTER_S):
+        root = Path(project_path) / CACHE_DIR / "queue"
+        safe = "".join(c if c.isalnum() or c in "-_." else "_" for c in project)
+        self.path = root / f"{safe}.json"
+        self.lock_path = root / f"{safe}.lock"
+        self.project = project
+        self.stale_after_s = stale_after_s
+
+    @contextmanager
+    def _locked(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.lock_path, "a+") as lock:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                state = self._read()
+                yield state
+                tmp = self.path.with_suffix(".tmp")
+                tmp.write_text(json.dumps(state, indent=2))
+                os.replace(tmp, self.path)
+            finally:
+                if fcntl:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _read(self):
+        try:
+            state = json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            state = {}
+        state.setdefault("active", None)
+        state.setdefault("pending", None)
+        state.setdefault("superseded", 0)
+        return state
+
+    def _alive(self, active):
+        if active is None:
+            return False
+        if time.time() - active["claimed_at"] > self.stale_after_s:
+            return False
+        if active["host"] != socket.gethostname():
+            return True
+        try:
+            os.kill(active["pid"], 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    def submit(self, commit, source=""):
+        """Claim the deploy slot for commit, or queue it behind the active deploy"""
+        with self._locked() as state:
+            active = state["active"] if self._alive(state["active"]) else None
+            pending = state["pending"]
+            if active and commit in (active["commit"], (pending or {}).get("commit")):
+                return Submission(DUPLICATE, active=active["commit"])
+
+            superseded = pending["commit"] if pending and pending["commit"] != commit else None
+            if superseded:
+                state["superseded"] += 1
+            if active:
+                state["pending"] = {"commit": commit, "source": source, "requested_at": time.time()}
+                return Submission(QUEUED, active=active["commit"], superseded=superseded)
+
+            ticket = DeployTicket(
+                self.project, commit, source, os.getpid(), socket.gethostname(), time.time()
+            )
+            state["active"] = asdict(ticket)
+            state["pending"] = None
+            return Submission(CLAIMED, ticket, superseded=superseded)
+
+    def pending(self):
+        """Commit waiting for the deploy slot, if any"""
+        pending = self._read()["pending"]
+        return pending["commit"] if pending else None
+
+    def superseded(self, ticket):
+        """True once a newer commit is waiting behind this ticket"""
+        pending = self.pending()
+        return pending is not None and pending != ticket.commit
+
+    def busy(self):
+        """True while a deploy is active or pending"""
+        state = self._read()
+        return self._alive(state["active"]) or state["pending"] is not None
+
+    def finish(self, ticket):
+        """
+        Release the slot. A pending commit is claimed for the caller under
+        the same lock, so it can't be lost or taken in between; returns the
+        ticket for it, which the caller deploys next, or None.
+        """
+        with self._locked() as state:
+            active = state["active"]
+            if active and active["pid"] == ticket.pid and active["claimed_at"] == ticket.claimed_at:
+                state["active"] = active = None
+            pending = state["pending"]
+            # Someone else holds the slot (our claim went stale): the pending commit is theirs
+            if pending is None or self._alive(active):
+                return None
+            claimed = DeployTicket(
+                self.project, pending["commit"], pending.get("source", ""), os.getpid(),
+                socket.gethostname(), time.time()
+            )
+            state["active"] = asdict(claimed)
+            state["pending"] = None
+            return claimed
+
+    def status(self):
+        state = self._read()
+        if not self._alive(state["active"]):
+            state["active"] = None
+        return state
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Show or clear a project's deploy queue")
+    parser.add_argument("project")
+    parser.add_argument("--path", default=os.getcwd(), help="Project checkout (default: cwd)")
+    parser.add_argument("--clear", action="store_true", help="Drop the pending entry")
+    args = parser.parse_args(argv)
+
+    queue = DeployQueue(args.path, args.project)
+    if args.clear:
+        with queue._locked() as state:
+            state["pending"] = None
+    json.dump(queue.status(), sys.stdout, indent=2)
+    print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,378 @@
+"""
+Layer-cache-friendly Docker image builds
+Generates a multi-stage Dockerfile per app and builds it with a local BuildKit cache
+"""
+
+import asyncio
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import List, Optional
+
+from deploy_tools.fingerprint import APP_DIR, ROOT_INPUTS, dependency_closure, workspace_graph
+from deploy_tools.preflight import CACHE_DIR
+from deploy_tools.process import stream_command
+from deploy_tools.tracing import span
+
+BUILD_DIR = "docker"
+BUILDKIT_CACHE_DIR = "buildkit-cache"
+REPORTS_FILE = "docker-builds.json"
+MAX_REPORTS = 20
+PRISMA_DIR = "packages/prisma-client"
+PRISMA_PACKAGE = "@webstudio-is/prisma-client"
+# Root files the workspace build reads besides the lockfile inputs
+ROOT_BUILD_FILES = [".npmrc", "vite.sdk-components.config.ts", "@types"]
+DEFAULT_NODE = "20"
+DEFAULT_PNPM = "9.14.4"
+
+# BuildKit --progress=plain: "#7 [build 3/9] COPY ..." starts a step, "#7 CACHED" reuses it
+_STEP = re.compile(r"^#(\d+) \[[\w-]+ +\d+/\d+\]")
+_CACHED = re.compile(r"^#(\d+) CACHED$")
+
+DOCKERIGNORE = """\
+**/node_modules
+**/.turbo
+.git
+.deploy-cache
+.vercel
+apps/*/build
+packages/*/lib
+**/*.log
+"""
+
+
+@dataclass
+class DockerBuildResult:
+    """One image build: timing, layer-cache reuse and image size"""
+
+    tag: str
+    returncode: Optional[int]
+    elapsed_s: float
+    image_bytes: Optional[int]
+    steps: int
+    cached_steps: int
+    cache_imported: bool
+    dockerfile: str
+    started_at: float = field(default_factory=time.time)
+    errors: List[str] = field(default_factory=list)
+
+    @property
+    def ok(self):
+        return self.returncode == 0
+
+    @property
+    def cache_hit_rate(self):
+        return self.cached_steps / self.steps if self.steps else 0.0
+
+    def to_dict(self):
+        return {**asdict(self), "cache_hit_rate": round(self.cache_hit_rate, 3)}
+
+
+def _package_json(directory):
+    try:
+        return json.loads((Path(directory) / "package.json").read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def pnpm_version(repo_path):
+    """pnpm version pinned by package.json's packageManager field"""
+    spec = _package_json(repo_path).get("packageManager", "")
+    return spec.split("@", 1)[1] if spec.startswith("pnpm@") else DEFAULT_PNPM
+
+
+def node_version(repo_path):
+    try:
+        return (Path(repo_path) / ".nvmrc").read_text().strip().lstrip("v") or DEFAULT_NODE
+    except OSError:
+        return DEFAULT_NODE
+
+
+def workspace_roots(repo_path):
+    """Existing top-level directories of pnpm-workspace.yaml's `dir/*` package globs"""
+    try:
+        text = (Path(repo_path) / "pnpm-workspace.yaml").read_text()
+    except OSError:
+        return []
+    roots = re.findall(r"^\s*-\s*[\"']?([\w.-]+)/\*[\"']?\s*$", text, re.M)
+    return [root for root in dict.fromkeys(roots) if (Path(repo_path) / root).is_dir()]
+
+
+def app_workspace(repo_path, app_dir=APP_DIR, include=(), commit="HEAD"):
+    """(package name, workspace dirs the app's build needs) from the commit's manifests"""
+    include = [d for d in include if d != app_dir]
+    manifests, graph = workspace_graph(repo_path, commit, (app_dir, *include))
+    dirs = set(dependency_closure(graph, app_dir))
+    for extra in include:
+        dirs.add(extra)
+        dirs.update(dependency_closure(graph, extra))
+    dirs.discard(app_dir)
+    name = manifests.get(app_dir, {}).get("name")
+    if not name:
+        raise ValueError(f"{app_dir}/package.json has no package name")
+    return name, sorted(dirs)
+
+
+def render_dockerfile(repo_path, app_dir=APP_DIR, include=(), node=None, pnpm=None):
+    """
+    Multi-stage Dockerfile for one app:
+
+    - fetch: pnpm fetch from the lockfile alone, so source edits keep the
+      dependency layer; pnpm's metadata cache is a BuildKit cache mount
+    - manifests: every workspace package.json and nothing else, so the
+      frozen install sees the same importers as the lockfile
+    - build: only the app's workspace packages (plus the Prisma client it
+      generates), installed offline with dev dependencies from the fetched
+      store and built with their dependencies first
+    - runtime: `pnpm deploy --prod` output started with `pnpm start`
+    """
+    repo = Path(repo_path)
+    prisma = (repo / PRISMA_DIR / "package.json").is_file()
+    name, packages = app_workspace(repo, app_dir, (*include, PRISMA_DIR) if prisma else include)
+    node = node or node_version(repo)
+    pnpm = pnpm or pnpm_version(repo)
+    root_files = [f for f in [*ROOT_INPUTS, *ROOT_BUILD_FILES] if (repo / f).exists()]
+    lock_files = [f for f in ("pnpm-lock.yaml", "pnpm-workspace.yaml", ".npmrc") if f in root_files]
+
+    lines = [
+        "# syntax=docker/dockerfile:1.7",
+        f"# Generated by deploy_tools/docker_build.py for {app_dir}; regenerate instead of editing",
+        f"FROM node:{node}-alpine AS base",
+        "ENV PNPM_HOME=/pnpm PATH=/pnpm:$PATH",
+        f"RUN corepack enable && corepack prepare pnpm@{pnpm} --activate && pnpm config set store-dir /pnpm/store",
+        "WORKDIR /app",
+        "",
+        "FROM base AS fetch",
+        f"COPY {' '.join(lock_files)} ./",
+    ]
+    if "patches" in root_files:
+        lines.append("COPY patches patches")
+    lines += [
+        "RUN --mount=type=cache,id=pnpm-metadata,target=/root/.cache/pnpm pnpm fetch --frozen-lockfile",
+        "",
+    ]
+    roots = workspace_roots(repo)
+    if roots:
+        # Copying the whole tree invalidates this stage on any edit, but the
+        # stripped result is content-identical, so the build stage's
+        # COPY --from=manifests stays cached until a manifest changes
+        lines += [
+            "FROM base AS manifests",
+            *[f"COPY {root} {root}" for root in roots],
+            f"RUN find {' '.join(roots)} -mindepth 2 -maxdepth 2 ! -name package.json -exec rm -rf {{}} +",
+            "",
+        ]
+    # NODE_ENV=production here would make pnpm skip the devDependencies the
+    # build needs (prisma, vite, ...); only the runtime stage sets it
+    lines += [
+        "FROM fetch AS build",
+        "ENV PRISMA_BINARY_TARGET='[\"native\"]'",
+    ]
+    if roots:
+        lines.append("COPY --from=manifests /app ./")
+    rest = [f for f in root_files if f not in lock_files and f != "patches"]
+    files = [f for f in rest if (repo / f).is_file()]
+    if files:
+        lines.append(f"COPY {' '.join(files)} ./")
+    lines += [f"COPY {d} {d}" for d in rest if (repo / d).is_dir()]
+    lines += [f"COPY {d} {d}" for d in packages]
+    filters = f'--filter "{name}..."'
+    if prisma:
+        filters += f' --filter "{PRISMA_PACKAGE}..."'
+    lines += [
+        f"COPY {app_dir} {app_dir}",
+        f"RUN pnpm install --offline --frozen-lockfile {filters}",
+    ]
+    if prisma:
+        lines.append(f"RUN pnpm --filter {PRISMA_PACKAGE} exec prisma generate")
+    lines += [
+        f'RUN pnpm --filter "{name}..." build',
+        f'RUN pnpm --filter "{name}" deploy --prod /out',
+        "",
+        "FROM base AS runtime",
+        "ENV NODE_ENV=production PORT=3000",
+        "WORKDIR /app",
+        "COPY --from=build /out ./",
+    ]
+    # pnpm deploy packs the app like a publish; build output the start script
+    # needs may be gitignored, so copy it explicitly
+    if "build/" in _package_json(repo / app_dir).get("scripts", {}).get("start", ""):
+        lines.append(f"COPY --from=build /app/{app_dir}/build ./build")
+    lines += [
+        "EXPOSE 3000",
+        'CMD ["pnpm", "start"]',
+        "",
+    ]
+    return "\n".join(lines)
+
+
+def write_build_files(repo_path, app_dir=APP_DIR, include=()):
+    """Write the generated Dockerfile and its .dockerignore; returns the Dockerfile path"""
+    directory = Path(repo_path) / CACHE_DIR / BUILD_DIR
+    directory.mkdir(parents=True, exist_ok=True)
+    dockerfile = directory / f"{Path(app_dir).name}.Dockerfile"
+    dockerfile.write_text(render_dockerfile(repo_path, app_dir, include))
+    # BuildKit reads <Dockerfile>.dockerignore next to a Dockerfile outside the context root
+    Path(f"{dockerfile}.dockerignore").write_text(DOCKERIGNORE)
+    return dockerfile
+
+
+def image_size(tag, runner=subprocess.run):
+    result = runner(["docker", "image", "inspect", "--format", "{{.Size}}", tag],
+                    capture_output=True, text=True)
+    try:
+        return int(result.stdout.strip()) if result.returncode == 0 else None
+    except ValueError:
+        return None
+
+
+class DockerImageBuilder:
+    """
+    Build an app image with BuildKit, importing and exporting the layer
+    cache through a local directory under .deploy-cache. The export goes
+    to a fresh directory that replaces the old one, so stale layers don't
+    pile up across builds.
+    """
+
+    def __init__(self, project_path, tag=None, app_dir=APP_DIR, include=(), cache_dir=None,
+                 timeout=3600, log=None):
+        self.project_path = Path(project_path)
+        self.app_dir = app_dir
+        self.include = tuple(include)
+        self.tag = tag or f"webstudio-{Path(app_dir).name}:latest"
+        self.cache_dir = Path(cache_dir) if cache_dir else self.project_path / CACHE_DIR / BUILDKIT_CACHE_DIR
+        self.timeout = timeout
+        self.log = log
+
+    def command(self, dockerfile):
+        args = ["docker", "buildx", "build", "--file", str(dockerfile), "--target", "runtime",
+                "--tag", self.tag, "--load", "--progress", "plain"]
+        if (self.cache_dir / "index.json").exists():
+            args += ["--cache-from", f"type=local,src={self.cache_dir}"]
+        args += ["--cache-to", f"type=local,dest={self.cache_dir}.new,mode=max", "."]
+        return args
+
+    def run(self):
+        """Generate the Dockerfile, build the image and return a DockerBuildResult"""
+        dockerfile = write_build_files(self.project_path, self.app_dir, self.include)
+        args = self.command(dockerfile)
+        steps, cached = set(), set()
+
+        def on_line(line, stream):
+            match = _STEP.match(line)
+            if match:
+                steps.add(match.group(1))
+            match = _CACHED.match(line)
+            if match:
+                cached.add(match.group(1))
+            if self.log:
+                self.log(line, "BUILD", stream=stream)
+
+        started = time.monotonic()
+        with span("image_build", tag=self.tag) as active:
+            result = asyncio.run(stream_command(
+                args, cwd=self.project_path, timeout=self.timeout, on_line=on_line,
+                env={**os.environ, "DOCKER_BUILDKIT": "1"},
+            ))
+            elapsed = time.monotonic() - started
+            if result.ok:
+                exported = Path(f"{self.cache_dir}.new")
+                if exported.exists():
+                    shutil.rmtree(self.cache_dir, ignore_errors=True)
+                    os.replace(exported, self.cache_dir)
+            size = image_size(self.tag) if result.ok else None
+            if active:
+                active.set_attribute("cached_steps", len(cached & steps))
+                active.set_attribute("image_bytes", size or 0)
+
+        return DockerBuildResult(
+            tag=self.tag,
+            returncode=result.returncode,
+            elapsed_s=elapsed,
+            image_bytes=size,
+            steps=len(steps),
+            cached_steps=len(cached & steps),
+            cache_imported="--cache-from" in args,
+            dockerfile=str(dockerfile),
+            errors=result.errors[-10:],
+        )
+
+
+def _reports_path(project_path):
+    return Path(project_path) / CACHE_DIR / REPORTS_FILE
+
+
+def load_reports(project_path):
+    try:
+        return json.loads(_reports_path(project_path).read_text())
+    except (OSError, ValueError):
+        return []
+
+
+def record_report(project_path, result):
+    """Append a build to the report log; returns the previous successful build of the tag"""
+    reports = load_reports(project_path)
+    previous = next((r for r in reversed(reports) if r["tag"] == result.tag and r["returncode"] == 0), None)
+    reports = (reports + [result.to_dict()])[-MAX_REPORTS:]
+    path = _reports_path(project_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(reports, indent=2))
+    os.replace(tmp, path)
+    return previous
+
+
+def _mb(value):
+    return f"{value / 1024 / 1024:.0f} MB" if value else "-"
+
+
+def format_build(result, previous=None):
+    status = "✅" if result.ok else "❌"
+    lines = [
+        f"{status} {result.tag}: {result.elapsed_s:.1f}s, image {_mb(result.image_bytes)}, "
+        f"{result.cached_steps}/{result.steps} steps cached"
+        f"{'' if result.cache_imported else ' (no cache to import yet)'}",
+    ]
+    if previous:
+        lines.append(
+            f"   previous build: {previous['elapsed_s']:.1f}s, image {_mb(previous.get('image_bytes'))} "
+            f"→ {result.elapsed_s - previous['elapsed_s']:+.1f}s"
+        )
+    lines += [f"   {error}" for error in result.errors[-5:]]
+    return lines
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Generate and build a cache-friendly Docker image")
+    parser.add_argument("command", choices=["render", "build"])
+    parser.add_argument("--path", default=os.getcwd(), help="Repository root (default: cwd)")
+    parser.add_argument("--app", default=APP_DIR, help=f"App directory (default: {APP_DIR})")
+    parser.add_argument("--include", action="append", default=[],
+                        help=f"Extra workspace package to build in, e.g. {PRISMA_DIR}")
+    parser.add_argument("--tag", help="Image tag (default: webstudio-<app>:latest)")
+    args = parser.parse_args(argv)
+
+    if args.command == "render":
+        print(render_dockerfile(args.path, args.app, args.include), end="")
+        return 0
+
+    if not shutil.which("docker"):
+        print("❌ docker is not installed", file=sys.stderr)
+        return 1
+    result = DockerImageBuilder(args.path, args.tag, args.app, args.include,
+                                log=lambda line, level, **fields: print(line, flush=True)).run()
+    previous = record_report(args.path, result)
+    print("\n".join(format_build(result, previous)))
+    return 0 if result.ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,234 @@
+"""
+Asynchronous deployment method executor
+Runs deployment methods sequentially, hedged or as a race
+"""
+
+import asyncio
+import inspect
+import time
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional
+
+from deploy_tools.log import event_logger
+from deploy_tools.tracing import span
+
+SEQUENTIAL = "sequential"
+HEDGED = "hedged"
+RACE = "race"
+POLICIES = (SEQUENTIAL, HEDGED, RACE)
+
+
+@dataclass
+class MethodOutcome:
+    """What happened to one deployment method"""
+
+    name: str
+    status: str  # success | failed | error | cancelled | skipped
+    latency_ms: float = 0.0
+    result: object = None
+    error: Optional[str] = None
+
+    @property
+    def success(self):
+        return self.status == "success"
+
+
+@dataclass
+class ExecutionReport:
+    """Outcome of a full executor run"""
+
+    policy: str
+    outcomes: List[MethodOutcome] = field(default_factory=list)
+    winner: Optional[str] = None
+    elapsed_ms: float = 0.0
+    cancelled: Optional[str] = None
+
+    @property
+    def success(self):
+        return self.winner is not None
+
+    def outcome(self, name):
+        return next((o for o in self.outcomes if o.name == name), None)
+
+    def to_dict(self):
+        return {
+            "policy": self.policy,
+            "winner": self.winner,
+            "elapsed_ms": round(self.elapsed_ms, 3),
+            "cancelled": self.cancelled,
+            "methods": [
+                {
+                    "name": o.name,
+                    "status": o.status,
+                    "latency_ms": round(o.latency_ms, 3),
+                    "error": o.error,
+                }
+                for o in self.outcomes
+            ],
+        }
+
+
+def method_name(method):
+    return getattr(method, "__name__", repr(method))
+
+
+class DeploymentExecutor:
+    """
+    Execute deployment methods under a policy:
+
+    - sequential: start the next method only after the previous one failed
+    - hedged: also start the next method once hedge_delay seconds pass
+      without a result from the ones already running
+    - race: start every method at once and keep the first success
+
+    Coroutine methods are cancelled when another method wins; plain
+    callables run in worker threads and their late results are ignored.
+    Fallback methods run only after every primary method failed.
+
+    cancel_when is checked every cancel_poll seconds; once it returns a
+    reason (e.g. "superseded") every running method is cancelled.
+    """
+
+    def __init__(self, methods, policy=SEQUENTIAL, hedge_delay=30.0,
+                 fallbacks=(), is_success: Callable = bool, log=None,
+                 cancel_when: Optional[Callable] = None, cancel_poll=2.0):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown policy {policy!r}; expected one of {POLICIES}")
+        self.methods = list(methods)
+        self.policy = policy
+        self.hedge_delay = hedge_delay
+        self.fallbacks = list(fallbacks)
+        self.is_success = is_success
+        self.log = log or event_logger("executor")
+        self.cancel_when = cancel_when
+        self.cancel_poll = cancel_poll
+
+    async def _invoke(self, method):
+        with span(f"method:{method_name(method)}", policy=self.policy) as active:
+            if inspect.iscoroutinefunction(method):
+                result = await method()
+            else:
+                result = await asyncio.to_thread(method)
+            if active:
+                active.set_attribute("success", bool(self.is_success(result)))
+            return result
+
+    async def _run_group(self, methods, policy, report):
+        queue = list(methods)
+        running = {}
+
+        def launch():
+            method = queue.pop(0)
+            name = method_name(method)
+            self.log(f"Starting {name} ({policy})", "INFO")
+            task = asyncio.ensure_future(self._invoke(method))
+            running[task] = (name, time.perf_counter())
+
+        if not queue:
+            return None
+        launch()
+        if policy == RACE:
+            while queue:
+                launch()
+
+        winner = None
+        try:
+            while running:
+                timeout = self.hedge_delay if policy == HEDGED and queue else None
+                done, _ = await asyncio.wait(
+                    running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    self.log(f"No result after {self.hedge_delay}s, hedging", "WARNING")
+                    launch()
+                    continue
+
+                for task in done:
+                    name, started = running.pop(task)
+                    latency_ms = (time.perf_counter() - started) * 1000
+                    error = task.exception()
+                    if error is not None:
+                        outcome = MethodOutcome(name, "error", latency_ms, error=str(error))
+                    else:
+                        result = task.result()
+                        status = "success" if self.is_success(result) else "failed"
+                        outcome = MethodOutcome(name, status, latency_ms, result=result)
+                    report.outcomes.append(outcome)
+                    self.log(f"{name} {outcome.status} in {latency_ms:.0f} ms", "INFO",
+                             method=name, status=outcome.status, latency_ms=round(latency_ms, 3))
+                    if outcome.success and winner is None:
+                        winner = name
+
+                if winner:
+                    break
+                # A failure is a signal too: move on without waiting for the hedge timer
+                if queue and (policy != SEQUENTIAL or not running):
+                    launch()
+        finally:
+            # Also reached when the whole run is cancelled from outside
+            for task, (name, started) in running.items():
+                task.cancel()
+            for task, (name, started) in running.items():
+                try:
+                    await task
+                except BaseException:
+                    pass
+                latency_ms = (time.perf_counter() - started) * 1000
+                report.outcomes.append(MethodOutcome(name, "cancelled", latency_ms))
+            for method in queue:
+                report.outcomes.append(MethodOutcome(method_name(method), "skipped"))
+        return winner
+
+    async def _execute(self, report):
+        report.winner = await self._run_group(self.methods, self.policy, report)
+        if report.winner is None and self.fallbacks:
+            report.winner = await self._run_group(self.fallbacks, SEQUENTIAL, report)
+
+    async def _watch_cancel(self, work):
+        while not work.done():
+            await asyncio.wait([work], timeout=self.cancel_poll)
+            if work.done():
+                return None
+            reason = await asyncio.to_thread(self.cancel_when)
+            if reason:
+                self.log(f"Cancelling deployment methods: {reason}", "WARNING", reason=str(reason))
+                work.cancel()
+                try:
+                    await work
+                except asyncio.CancelledError:
+                    pass
+                return str(reason)
+        return None
+
+    async def execute(self):
+        """Run the methods and return an ExecutionReport"""
+        report = ExecutionReport(self.policy)
+        started = time.perf_counter()
+        with span("deploy_methods", policy=self.policy) as active:
+            work = asyncio.ensure_future(self._execute(report))
+            if self.cancel_when is None:
+                await work
+            else:
+                report.cancelled = await self._watch_cancel(work)
+                if report.cancelled is None:
+                    await work
+                elif active:
+                    active.set_attribute("cancelled", report.cancelled)
+        report.elapsed_ms = (time.perf_counter() - started) * 1000
+        return report
+
+    def run(self):
+        """Synchronous entry point for scripts"""
+        return asyncio.run(self.execute())
+
+
+def format_outcomes(report):
+    """Render per-method latency lines for a report"""
+    lines = [
+        f"{o.name}: {o.status} ({o.latency_ms:.0f} ms)" + (f" - {o.error}" if o.error else "")
+        for o in report.outcomes
+    ]
+    cancelled = f" (cancelled: {report.cancelled})" if report.cancelled else ""
+    lines.append(f"Policy {report.policy}: winner {report.winner or 'none'} "
+                 f"after {report.elapsed_ms:.0f} ms{cancelled}")
+    return lines
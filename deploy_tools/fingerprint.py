@@ -0,0 +1,204 @@
+"""
+Build-input fingerprinting for incremental deploys
+Skips deploys whose inputs match the last successful deploy
+"""
+
+import hashlib
+import json
+import os
+import subprocess
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from deploy_tools.git_tree import GitTreeError, object_ids, read_blobs
+from deploy_tools.preflight import CACHE_DIR
+
+MANIFEST_FILE = "fingerprints.json"
+APP_DIR = "apps/builder"
+# Repository-level inputs that affect every workspace build
+ROOT_INPUTS = ["pnpm-lock.yaml", "package.json", "pnpm-workspace.yaml", "patches"]
+VERCEL_BUILD_KEYS = ("buildCommand", "installCommand", "outputDirectory", "framework", "build")
+
+
+@dataclass
+class Fingerprint:
+    """Hash of everything that affects the builder build output"""
+
+    digest: str
+    commit: Optional[str]
+    inputs: Dict[str, str] = field(default_factory=dict)
+    dirty: List[str] = field(default_factory=list)
+
+    def changed_inputs(self, previous):
+        """Input paths whose hash differs from a previous manifest entry"""
+        old = previous.get("inputs", {}) if previous else {}
+        keys = set(old) | set(self.inputs)
+        return sorted(key for key in keys if old.get(key) != self.inputs.get(key))
+
+
+def _git(repo_path, *args):
+    result = subprocess.run(
+        ["git", *args], cwd=repo_path, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise GitTreeError(f"git {' '.join(args)} failed: {result.stderr.strip()}")
+    return result.stdout
+
+
+def dirty_paths(repo_path, *paths):
+    """
+    Uncommitted paths under paths, from `git status --porcelain=v1 -z`.
+    A rename or copy entry is followed by its source path as a separate
+    field; both paths changed, so both are returned. Untracked directories
+    are listed file by file, so every returned path can be hashed.
+    """
+    fields = iter(_git(
+        repo_path, "status", "--porcelain=v1", "-z", "--untracked-files=all", "--", *paths
+    ).split("\0"))
+    dirty = []
+    for entry in fields:
+        if not entry:
+            continue
+        dirty.append(entry[3:])
+        if "R" in entry[:2] or "C" in entry[:2]:
+            source = next(fields, "")
+            if source:
+                dirty.append(source)
+    return dirty
+
+
+def workspace_graph(repo_path, commit, extra_dirs=(APP_DIR,)):
+    """
+    ({dir: package.json}, {dir: [workspace dependency dirs]}) for every
+    package under packages/ plus extra_dirs, from the commit's tree
+    """
+    package_dirs = [
+        line for line in _git(repo_path, "ls-tree", "--name-only", commit, "packages/").split()
+        if line
+    ]
+    dirs = package_dirs + [d for d in extra_dirs if d not in package_dirs]
+    blobs = read_blobs(repo_path, [f"{commit}:{d}/package.json" for d in dirs])
+
+    manifests = {}
+    for package_dir in dirs:
+        blob = blobs.get(f"{commit}:{package_dir}/package.json")
+        try:
+            manifests[package_dir] = json.loads(blob) if blob else {}
+        except ValueError:
+            manifests[package_dir] = {}
+
+    by_name = {}
+    for package_dir in package_dirs:
+        name = manifests[package_dir].get("name")
+        if name:
+            by_name[name] = package_dir
+
+    graph = {}
+    for package_dir, package_json in manifests.items():
+        deps = {}
+        for key in ("dependencies", "devDependencies", "peerDependencies"):
+            deps.update(package_json.get(key) or {})
+        graph[package_dir] = [by_name[name] for name, spec in deps.items()
+                              if str(spec).startswith("workspace:") and name in by_name]
+    return manifests, graph
+
+
+def dependency_closure(graph, package_dir):
+    """Workspace dirs package_dir depends on, transitively"""
+    seen = set()
+    pending = list(graph.get(package_dir, []))
+    while pending:
+        dep = pending.pop()
+        if dep in seen:
+            continue
+        seen.add(dep)
+        pending.extend(graph.get(dep, []))
+    seen.discard(package_dir)
+    return sorted(seen)
+
+
+def workspace_dependencies(repo_path, commit, app_dir=APP_DIR):
+    """
+    Workspace package directories the app depends on, transitively,
+    resolved from package.json files in the commit's tree.
+    """
+    _, graph = workspace_graph(repo_path, commit, (app_dir,))
+    return dependency_closure(graph, app_dir)
+
+
+def _vercel_build_config(repo_path, commit):
+    blob = read_blobs(repo_path, [f"{commit}:vercel.json"]).get(f"{commit}:vercel.json")
+    try:
+        config = json.loads(blob) if blob else {}
+    except ValueError:
+        config = {}
+    return json.dumps({key: config.get(key) for key in VERCEL_BUILD_KEYS}, sort_keys=True)
+
+
+def compute_fingerprint(repo_path, commit="HEAD", include_worktree=True, app_dir=APP_DIR):
+    """
+    Fingerprint the builder build inputs at a commit.
+
+    Tree and blob ids come from git, so no file is read or hashed for
+    committed content. With include_worktree, uncommitted changes under
+    the inputs are hashed in as well, since the CLI uploads the working tree.
+    """
+    commit = _git(repo_path, "rev-parse", "--verify", f"{commit}^{{commit}}").strip()
+    paths = [app_dir] + workspace_dependencies(repo_path, commit, app_dir) + ROOT_INPUTS
+
+    resolved = object_ids(repo_path, [f"{commit}:{path}" for path in paths])
+    ids = {path: resolved.get(f"{commit}:{path}") or "missing" for path in paths}
+    ids["vercel.json#build"] = hashlib.sha256(
+        _vercel_build_config(repo_path, commit).encode()
+    ).hexdigest()
+
+    dirty = []
+    if include_worktree:
+        for path in dirty_paths(repo_path, *paths, "vercel.json"):
+            full_path = Path(repo_path) / path
+            digest = hashlib.sha256()
+            if full_path.is_file():
+                digest.update(full_path.read_bytes())
+            ids[f"worktree:{path}"] = digest.hexdigest()
+            dirty.append(path)
+
+    combined = hashlib.sha256()
+    for key in sorted(ids):
+        combined.update(f"{key}\0{ids[key]}\n".encode())
+    return Fingerprint(combined.hexdigest(), commit, ids, dirty)
+
+
+class FingerprintStore:
+    """Local manifest of the last successful deploy per project"""
+
+    def __init__(self, repo_path, path=None):
+        self.path = Path(path) if path else Path(repo_path) / CACHE_DIR / MANIFEST_FILE
+
+    def load(self):
+        try:
+            return json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            return {}
+
+    def last(self, project):
+        return self.load().get(project)
+
+    def matches(self, project, fingerprint):
+        entry = self.last(project)
+        return bool(entry) and entry.get("fingerprint") == fingerprint.digest
+
+    def record(self, project, fingerprint, method=None):
+        data = self.load()
+        data[project] = {
+            "fingerprint": fingerprint.digest,
+            "commit": fingerprint.commit,
+            "method": method,
+            "deployed_at": time.time(),
+            "inputs": fingerprint.inputs,
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(data, indent=2, sort_keys=True))
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,251 @@
+"""
+Fleet deployment scheduler for Webstudio-derived sites
+Bounded worker pool with per-provider limits and a priority queue
+"""
+
+import heapq
+import itertools
+import json
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from deploy_tools.log import event_logger
+
+TEMPLATE_PROVIDERS = {
+    "defaults": "vercel",
+    "react-router": "vercel",
+    "react-router-vercel": "vercel",
+    "ssg": "vercel",
+    "ssg-vercel": "vercel",
+    "react-router-netlify": "netlify",
+    "ssg-netlify": "netlify",
+    "cloudflare": "cloudflare",
+    "react-router-cloudflare": "cloudflare",
+    "react-router-docker": "docker",
+}
+
+DEFAULT_PROVIDER_LIMITS = {"vercel": 4, "netlify": 2, "cloudflare": 2, "docker": 1}
+DEFAULT_WORKERS = 8
+
+
+class ManifestError(Exception):
+    """Raised for malformed fleet manifests"""
+
+
+@dataclass
+class FleetProject:
+    """One site in the fleet manifest"""
+
+    name: str
+    path: str
+    template: str
+    provider: str
+    priority: int = 0
+    preflight: bool = True
+    options: Dict = field(default_factory=dict)
+
+
+@dataclass
+class FleetResult:
+    """Outcome of one project's preflight and deploy"""
+
+    project: FleetProject
+    status: str  # deployed | failed | preflight-failed | error
+    preflight_s: float = 0.0
+    queued_s: float = 0.0
+    deploy_s: float = 0.0
+    error: Optional[str] = None
+
+
+@dataclass
+class FleetManifest:
+    """Projects plus scheduling limits"""
+
+    projects: List[FleetProject]
+    workers: int = DEFAULT_WORKERS
+    provider_limits: Dict[str, int] = field(default_factory=lambda: dict(DEFAULT_PROVIDER_LIMITS))
+
+
+def load_manifest(path):
+    """
+    Load a JSON manifest:
+
+    {"workers": 8, "provider_limits": {"vercel": 4},
+     "projects": [{"name": "site", "path": "/srv/site",
+                   "template": "react-router-vercel", "priority": 10}]}
+
+    A project may list candidate "providers" with "prefer": "fastest" or
+    "cheapest" (plus "provider_costs" and per-provider "provider_options");
+    fleet_deployment picks one before scheduling.
+    """
+    try:
+        data = json.loads(Path(path).read_text())
+    except (OSError, ValueError) as e:
+        raise ManifestError(f"Cannot read manifest {path}: {e}") from e
+
+    projects = []
+    for index, entry in enumerate(data.get("projects", [])):
+        missing = [key for key in ("name", "path", "template") if key not in entry]
+        if missing:
+            raise ManifestError(f"Project #{index} is missing {', '.join(missing)}")
+        template = entry["template"]
+        provider = entry.get("provider") or TEMPLATE_PROVIDERS.get(template)
+        if provider is None:
+            raise ManifestError(f"Project {entry['name']}: unknown template {template!r}")
+        known = {"name", "path", "template", "provider", "priority", "preflight"}
+        projects.append(FleetProject(
+            name=entry["name"],
+            path=entry["path"],
+            template=template,
+            provider=provider,
+            priority=int(entry.get("priority", 0)),
+            preflight=bool(entry.get("preflight", True)),
+            options={k: v for k, v in entry.items() if k not in known},
+        ))
+
+    limits = dict(DEFAULT_PROVIDER_LIMITS)
+    limits.update(data.get("provider_limits", {}))
+    return FleetManifest(projects, int(data.get("workers", DEFAULT_WORKERS)), limits)
+
+
+class FleetScheduler:
+    """
+    Run preflight then deploy for every project in a manifest.
+
+    Preflight only needs a worker. Deploys additionally need a slot for
+    their provider and are picked highest priority first, so a busy
+    provider never blocks projects queued for an idle one.
+    """
+
+    def __init__(self, manifest, preflight: Callable, deploy: Callable, log=None):
+        self.manifest = manifest
+        self.preflight = preflight
+        self.deploy = deploy
+        self.log = log or event_logger("fleet")
+        self.condition = threading.Condition()
+        self.queue = []
+        self.counter = itertools.count()
+        self.active = {provider: 0 for provider in manifest.provider_limits}
+        self.remaining = 0
+        self.results = []
+
+    def _limit(self, provider):
+        return self.manifest.provider_limits.get(provider, 1)
+
+    def _push(self, phase, project, ready_at, preflight_s=0.0):
+        # heapq is a min-heap: negate priority so higher values run first
+        entry = (-project.priority, next(self.counter), phase, project, ready_at, preflight_s)
+        heapq.heappush(self.queue, entry)
+        self.condition.notify_all()
+
+    def _take(self):
+        """Pop the best job that can run now, or None when everything is done"""
+        with self.condition:
+            while True:
+                if self.remaining == 0:
+                    return None
+                skipped = []
+                job = None
+                while self.queue:
+                    entry = heapq.heappop(self.queue)
+                    _, _, phase, project, _, _ = entry
+                    if phase == "deploy" and self.active.get(project.provider, 0) >= self._limit(project.provider):
+                        skipped.append(entry)
+                        continue
+                    job = entry
+                    break
+                for entry in skipped:
+                    heapq.heappush(self.queue, entry)
+                if job:
+                    _, _, phase, project, _, _ = job
+                    if phase == "deploy":
+                        self.active[project.provider] = self.active.get(project.provider, 0) + 1
+                    return job
+                self.condition.wait()
+
+    def _finish(self, result, release=None):
+        with self.condition:
+            if release:
+                self.active[release] -= 1
+            if result:
+                self.results.append(result)
+                self.remaining -= 1
+            self.condition.notify_all()
+
+    def _worker(self):
+        while True:
+            job = self._take()
+            if job is None:
+                return
+            _, _, phase, project, ready_at, preflight_s = job
+            if phase == "preflight":
+                self._run_preflight(project)
+            else:
+                self._run_deploy(project, ready_at, preflight_s)
+
+    def _run_preflight(self, project):
+        started = time.monotonic()
+        try:
+            ok = self.preflight(project) if project.preflight else True
+        except Exception as e:
+            ok, error = False, str(e)
+        else:
+            error = None
+        elapsed = time.monotonic() - started
+        if not ok:
+            status = "error" if error else "preflight-failed"
+            self.log(f"[{project.name}] preflight failed{': ' + error if error else ''}", "WARNING",
+                     project=project.name, status=status)
+            self._finish(FleetResult(project, status, preflight_s=elapsed, error=error))
+            return
+        with self.condition:
+            self._push("deploy", project, time.monotonic(), elapsed)
+
+    def _run_deploy(self, project, ready_at, preflight_s):
+        started = time.monotonic()
+        try:
+            ok = self.deploy(project)
+            error = None
+        except Exception as e:
+            ok, error = False, str(e)
+        status = "deployed" if ok else ("error" if error else "failed")
+        self.log(f"[{project.name}] {status} via {project.provider}",
+                 "SUCCESS" if ok else "ERROR", project=project.name, status=status)
+        self._finish(
+            FleetResult(project, status, preflight_s, started - ready_at,
+                        time.monotonic() - started, error),
+            release=project.provider,
+        )
+
+    def run(self):
+        """Schedule the whole fleet and return results in completion order"""
+        with self.condition:
+            self.remaining = len(self.manifest.projects)
+            for project in self.manifest.projects:
+                self._push("preflight", project, time.monotonic())
+
+        workers = [
+            threading.Thread(target=self._worker, name=f"fleet-{i}", daemon=True)
+            for i in range(max(1, self.manifest.workers))
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return self.results
+
+
+def format_results(results):
+    """Render a fleet summary table"""
+    lines = [f"{'PROJECT':<28} {'PROVIDER':<11} {'STATUS':<17} {'PRE':>6} {'WAIT':>6} {'DEPLOY':>7}"]
+    for r in sorted(results, key=lambda r: (-r.project.priority, r.project.name)):
+        lines.append(
+            f"{r.project.name:<28} {r.project.provider:<11} {r.status:<17} "
+            f"{r.preflight_s:6.1f} {r.queued_s:6.1f} {r.deploy_s:7.1f}"
+        )
+    deployed = sum(1 for r in results if r.status == "deployed")
+    lines.append(f"{deployed}/{len(results)} projects deployed")
+    return lines
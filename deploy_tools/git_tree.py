@@ -0,0 +1,170 @@
+"""
+Git-tree preflight for Webstudio deployments
+Reads check targets straight from commit trees without a checkout
+"""
+
+import subprocess
+import time
+
+from deploy_tools.preflight import CheckResult, PreflightReport, isbot_checks
+from deploy_tools.tracing import span
+
+
+class GitTreeError(Exception):
+    """Raised when git cannot serve the requested objects"""
+
+
+def _header(line):
+    """
+    (object id, type, size) of a cat-file header, or None when git reports
+    the name missing or ambiguous. The name is echoed back verbatim in that
+    case and may contain spaces, so the status is read from the end.
+    """
+    if line.endswith((" missing", " ambiguous")):
+        return None
+    parts = line.rsplit(" ", 2)
+    if len(parts) != 3 or not parts[2].isdigit():
+        return None
+    return parts[0], parts[1], int(parts[2])
+
+
+def read_objects(repo_path, names):
+    """
+    Resolve many object names ("<rev>:<path>", "<rev>^{commit}") with a
+    single `git cat-file --batch` process. Each name maps to an
+    (object_type, content) tuple, or None when git reports it missing.
+    """
+    names = list(dict.fromkeys(names))
+    if not names:
+        return {}
+
+    payload = "".join(f"{name}\n" for name in names).encode()
+    try:
+        with span("git cat-file --batch", objects=len(names)):
+            proc = subprocess.run(
+                ["git", "cat-file", "--batch"],
+                cwd=repo_path,
+                input=payload,
+                capture_output=True,
+                check=True,
+            )
+    except (OSError, subprocess.CalledProcessError) as e:
+        raise GitTreeError(f"git cat-file failed: {e}") from e
+
+    out = proc.stdout
+    objects = {}
+    pos = 0
+    for name in names:
+        newline = out.index(b"\n", pos)
+        header = _header(out[pos:newline].decode(errors="replace"))
+        pos = newline + 1
+        # "<object> missing" / "<object> ambiguous" have no body
+        if header is None:
+            objects[name] = None
+            continue
+        _, object_type, size = header
+        objects[name] = (object_type, out[pos:pos + size])
+        pos += size + 1
+    return objects
+
+
+def read_blobs(repo_path, names):
+    """Like read_objects, but only blob contents are returned"""
+    return {
+        name: obj[1] if obj and obj[0] == "blob" else None
+        for name, obj in read_objects(repo_path, names).items()
+    }
+
+
+def object_ids(repo_path, names):
+    """
+    Resolve object names to their ids with one `git cat-file --batch-check`
+    process, without reading any content. Missing objects map to None.
+    """
+    names = list(dict.fromkeys(names))
+    if not names:
+        return {}
+    payload = "".join(f"{name}\n" for name in names).encode()
+    try:
+        proc = subprocess.run(
+            ["git", "cat-file", "--batch-check"],
+            cwd=repo_path,
+            input=payload,
+            capture_output=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError) as e:
+        raise GitTreeError(f"git cat-file failed: {e}") from e
+    lines = proc.stdout.decode(errors="replace").splitlines()
+    headers = {name: _header(line) for name, line in zip(names, lines)}
+    return {name: header[0] if header else None for name, header in headers.items()}
+
+
+def commit_exists(repo_path, commit):
+    """Check that a revision resolves to a commit object"""
+    name = f"{commit}^{{commit}}"
+    return read_objects(repo_path, [name]).get(name) is not None
+
+
+def preflight_commits(repo_path, commits, checks=None, group_minimums=None):
+    """
+    Run the preflight checks against several commits at once.
+    All blobs for all commits are fetched through one cat-file process.
+    Commits that do not resolve map to None.
+    """
+    checks = list(checks) if checks is not None else isbot_checks()
+    group_minimums = group_minimums or {}
+    commits = list(commits)
+
+    started = time.perf_counter()
+    names = [f"{commit}^{{commit}}" for commit in commits]
+    names += [f"{commit}:{check.path}" for commit in commits for check in checks]
+    objects = read_objects(repo_path, names)
+    read_ms = (time.perf_counter() - started) * 1000
+    # Spread the shared read cost so per-check timings still add up
+    share_ms = read_ms / max(len(objects), 1)
+
+    reports = {}
+    for commit in commits:
+        if objects.get(f"{commit}^{{commit}}") is None:
+            reports[commit] = None
+            continue
+        commit_started = time.perf_counter()
+        results = []
+        for check in checks:
+            check_started = time.perf_counter()
+            obj = objects.get(f"{commit}:{check.path}")
+            content = obj[1] if obj and obj[0] == "blob" else None
+            passed, detail = check.evaluate(content)
+            elapsed_ms = (time.perf_counter() - check_started) * 1000 + share_ms
+            results.append(CheckResult(check, passed, detail, elapsed_ms))
+        elapsed_ms = (time.perf_counter() - commit_started) * 1000 + share_ms * len(checks)
+        reports[commit] = PreflightReport(results, dict(group_minimums), elapsed_ms)
+    return reports
+
+
+def preflight_commit(repo_path, commit, **kwargs):
+    """Run the preflight checks against a single commit tree"""
+    report = preflight_commits(repo_path, [commit], **kwargs)[commit]
+    if report is None:
+        raise GitTreeError(f"Commit {commit} not found")
+    return report
+
+
+if __name__ == "__main__":
+    import os
+    import sys
+
+    from deploy_tools.preflight import format_report
+
+    revisions = sys.argv[1:] or ["HEAD"]
+    all_passed = True
+    for revision, report in preflight_commits(os.getcwd(), revisions).items():
+        print(f"== {revision}")
+        if report is None:
+            print("✗ commit not found")
+            all_passed = False
+            continue
+        print("\n".join(format_report(report)))
+        all_passed = all_passed and report.passed
+    sys.exit(0 if all_passed else 1)
@@ -0,0 +1,316 @@
+"""
+Event-driven git ref watching
+inotify on .git/refs and .git/logs/HEAD, with a stat poller fallback
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+DEFAULT_DEBOUNCE_S = 2.0
+# A continuous stream of pushes still produces a deploy this often
+DEFAULT_MAX_DELAY_S = 30.0
+DEFAULT_POLL_INTERVAL_S = 1.0
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+# Git writes <ref>.lock and renames it over the ref, so moves matter most
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_MOVED_FROM | IN_CREATE | IN_DELETE | IN_ATTRIB
+
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+def git_dir(repo_path):
+    """The repository's .git directory, following a `gitdir:` file"""
+    dot_git = Path(repo_path) / ".git"
+    if dot_git.is_file():
+        target = dot_git.read_text().strip()
+        if target.startswith("gitdir:"):
+            return (Path(repo_path) / target[len("gitdir:"):].strip()).resolve()
+    return dot_git
+
+
+def head_ref(gitdir):
+    """Branch HEAD points at, e.g. refs/heads/main, or None when detached"""
+    try:
+        head = (Path(gitdir) / "HEAD").read_text().strip()
+    except OSError:
+        return None
+    return head[len("ref:"):].strip() if head.startswith("ref:") else None
+
+
+def read_refs(gitdir, prefix="refs/heads/"):
+    """
+    {ref: sha} for branches, read straight from loose ref files and
+    packed-refs so watching never spawns git
+    """
+    gitdir = Path(gitdir)
+    refs = {}
+    try:
+        for line in (gitdir / "packed-refs").read_text().splitlines():
+            if line and line[0] not in "#^":
+                sha, _, name = line.partition(" ")
+                if name.startswith(prefix):
+                    refs[name] = sha
+    except OSError:
+        pass
+    root = gitdir / prefix
+    for path in root.rglob("*") if root.is_dir() else []:
+        if path.is_file() and not path.name.endswith(".lock"):
+            try:
+                sha = path.read_text().strip()
+            except OSError:
+                continue
+            if len(sha) >= 40:
+                refs[path.relative_to(gitdir).as_posix()] = sha
+    return refs
+
+
+class InotifyWatcher:
+    """Blocks until something under the watched git paths changes (Linux)"""
+
+    def __init__(self, gitdir):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.gitdir = Path(gitdir)
+        self.watches = {}
+        # The .git directory itself catches packed-refs and HEAD being replaced
+        self._watch(self.gitdir)
+        self._watch_tree(self.gitdir / "logs")
+        self._watch_tree(self.gitdir / "refs")
+
+    def _watch(self, path):
+        wd = self._add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd >= 0:
+            self.watches[wd] = Path(path)
+
+    def _watch_tree(self, root):
+        if not root.is_dir():
+            return
+        self._watch(root)
+        for path in root.rglob("*"):
+            if path.is_dir():
+                self._watch(path)
+
+    def wait(self, timeout):
+        """True if a change was seen within timeout seconds"""
+        deadline = time.monotonic() + max(0.0, timeout)
+        while True:
+            ready, _, _ = select.select([self.fd], [], [], max(0.0, deadline - time.monotonic()))
+            if not ready:
+                return False
+            if self._drain():
+                return True
+
+    def _drain(self):
+        """Consume queued events; True if any of them is a ref or log change"""
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return False
+        changed = False
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            name = data[offset + _EVENT_HEADER.size:offset + _EVENT_HEADER.size + length].rstrip(b"\0")
+            offset += _EVENT_HEADER.size + length
+            name = os.fsdecode(name)
+            if mask & IN_Q_OVERFLOW:
+                changed = True
+                continue
+            parent = self.watches.get(wd)
+            if parent is None:
+                continue
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO) and parent != self.gitdir:
+                # New namespace such as refs/heads/feature/
+                self._watch_tree(parent / name)
+            if parent == self.gitdir and name not in ("packed-refs", "HEAD"):
+                continue
+            if not name.endswith(".lock"):
+                changed = True
+        return changed
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class StatWatcher:
+    """Portable fallback: compares stat signatures of refs, logs/HEAD and packed-refs"""
+
+    def __init__(self, gitdir, interval=DEFAULT_POLL_INTERVAL_S):
+        self.gitdir = Path(gitdir)
+        self.interval = interval
+        self.signature = self._signature()
+
+    def _signature(self):
+        paths = [self.gitdir / "HEAD", self.gitdir / "packed-refs", self.gitdir / "logs" / "HEAD"]
+        refs = self.gitdir / "refs" / "heads"
+        if refs.is_dir():
+            paths.extend(refs.rglob("*"))
+        signature = {}
+        for path in paths:
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            signature[str(path)] = (stat.st_mtime_ns, stat.st_size)
+        return signature
+
+    def wait(self, timeout):
+        deadline = time.monotonic() + max(0.0, timeout)
+        while True:
+            signature = self._signature()
+            if signature != self.signature:
+                self.signature = signature
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(self.interval, remaining))
+
+    def close(self):
+        pass
+
+
+def create_watcher(gitdir, poll_interval=DEFAULT_POLL_INTERVAL_S):
+    """inotify where available, otherwise the stat poller"""
+    if sys.platform.startswith("linux") and os.environ.get("DEPLOY_WATCH_POLL") != "1":
+        try:
+            return InotifyWatcher(gitdir)
+        except (OSError, AttributeError):
+            pass
+    return StatWatcher(gitdir, poll_interval)
+
+
+@dataclass
+class CommitEvent:
+    """A branch moved: one event per ref per debounced burst"""
+
+    repo: str
+    ref: str
+    old: Optional[str]
+    new: Optional[str]
+    at: float
+
+
+class RefWatcher:
+    """
+    Emits CommitEvents when watched branches move. Changes are debounced:
+    after the first change the watcher waits until the refs have been
+    quiet for `debounce` seconds (at most `max_delay`) and then reports
+    only the tip, so a burst of pushes becomes one event.
+    """
+
+    def __init__(self, repo_path, refs=None, debounce=DEFAULT_DEBOUNCE_S,
+                 max_delay=DEFAULT_MAX_DELAY_S, poll_interval=DEFAULT_POLL_INTERVAL_S, watcher=None):
+        self.repo_path = str(repo_path)
+        self.gitdir = git_dir(repo_path)
+        self.refs = list(refs) if refs else None
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.watcher = watcher or create_watcher(self.gitdir, poll_interval)
+        self.snapshot = self._read()
+        self.stopped = threading.Event()
+
+    @property
+    def mode(self):
+        return "inotify" if isinstance(self.watcher, InotifyWatcher) else "poll"
+
+    def _watched_refs(self):
+        if self.refs:
+            return self.refs
+        head = head_ref(self.gitdir)
+        return [head] if head else []
+
+    def _read(self):
+        refs = read_refs(self.gitdir)
+        return {ref: refs.get(ref) for ref in self._watched_refs()}
+
+    def _settle(self):
+        """Absorb the rest of a burst"""
+        deadline = time.monotonic() + self.max_delay
+        while not self.stopped.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self.watcher.wait(min(self.debounce, remaining)):
+                return
+
+    def poll(self, timeout):
+        """Wait up to timeout seconds for ref moves; returns a list of CommitEvents"""
+        deadline = time.monotonic() + timeout
+        while not self.stopped.is_set():
+            if self.watcher.wait(deadline - time.monotonic()):
+                self._settle()
+                current = self._read()
+                events = [
+                    CommitEvent(self.repo_path, ref, self.snapshot.get(ref), sha, time.time())
+                    for ref, sha in current.items()
+                    if sha != self.snapshot.get(ref)
+                ]
+                self.snapshot = current
+                if events:
+                    return events
+            if time.monotonic() >= deadline:
+                break
+        return []
+
+    def events(self, idle_timeout=1.0):
+        """Yield CommitEvents until stop() is called"""
+        while not self.stopped.is_set():
+            yield from self.poll(idle_timeout)
+
+    def stop(self):
+        self.stopped.set()
+
+    def close(self):
+        self.stop()
+        self.watcher.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Print commit events as branches move")
+    parser.add_argument("repo", nargs="?", default=os.getcwd())
+    parser.add_argument("--ref", action="append", help="Ref to watch (default: the branch HEAD points at)")
+    parser.add_argument("--debounce", type=float, default=DEFAULT_DEBOUNCE_S)
+    args = parser.parse_args(argv)
+
+    with RefWatcher(args.repo, args.ref, args.debounce) as watcher:
+        print(f"Watching {', '.join(watcher._watched_refs())} in {args.repo} ({watcher.mode})")
+        try:
+            for event in watcher.events():
+                print(f"{event.ref}: {(event.old or '-')[:9]} → {(event.new or '-')[:9]}", flush=True)
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,313 @@
+"""
+Persistent deployment history
+Embedded SQLite store shared by smart-deploy.py and deploy-agent.py
+"""
+
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from deploy_tools.preflight import CACHE_DIR
+
+HISTORY_FILE = "history.sqlite3"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS deployments (
+    id INTEGER PRIMARY KEY,
+    project TEXT NOT NULL,
+    commit_sha TEXT,
+    script TEXT,
+    status TEXT NOT NULL,
+    method TEXT,
+    policy TEXT,
+    fingerprint TEXT,
+    started_at REAL NOT NULL,
+    duration_ms REAL,
+    details TEXT
+);
+CREATE INDEX IF NOT EXISTS deployments_project_time ON deployments (project, started_at);
+CREATE INDEX IF NOT EXISTS deployments_project_status_time ON deployments (project, status, started_at);
+CREATE INDEX IF NOT EXISTS deployments_commit ON deployments (commit_sha);
+
+CREATE TABLE IF NOT EXISTS method_attempts (
+    id INTEGER PRIMARY KEY,
+    deployment_id INTEGER NOT NULL REFERENCES deployments (id),
+    project TEXT NOT NULL,
+    method TEXT NOT NULL,
+    status TEXT NOT NULL,
+    latency_ms REAL,
+    started_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS attempts_method_time ON method_attempts (method, started_at);
+CREATE INDEX IF NOT EXISTS attempts_method_latency ON method_attempts (method, status, latency_ms);
+CREATE INDEX IF NOT EXISTS attempts_project_method_time ON method_attempts (project, method, started_at);
+"""
+
+
+@dataclass
+class MethodStats:
+    """Aggregated outcomes for one deployment method"""
+
+    method: str
+    attempts: int
+    successes: int
+    median_ms: Optional[float]
+    p95_ms: Optional[float]
+
+    @property
+    def success_rate(self):
+        return self.successes / self.attempts if self.attempts else None
+
+
+def default_history_path(project_path):
+    return os.environ.get("DEPLOY_HISTORY_DB") or str(Path(project_path) / CACHE_DIR / HISTORY_FILE)
+
+
+class DeploymentHistory:
+    """
+    Append-only record of deploys and per-method attempts.
+    WAL mode lets fleet workers write while others read.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        if self.path != ":memory:":
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def record(self, project, status, commit_sha=None, script=None, execution=None,
+               fingerprint=None, started_at=None, duration_ms=None, details=None):
+        """
+        Store one deploy. execution is an ExecutionReport; its winner and
+        per-method outcomes are recorded alongside the deploy row.
+        """
+        started_at = started_at if started_at is not None else time.time()
+        method = execution.winner if execution else None
+        policy = execution.policy if execution else None
+        if duration_ms is None and execution:
+            duration_ms = execution.elapsed_ms
+        with self.lock, self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO deployments (project, commit_sha, script, status, method, policy,"
+                " fingerprint, started_at, duration_ms, details)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (project, commit_sha, script, status, method, policy, fingerprint,
+                 started_at, duration_ms, json.dumps(details) if details else None),
+            )
+            deployment_id = cursor.lastrowid
+            if execution:
+                self.conn.executemany(
+                    "INSERT INTO method_attempts (deployment_id, project, method, status,"
+                    " latency_ms, started_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    [
+                        (deployment_id, project, o.name, o.status, o.latency_ms, started_at)
+                        for o in execution.outcomes
+                        if o.status != "skipped"
+                    ],
+                )
+        return deployment_id
+
+    def last_good_sha(self, project):
+        """Commit of the most recent successful deploy"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT commit_sha FROM deployments"
+                " WHERE project = ? AND status = 'success' AND commit_sha IS NOT NULL"
+                " ORDER BY started_at DESC LIMIT 1",
+                (project,),
+            ).fetchone()
+        return row["commit_sha"] if row else None
+
+    def successful(self, project, limit=20):
+        """Most recent successful deploys, newest first, with details decoded"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT * FROM deployments WHERE project = ? AND status = 'success'"
+                " ORDER BY started_at DESC LIMIT ?",
+                (project, limit),
+            ).fetchall()
+        deploys = [dict(row) for row in rows]
+        for deploy in deploys:
+            deploy["details"] = json.loads(deploy["details"]) if deploy["details"] else {}
+        return deploys
+
+    def recent(self, project, limit=20):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT * FROM deployments WHERE project = ? ORDER BY started_at DESC LIMIT ?",
+                (project, limit),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def deployments_for_commit(self, commit_sha):
+        """Deploys of a commit; abbreviated SHAs match by prefix"""
+        # A range scan keeps the prefix match on the commit index ("g" sorts after hex digits)
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT * FROM deployments WHERE commit_sha >= ? AND commit_sha < ?"
+                " ORDER BY started_at DESC",
+                (commit_sha.lower(), commit_sha.lower() + "g"),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def _scope(self, method, project, since):
+        clauses, params = ["method = ?"], [method]
+        if project:
+            clauses.append("project = ?")
+            params.append(project)
+        if since:
+            clauses.append("started_at >= ?")
+            params.append(since)
+        return " AND ".join(clauses), params
+
+    def success_rate(self, method, project=None, since=None):
+        """Share of finished attempts of a method that succeeded"""
+        where, params = self._scope(method, project, since)
+        with self.lock:
+            row = self.conn.execute(
+                f"SELECT COUNT(*) AS total, SUM(status = 'success') AS ok FROM method_attempts"
+                f" WHERE {where} AND status != 'cancelled'",
+                params,
+            ).fetchone()
+        return row["ok"] / row["total"] if row["total"] else None
+
+    def duration_percentile(self, method, percentile=0.95, project=None, since=None,
+                            successful_only=True):
+        """
+        Latency percentile (nearest rank) of a method's attempts. Uses the
+        (method, status, latency_ms) index, so no rows are sorted in Python.
+        """
+        where, params = self._scope(method, project, since)
+        if successful_only:
+            where += " AND status = 'success'"
+        with self.lock:
+            total = self.conn.execute(
+                f"SELECT COUNT(*) FROM method_attempts WHERE {where} AND latency_ms IS NOT NULL",
+                params,
+            ).fetchone()[0]
+            if not total:
+                return None
+            offset = max(0, min(total - 1, math.ceil(percentile * total) - 1))
+            row = self.conn.execute(
+                f"SELECT latency_ms FROM method_attempts WHERE {where} AND latency_ms IS NOT NULL"
+                f" ORDER BY latency_ms LIMIT 1 OFFSET ?",
+                params + [offset],
+            ).fetchone()
+        return row[0]
+
+    def attempts(self, project=None, since=None, methods=None):
+        """Raw (method, status, latency_ms, started_at) attempts, newest first"""
+        clauses, params = ["status != 'cancelled'"], []
+        if project:
+            clauses.append("project = ?")
+            params.append(project)
+        if since:
+            clauses.append("started_at >= ?")
+            params.append(since)
+        if methods:
+            clauses.append(f"method IN ({', '.join('?' for _ in methods)})")
+            params.extend(methods)
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT method, status, latency_ms, started_at FROM method_attempts"
+                f" WHERE {' AND '.join(clauses)} ORDER BY started_at DESC",
+                params,
+            ).fetchall()
+        return [tuple(row) for row in rows]
+
+    def methods(self, project=None):
+        with self.lock:
+            if project:
+                rows = self.conn.execute(
+                    "SELECT DISTINCT method FROM method_attempts WHERE project = ?", (project,)
+                ).fetchall()
+            else:
+                rows = self.conn.execute("SELECT DISTINCT method FROM method_attempts").fetchall()
+        return sorted(row[0] for row in rows)
+
+    def method_stats(self, method, project=None, since=None):
+        where, params = self._scope(method, project, since)
+        with self.lock:
+            row = self.conn.execute(
+                f"SELECT COUNT(*) AS total, SUM(status = 'success') AS ok FROM method_attempts"
+                f" WHERE {where} AND status != 'cancelled'",
+                params,
+            ).fetchone()
+        return MethodStats(
+            method,
+            row["total"],
+            row["ok"] or 0,
+            self.duration_percentile(method, 0.5, project, since),
+            self.duration_percentile(method, 0.95, project, since),
+        )
+
+
+def open_history(project_path):
+    """Open the history store for a project, or None if it is unavailable"""
+    try:
+        return DeploymentHistory(default_history_path(project_path))
+    except (OSError, sqlite3.Error):
+        return None
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Query deployment history")
+    parser.add_argument("--db", default=None, help="History database (default: .deploy-cache/history.sqlite3)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    last_good = sub.add_parser("last-good", help="Last successfully deployed commit")
+    last_good.add_argument("project")
+    stats = sub.add_parser("stats", help="Success rate and latency per method")
+    stats.add_argument("--project")
+    stats.add_argument("--days", type=float, help="Only consider the last N days")
+    recent = sub.add_parser("recent", help="Most recent deploys")
+    recent.add_argument("project")
+    recent.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    with DeploymentHistory(args.db or default_history_path(os.getcwd())) as history:
+        if args.command == "last-good":
+            print(history.last_good_sha(args.project) or "none")
+        elif args.command == "stats":
+            since = time.time() - args.days * 86400 if args.days else None
+            print(f"{'METHOD':<32} {'RUNS':>6} {'OK%':>6} {'P50 MS':>10} {'P95 MS':>10}")
+            for method in history.methods(args.project):
+                s = history.method_stats(method, args.project, since)
+                rate = f"{s.success_rate * 100:.0f}" if s.success_rate is not None else "-"
+                p50 = f"{s.median_ms:.0f}" if s.median_ms is not None else "-"
+                p95 = f"{s.p95_ms:.0f}" if s.p95_ms is not None else "-"
+                print(f"{method:<32} {s.attempts:>6} {rate:>6} {p50:>10} {p95:>10}")
+        else:
+            for row in history.recent(args.project, args.limit):
+                started = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(row["started_at"]))
+                print(f"{started}  {row['status']:<8} {(row['commit_sha'] or '-')[:9]:<9} "
+                      f"{row['method'] or '-':<32} {row['duration_ms'] or 0:.0f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    import sys
+
+    sys.exit(main())
@@ -0,0 +1,178 @@
+"""
+Structured logging for the deployment scripts
+JSON-lines events through a non-blocking queue, with optional emoji output
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+ROOT_LOGGER = "deploy"
+
+# Deployment event kinds and the stdlib level each one is logged at
+KIND_LEVELS = {
+    "DEBUG": logging.DEBUG,
+    "INFO": logging.INFO,
+    "SUCCESS": logging.INFO,
+    "DEPLOY": logging.INFO,
+    "CHECK": logging.INFO,
+    "RAW": logging.INFO,
+    "BUILD": logging.INFO,
+    "WARNING": logging.WARNING,
+    "ERROR": logging.ERROR,
+}
+
+KIND_PREFIXES = {
+    "INFO": "ℹ️",
+    "SUCCESS": "✅",
+    "WARNING": "⚠️",
+    "ERROR": "❌",
+    "DEPLOY": "🚀",
+    "CHECK": "🔍",
+    "BUILD": "│",
+}
+
+_RESERVED = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+_listener = None
+_configure_lock = threading.Lock()
+
+
+class MonotonicFilter(logging.Filter):
+    """Stamp records with a monotonic clock reading in the caller's thread"""
+
+    def filter(self, record):
+        if not hasattr(record, "mono"):
+            record.mono = time.monotonic()
+        if not hasattr(record, "kind"):
+            record.kind = record.levelname
+        return True
+
+
+class JSONLinesFormatter(logging.Formatter):
+    """One JSON object per event"""
+
+    def format(self, record):
+        event = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "mono": round(record.mono, 6),
+            "level": record.levelname,
+            "kind": record.kind,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED and key not in event and key not in ("mono", "kind"):
+                event[key] = value
+        if record.exc_info:
+            event["exc"] = self.formatException(record.exc_info)
+        return json.dumps(event, default=str, ensure_ascii=False)
+
+
+class EmojiFormatter(logging.Formatter):
+    """The classic human-readable '[timestamp] emoji message' output"""
+
+    def format(self, record):
+        message = record.getMessage()
+        if record.kind == "RAW":
+            return message
+        timestamp = datetime.fromtimestamp(record.created).strftime("%Y-%m-%d %H:%M:%S")
+        prefix = KIND_PREFIXES.get(record.kind, "📝")
+        return f"[{timestamp}] {prefix} {message}"
+
+
+def configure(json_path=None, human=None, stream=None, level=logging.INFO):
+    """
+    Route the "deploy" logger through a QueueHandler so callers never
+    block on I/O. Handlers run on a background QueueListener thread.
+
+    json_path: file for JSON-lines events ("-" for stdout); defaults to
+    $DEPLOY_LOG_JSON. human: emoji renderer on/off; defaults to on unless
+    $DEPLOY_LOG_HUMAN is "0".
+    """
+    global _listener
+    if _listener is not None:
+        shutdown()
+
+    if json_path is None:
+        json_path = os.environ.get("DEPLOY_LOG_JSON")
+    if human is None:
+        human = os.environ.get("DEPLOY_LOG_HUMAN", "1") != "0"
+    stream = stream or sys.stdout
+
+    handlers = []
+    if human:
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(EmojiFormatter())
+        handlers.append(handler)
+    if json_path == "-":
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(JSONLinesFormatter())
+        handlers.append(handler)
+    elif json_path:
+        handler = logging.FileHandler(json_path, encoding="utf-8")
+        handler.setFormatter(JSONLinesFormatter())
+        handlers.append(handler)
+
+    event_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(event_queue)
+    queue_handler.addFilter(MonotonicFilter())
+
+    root = logging.getLogger(ROOT_LOGGER)
+    root.handlers = [queue_handler]
+    root.setLevel(level)
+    root.propagate = False
+
+    _listener = logging.handlers.QueueListener(event_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def shutdown():
+    """Flush queued events and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.flush()
+            if isinstance(handler, logging.FileHandler):
+                handler.close()
+        _listener = None
+
+
+atexit.register(shutdown)
+
+
+def get_logger(name):
+    """Logger under the deploy hierarchy"""
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+def log_event(logger, message, kind="INFO", **fields):
+    """Log a deployment event of the given kind with structured fields"""
+    if _listener is None:
+        with _configure_lock:
+            if _listener is None:
+                configure()
+    level = KIND_LEVELS.get(kind, logging.INFO)
+    if not logger.isEnabledFor(level):
+        return
+    fields["kind"] = kind
+    logger.log(level, message, extra=fields)
+
+
+def event_logger(name):
+    """A log(message, level) callable for helpers that accept a log hook"""
+    logger = get_logger(name)
+
+    def log(message, level="INFO", **fields):
+        log_event(logger, message, level, **fields)
+
+    return log
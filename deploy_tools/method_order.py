@@ -0,0 +1,167 @@
+"""
+Adaptive deployment method ordering
+Reorders or skips methods using decayed success rate and latency history
+"""
+
+import os
+import random
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+
+from deploy_tools.executor import method_name
+
+DEFAULT_HALF_LIFE_S = 3 * 86400
+DEFAULT_WINDOW_S = 30 * 86400
+DEFAULT_EXPLORATION = 0.1
+# Methods with no successful sample are assumed to take this long
+DEFAULT_LATENCY_MS = 60_000.0
+
+
+@dataclass
+class MethodScore:
+    """Decayed statistics and resulting score for one method"""
+
+    name: str
+    samples: float
+    success_rate: float
+    median_ms: float
+    skipped: bool = False
+
+    @property
+    def expected_cost(self):
+        # Trying methods in ascending latency / success order minimises the
+        # expected time until the first success
+        return self.median_ms / max(self.success_rate, 1e-3)
+
+
+@dataclass
+class OrderDecision:
+    """What the scheduler decided and why"""
+
+    order: List[str]
+    skipped: List[str]
+    scores: List[MethodScore]
+    explored: Optional[str] = None
+
+    def describe(self):
+        parts = [
+            f"{s.name} p={s.success_rate:.2f} p50={s.median_ms / 1000:.1f}s n={s.samples:.1f}"
+            + (" skipped" if s.skipped else "")
+            for s in self.scores
+        ]
+        explored = f"; exploring {self.explored}" if self.explored else ""
+        return f"Method order {' → '.join(self.order)} ({'; '.join(parts)}{explored})"
+
+    def to_dict(self):
+        return {
+            "order": self.order,
+            "skipped": self.skipped,
+            "explored": self.explored,
+            "scores": [
+                {
+                    "method": s.name,
+                    "samples": round(s.samples, 3),
+                    "success_rate": round(s.success_rate, 4),
+                    "median_ms": round(s.median_ms, 1),
+                    "skipped": s.skipped,
+                }
+                for s in self.scores
+            ],
+        }
+
+
+def _weighted_median(pairs):
+    pairs = sorted(pairs)
+    total = sum(weight for _, weight in pairs)
+    running = 0.0
+    for value, weight in pairs:
+        running += weight
+        if running >= total / 2:
+            return value
+    return None
+
+
+class AdaptiveMethodOrder:
+    """
+    Order methods by expected cost using a decaying window of history.
+
+    Each attempt is weighted by 0.5 ** (age / half_life), so last week's
+    outage fades out instead of counting forever. Success rates use a
+    Beta(1, 1) prior so unseen methods are neither trusted nor written off.
+    Methods whose decayed success rate falls below skip_below (with enough
+    samples) are dropped, except with probability `exploration`, when one
+    skipped or lower-ranked method is promoted so its estimate can recover.
+    """
+
+    def __init__(self, history, project=None, half_life_s=DEFAULT_HALF_LIFE_S,
+                 window_s=DEFAULT_WINDOW_S, exploration=DEFAULT_EXPLORATION,
+                 skip_below=0.05, min_samples=5.0, rng=None, now=None):
+        self.history = history
+        self.project = project
+        self.half_life_s = half_life_s
+        self.window_s = window_s
+        self.exploration = exploration
+        self.skip_below = skip_below
+        self.min_samples = min_samples
+        self.rng = rng or random.Random()
+        self.now = now
+
+    def scores(self, names):
+        now = self.now if self.now is not None else time.time()
+        attempts = self.history.attempts(self.project, now - self.window_s, names)
+        weights = {name: 0.0 for name in names}
+        successes = {name: 0.0 for name in names}
+        latencies = {name: [] for name in names}
+        for method, status, latency_ms, started_at in attempts:
+            weight = 0.5 ** (max(0.0, now - started_at) / self.half_life_s)
+            weights[method] += weight
+            if status == "success":
+                successes[method] += weight
+                if latency_ms is not None:
+                    latencies[method].append((latency_ms, weight))
+
+        scores = []
+        for name in names:
+            rate = (successes[name] + 1) / (weights[name] + 2)
+            median = _weighted_median(latencies[name]) or DEFAULT_LATENCY_MS
+            skipped = weights[name] >= self.min_samples and rate < self.skip_below
+            scores.append(MethodScore(name, weights[name], rate, median, skipped))
+        return scores
+
+    def decide(self, methods):
+        """Return (ordered_methods, OrderDecision)"""
+        by_name = {method_name(method): method for method in methods}
+        scores = self.scores(list(by_name))
+        ranked = sorted(scores, key=lambda s: s.expected_cost)
+        # Never skip everything: keep the best method even if it looks bad
+        if all(s.skipped for s in ranked):
+            ranked[0].skipped = False
+
+        explored = None
+        if len(ranked) > 1 and self.rng.random() < self.exploration:
+            candidate = self.rng.choice(ranked[1:])
+            candidate.skipped = False
+            ranked.remove(candidate)
+            ranked.insert(0, candidate)
+            explored = candidate.name
+
+        order = [s.name for s in ranked if not s.skipped]
+        skipped = [s.name for s in ranked if s.skipped]
+        decision = OrderDecision(order, skipped, ranked, explored)
+        return [by_name[name] for name in order], decision
+
+
+def adaptive_order(methods, history, project, log=None):
+    """
+    Reorder methods for a project, logging the decision. Returns the
+    original list unchanged when history is unavailable or
+    DEPLOY_ADAPTIVE=0.
+    """
+    if history is None or os.environ.get("DEPLOY_ADAPTIVE", "1") == "0":
+        return list(methods)
+    exploration = float(os.environ.get("DEPLOY_EXPLORATION", DEFAULT_EXPLORATION))
+    ordered, decision = AdaptiveMethodOrder(history, project, exploration=exploration).decide(methods)
+    if log:
+        log(decision.describe(), "CHECK", method_order=decision.to_dict())
+    return ordered
@@ -0,0 +1,433 @@
+"""
+End-to-end benchmark of the deployment pipeline
+Synthetic repos, stubbed git/npx with scripted latencies, baseline regressions
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import shlex
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from deploy_tools.preflight import CACHE_DIR
+from deploy_tools.stub_server import StubDeployHook, StubProviderAPI, StubSite, StubVercelAPI
+
+SCRIPTS_DIR = Path(__file__).resolve().parent.parent
+BASELINE_FILE = "pipeline-bench.json"
+# Slower than the baseline median by both this ratio and this many ms is a regression
+DEFAULT_TOLERANCE = 0.25
+DEFAULT_MIN_DELTA_MS = 100.0
+PROJECT_ID = "prj_bench"
+DEPLOYMENT_ID = "dpl_bench"
+# Spans reported per phase; anything else still counts towards the total
+PHASES = ("preflight", "fingerprint", "deploy_methods", "status_wait", "probe")
+
+
+
+@dataclass
+class Scenario:
+    """Scripted stub behaviour for one benchmark case"""
+
+    name: str
+    description: str
+    # {executable: [{"match": prefix, "latency": s, "exit": code, "stdout": [...], "stderr": [...]}]}
+    stubs: Dict[str, List[Dict]]
+    states: List[str] = field(default_factory=lambda: ["READY"])
+    command: str = "smart-deploy"
+    # Serve a StubDeployHook and set DEPLOY_HOOK_URL
+    deploy_hook: bool = False
+    # Serve a StubProviderAPI of this kind and deploy through its backend
+    provider: Optional[str] = None
+
+
+def _vercel_ok(latency):
+    return [
+        {"match": "npx vercel --version", "latency": 0.05, "stdout": ["Vercel CLI 37.0.0"]},
+        {"match": "npx vercel --prod", "latency": latency,
+         "stdout": ["Building...", "Build completed", "Production: https://dpl-bench.vercel.app"]},
+    ]
+
+
+SCENARIOS = {
+    "webhook": Scenario(
+        "webhook", "Empty-commit push succeeds on the first method",
+        {"git": [{"match": "git push", "latency": 0.3}], "npx": _vercel_ok(1.0)},
+    ),
+    "deploy-hook": Scenario(
+        "deploy-hook", "A deploy-hook POST starts the build; no commit or push",
+        {"npx": _vercel_ok(1.0)},
+        deploy_hook=True,
+    ),
+    "netlify": Scenario(
+        "netlify", "The Netlify backend triggers a build and polls it to ready",
+        {},
+        provider="netlify",
+    ),
+    "fallback": Scenario(
+        "fallback", "Push is rejected; the Vercel CLI method deploys",
+        {
+            "git": [{"match": "git push", "latency": 0.3, "exit": 1,
+                     "stderr": ["error: failed to push some refs"]}],
+            "npx": _vercel_ok(1.0),
+        },
+    ),
+    "all-fail": Scenario(
+        "all-fail", "Every automated method fails; manual instructions run",
+        {
+            "git": [{"match": "git push", "latency": 0.3, "exit": 1,
+                     "stderr": ["fatal: unable to access remote"]}],
+            "npx": [
+                {"match": "npx vercel --version", "latency": 0.05, "stdout": ["Vercel CLI 37.0.0"]},
+                {"match": "npx vercel --prod", "latency": 0.5, "exit": 1,
+                 "stderr": ["Error: Command \"pnpm build\" exited with 1"]},
+            ],
+        },
+    ),
+    "agent": Scenario(
+        "agent", "deploy-agent.py's VercelDeploymentTool, push rejected",
+        {
+            "git": [{"match": "git push", "latency": 0.3, "exit": 1,
+                     "stderr": ["error: failed to push some refs"]}],
+            "npx": _vercel_ok(1.0),
+        },
+        command="deploy-agent",
+    ),
+}
+
+
+BENCH_MOCK = "const isbot = () => false;\nexport { isbot };\nexport default isbot;\n"
+BENCH_VITE_CONFIG = """import { resolve } from "node:path";
+import { defineConfig } from "vite";
+
+export default defineConfig({
+  resolve: {
+    alias: [{ find: "isbot", replacement: resolve("./app/shared/isbot-mock.ts") }],
+  },
+});
+"""
+
+
+def make_synthetic_repo(root, templates=10, files=200, commits=20, file_size=2048):
+    """
+    Create a git repo shaped like the Webstudio monorepo: every file the
+    preflight checks, extra CLI templates, workspace packages and filler
+    sources, with history spread over `commits` commits.
+    """
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+
+    def write(path, text):
+        target = root / path
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_text(text)
+
+    def git(*args):
+        subprocess.run(["git", *args], cwd=root, check=True, capture_output=True)
+
+    git("init", "-q", "-b", "main")
+    git("config", "user.email", "bench@example.com")
+    git("config", "user.name", "bench")
+    git("config", "commit.gpgsign", "false")
+
+    write("vercel.json", json.dumps({
+        "buildCommand": "pnpm --filter='@webstudio-is/builder' build",
+        "build": {"env": {"NODE_OPTIONS": "--max-old-space-size=6144", "SKIP_GLOBAL_ASSIGN_CHECK": "true"}},
+    }, indent=2))
+    write("package.json", json.dumps({"name": "webstudio", "private": True}))
+    write("pnpm-workspace.yaml", "packages:\n  - packages/*\n  - apps/*\n")
+    write("pnpm-lock.yaml", "lockfileVersion: '9.0'\n")
+    write("packages/cli/package.json", json.dumps({"name": "@webstudio-is/cli", "scripts": {"build": "vite build"}}))
+    write("apps/builder/package.json", json.dumps({
+        "name": "@webstudio-is/builder",
+        "scripts": {"build": "remix vite:build"},
+        "dependencies": {"@webstudio-is/cli": "workspace:*"},
+    }))
+    # Every template aliases isbot to its mock; template-0-vercel inherits both from template-0
+    write("packages/cli/src/config.ts", 'export const PROJECT_TEMPLATES = [{ expand: ["template-0", "template-0-vercel"] }];\n')
+    write("packages/cli/templates/template-0-vercel/vercel.json", "{}\n")
+    for index in range(templates):
+        write(f"packages/cli/templates/template-{index}/app/shared/isbot-mock.ts", BENCH_MOCK)
+        write(f"packages/cli/templates/template-{index}/vite.config.ts", BENCH_VITE_CONFIG)
+
+    filler = "x" * max(0, file_size - 40)
+    batches = max(1, commits)
+    for batch in range(batches):
+        for index in range(batch, files, batches):
+            package = f"packages/pkg-{index % 8}"
+            write(f"{package}/package.json", json.dumps({"name": f"@bench/pkg-{index % 8}"}))
+            write(f"{package}/src/file-{index}.ts", f"export const v{index} = {batch}; // {filler}\n")
+        git("add", "-A")
+        git("commit", "-q", "--allow-empty", "-m", f"synthetic commit {batch}")
+    return root
+
+
+def _stub_script(name, rules, real):
+    """
+    POSIX sh stand-in for an executable. Rules are compiled into a case
+    statement rather than read at run time, so a stubbed call costs a
+    shell fork, not an interpreter start, and unmatched git calls stay fast.
+    """
+    lines = ["#!/bin/sh", 'case "$*" in']
+    for rule in rules:
+        prefix = rule["match"][len(name):].strip()
+        lines.append(f"  {shlex.quote(prefix)}*)")
+        if rule.get("latency"):
+            lines.append(f"    sleep {rule['latency']}")
+        lines.extend(f"    echo {shlex.quote(line)}" for line in rule.get("stdout", []))
+        lines.extend(f"    echo {shlex.quote(line)} >&2" for line in rule.get("stderr", []))
+        lines.append(f"    exit {int(rule.get('exit', 0))};;")
+    lines.append("esac")
+    if real:
+        lines.append(f'exec {shlex.quote(real)} "$@"')
+    else:
+        lines.append(f'echo "{name}: no stub for $*" >&2')
+        lines.append("exit 127")
+    return "\n".join(lines) + "\n"
+
+
+def install_stubs(bin_dir, scenario):
+    """Write stub git/npx executables for a scenario; returns bin_dir"""
+    bin_dir = Path(bin_dir)
+    bin_dir.mkdir(parents=True, exist_ok=True)
+    for name in ("git", "npx"):
+        # Unmatched git commands run the real git; npx must be fully scripted
+        real = shutil.which("git") if name == "git" else ""
+        path = bin_dir / name
+        path.write_text(_stub_script(name, scenario.stubs.get(name, []), real))
+        path.chmod(0o755)
+    return bin_dir
+
+
+def _phase_times(trace_path):
+    """{span name: total ms} from an OTLP/JSON trace file"""
+    try:
+        trace = json.loads(Path(trace_path).read_text())
+    except (OSError, ValueError):
+        return {}
+    totals = {}
+    for resource in trace.get("resourceSpans", []):
+        for scope in resource.get("scopeSpans", []):
+            for item in scope.get("spans", []):
+                name = item["name"]
+                if name.startswith("method:"):
+                    key = name
+                elif name in PHASES:
+                    key = name
+                else:
+                    continue
+                ms = (int(item["endTimeUnixNano"]) - int(item["startTimeUnixNano"])) / 1e6
+                totals[key] = totals.get(key, 0.0) + ms
+    return totals
+
+
+@dataclass
+class RunResult:
+    """One end-to-end run"""
+
+    scenario: str
+    returncode: int
+    total_ms: float
+    phases: Dict[str, float]
+
+
+@dataclass
+class ScenarioStats:
+    """Median timings of a scenario's runs"""
+
+    scenario: str
+    runs: int
+    failures: int
+    total_ms: float
+    phases: Dict[str, float]
+    returncodes: List[int] = field(default_factory=list)
+
+
+def run_scenario(scenario, repo, workdir, api, site, hook=None, backend=None):
+    """Run the pipeline once against the synthetic repo; returns a RunResult"""
+    workdir = Path(workdir)
+    bin_dir = install_stubs(workdir / "bin", scenario)
+    trace_path = workdir / f"trace-{time.time_ns()}.json"
+    env = {
+        **os.environ,
+        "PATH": f"{bin_dir}{os.pathsep}{os.environ.get('PATH', '')}",
+        "DEPLOY_PROJECT_PATH": str(repo),
+        "DEPLOY_HISTORY_DB": str(workdir / "history.db"),
+        "DEPLOY_ADAPTIVE": "0",
+        "DEPLOY_POLICY": "sequential",
+        "DEPLOY_LOG_HUMAN": "0",
+        "VERCEL_TOKEN": "bench",
+        "VERCEL_PROJECT_ID": PROJECT_ID,
+        "VERCEL_API_URL": api.url,
+        "DEPLOY_PROBE_URL": site.url,
+        "DEPLOY_PROBE_SAMPLES": "3",
+    }
+    env.pop("VERCEL_TEAM_ID", None)
+    env.pop("DEPLOY_HOOK_URL", None)
+    if hook:
+        env["DEPLOY_HOOK_URL"] = hook.hook_url
+    if backend:
+        env.update({
+            "DEPLOY_PROVIDER": backend.kind,
+            "NETLIFY_API_URL": backend.api_url, "NETLIFY_SITE_ID": "bench", "NETLIFY_AUTH_TOKEN": "bench",
+            "CLOUDFLARE_API_URL": backend.api_url, "CLOUDFLARE_ACCOUNT_ID": "bench",
+            "CLOUDFLARE_PAGES_PROJECT": "bench", "CLOUDFLARE_API_TOKEN": "bench",
+        })
+    else:
+        env.pop("DEPLOY_PROVIDER", None)
+    if scenario.command == "deploy-agent":
+        args = [sys.executable, str(SCRIPTS_DIR / "deploy-agent.py"), "tool", "VercelDeploymentTool",
+                "--commit-sha", "HEAD", "--no-skip-unchanged"]
+        env["DEPLOY_TRACE"] = str(trace_path)
+    else:
+        args = [sys.executable, str(SCRIPTS_DIR / "smart-deploy.py"), "--force", "--quiet",
+                "--trace", str(trace_path)]
+
+    # The scripted deployment stands for the build this run triggers
+    api.positions[DEPLOYMENT_ID] = 0
+    api.created[DEPLOYMENT_ID] = int(time.time() * 1000)
+    started = time.perf_counter()
+    result = subprocess.run(args, cwd=repo, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    total_ms = (time.perf_counter() - started) * 1000
+    if result.returncode not in (0, 1):
+        raise RuntimeError(f"{scenario.name} crashed ({result.returncode}): {result.stderr[-2000:]}")
+    return RunResult(scenario.name, result.returncode, total_ms, _phase_times(trace_path))
+
+
+def run_benchmark(scenarios, runs=5, warmup=1, templates=10, files=200, commits=20, log=print):
+    """Run every scenario `runs` times after `warmup` unmeasured runs; returns [ScenarioStats]"""
+    stats = []
+    with tempfile.TemporaryDirectory(prefix="deploy-bench-") as tmp:
+        tmp = Path(tmp)
+        log(f"Creating synthetic repo: {templates} templates, {files} files, {commits} commits")
+        pristine = make_synthetic_repo(tmp / "pristine", templates, files, commits)
+        for scenario in scenarios:
+            api = StubVercelAPI({DEPLOYMENT_ID: scenario.states}, {PROJECT_ID: [DEPLOYMENT_ID]})
+            hook = StubDeployHook() if scenario.deploy_hook else None
+            backend = StubProviderAPI(scenario.provider, ["building", "ready"]) if scenario.provider else None
+            with api, StubSite() as site, hook or contextlib.nullcontext(), backend or contextlib.nullcontext():
+                # Empty commits and caches from one scenario must not leak into the next
+                repo = tmp / scenario.name / "repo"
+                shutil.copytree(pristine, repo, symlinks=True)
+                results = []
+                for index in range(warmup + runs):
+                    result = run_scenario(scenario, repo, tmp / scenario.name, api, site, hook, backend)
+                    if index >= warmup:
+                        results.append(result)
+                names = sorted({name for r in results for name in r.phases})
+                stats.append(ScenarioStats(
+                    scenario.name,
+                    len(results),
+                    sum(1 for r in results if r.returncode != 0),
+                    statistics.median(r.total_ms for r in results),
+                    {name: statistics.median(r.phases.get(name, 0.0) for r in results) for name in names},
+                    [r.returncode for r in results],
+                ))
+                log(f"  {scenario.name}: {stats[-1].total_ms:.0f} ms median over {len(results)} runs")
+    return stats
+
+
+def load_baseline(path):
+    try:
+        return json.loads(Path(path).read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def save_baseline(path, stats, config):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({
+        "recorded_at": time.time(),
+        "config": config,
+        "scenarios": {s.scenario: asdict(s) for s in stats},
+    }, indent=2))
+    return path
+
+
+def compare(stats, baseline, tolerance=DEFAULT_TOLERANCE, min_delta_ms=DEFAULT_MIN_DELTA_MS):
+    """Regression messages for totals and phases slower than the baseline"""
+    regressions = []
+    recorded = (baseline or {}).get("scenarios", {})
+    for s in stats:
+        previous = recorded.get(s.scenario)
+        if not previous:
+            continue
+        if s.failures != previous.get("failures", 0):
+            regressions.append(f"{s.scenario}: {s.failures} failing runs, baseline {previous.get('failures', 0)}")
+        pairs = [("total", s.total_ms, previous.get("total_ms"))]
+        pairs += [(name, ms, previous.get("phases", {}).get(name)) for name, ms in s.phases.items()]
+        for name, current, before in pairs:
+            if before is None:
+                continue
+            limit = max(before * (1 + tolerance), before + min_delta_ms)
+            if current > limit:
+                regressions.append(
+                    f"{s.scenario} {name}: {current:.0f} ms, baseline {before:.0f} ms (limit {limit:.0f} ms)"
+                )
+    return regressions
+
+
+def format_stats(stats, baseline=None):
+    """Human-readable per-scenario, per-phase table"""
+    recorded = (baseline or {}).get("scenarios", {})
+    lines = [f"{'SCENARIO / PHASE':<40} {'MEDIAN MS':>10} {'BASELINE':>10} {'DELTA':>8}"]
+
+    def row(label, current, before):
+        delta = f"{(current - before) / before * 100:+7.0f}%" if before else f"{'':>8}"
+        base = f"{before:10.0f}" if before is not None else f"{'-':>10}"
+        lines.append(f"{label[:39]:<40} {current:10.0f} {base} {delta}")
+
+    for s in stats:
+        previous = recorded.get(s.scenario, {})
+        row(f"{s.scenario} (exit {','.join(map(str, sorted(set(s.returncodes))))})",
+            s.total_ms, previous.get("total_ms"))
+        for name, ms in s.phases.items():
+            row(f"  {name}", ms, previous.get("phases", {}).get(name))
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the deployment pipeline offline")
+    parser.add_argument("scenarios", nargs="*", help=f"Scenarios to run (default: all of {', '.join(SCENARIOS)})")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--templates", type=int, default=10)
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--commits", type=int, default=20)
+    parser.add_argument("--baseline", default=str(SCRIPTS_DIR / CACHE_DIR / BASELINE_FILE))
+    parser.add_argument("--update-baseline", action="store_true", help="Record this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--min-delta-ms", type=float, default=DEFAULT_MIN_DELTA_MS)
+    args = parser.parse_args(argv)
+
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+    scenarios = [SCENARIOS[name] for name in args.scenarios or SCENARIOS]
+    config = {"templates": args.templates, "files": args.files, "commits": args.commits, "runs": args.runs}
+
+    stats = run_benchmark(scenarios, args.runs, args.warmup, args.templates, args.files, args.commits)
+    baseline = load_baseline(args.baseline)
+    print("\n".join(format_stats(stats, baseline)))
+
+    if baseline and baseline.get("config") != config:
+        print(f"! baseline was recorded with {baseline.get('config')}; comparing anyway")
+    regressions = compare(stats, baseline, args.tolerance, args.min_delta_ms)
+    for regression in regressions:
+        print(f"✗ {regression}")
+    if args.update_baseline or baseline is None:
+        print(f"Baseline written to {save_baseline(args.baseline, stats, config)}")
+    return 1 if regressions and not args.update_baseline else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
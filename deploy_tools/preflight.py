@@ -0,0 +1,273 @@
+"""
+Declarative preflight checks for Webstudio deployments
+Runs checks concurrently and caches file results across runs
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+CACHE_DIR = ".deploy-cache"
+CACHE_FILE = "preflight.json"
+CACHE_VERSION = 1
+
+VERCEL_ENHANCEMENTS = ("NODE_OPTIONS", "max-old-space-size", "SKIP_GLOBAL_ASSIGN_CHECK")
+
+
+@dataclass(frozen=True)
+class Check:
+    """A single declarative file check"""
+
+    name: str
+    path: str
+    group: str
+    needles: Tuple[str, ...] = ()
+    min_matches: Optional[int] = None
+    required: bool = True
+
+    @property
+    def key(self):
+        """Stable cache key describing what this check looks for"""
+        return f"{self.group}:{self.min_matches}:{'|'.join(self.needles)}"
+
+    def evaluate(self, content):
+        """Evaluate the check against file bytes (None if the file is missing)"""
+        if content is None:
+            return False, "missing"
+        if not self.needles:
+            return True, "present"
+        text = content.decode("utf-8", errors="replace")
+        found = sum(1 for needle in self.needles if needle in text)
+        needed = len(self.needles) if self.min_matches is None else self.min_matches
+        return found >= needed, f"{found}/{len(self.needles)} markers"
+
+
+@dataclass
+class CheckResult:
+    """Outcome of one check with its timing"""
+
+    check: Check
+    passed: bool
+    detail: str
+    elapsed_ms: float
+    cached: bool = False
+
+
+@dataclass
+class PreflightReport:
+    """Aggregated preflight results"""
+
+    results: List[CheckResult]
+    group_minimums: Dict[str, int] = field(default_factory=dict)
+    elapsed_ms: float = 0.0
+
+    def group(self, name):
+        return [r for r in self.results if r.check.group == name]
+
+    def group_passed(self, name):
+        """A group passes when enough of its required checks pass"""
+        results = [r for r in self.group(name) if r.check.required]
+        passing = sum(1 for r in results if r.passed)
+        return passing >= self.group_minimums.get(name, len(results))
+
+    @property
+    def groups(self):
+        return list(dict.fromkeys(r.check.group for r in self.results))
+
+    @property
+    def passed(self):
+        return all(self.group_passed(name) for name in self.groups)
+
+    @property
+    def missing(self):
+        return [r.check.path for r in self.results if r.detail == "missing" and r.check.required]
+
+    def timings(self):
+        """Per-check timings in milliseconds, slowest first"""
+        return sorted(
+            ((r.check.name, r.elapsed_ms, r.cached) for r in self.results),
+            key=lambda item: item[1],
+            reverse=True,
+        )
+
+    def to_dict(self):
+        return {
+            "passed": self.passed,
+            "elapsed_ms": round(self.elapsed_ms, 3),
+            "groups": {name: self.group_passed(name) for name in self.groups},
+            "checks": [
+                {
+                    "name": r.check.name,
+                    "path": r.check.path,
+                    "group": r.check.group,
+                    "passed": r.passed,
+                    "detail": r.detail,
+                    "elapsed_ms": round(r.elapsed_ms, 3),
+                    "cached": r.cached,
+                }
+                for r in self.results
+            ],
+        }
+
+
+def isbot_checks():
+    """
+    Default isbot fix checks shared by both deployment scripts. Per-template
+    mocks and vite aliases are checked by deploy_tools.template_check.
+    """
+    checks = [Check("file:vercel.json", "vercel.json", "files")]
+    checks.append(
+        Check(
+            "vercel:enhancements",
+            "vercel.json",
+            "vercel-config",
+            needles=VERCEL_ENHANCEMENTS,
+            min_matches=2,
+            required=False,
+        )
+    )
+    return checks
+
+
+class FileCache:
+    """
+    Persistent per-file cache keyed by mtime, size and content hash.
+    Unchanged files are answered from the cache without being read.
+    """
+
+    def __init__(self, cache_path):
+        self.cache_path = Path(cache_path) if cache_path else None
+        self.entries = {}
+        self.dirty = False
+        self.lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        if not self.cache_path or not self.cache_path.exists():
+            return
+        try:
+            data = json.loads(self.cache_path.read_text())
+        except (OSError, ValueError):
+            return
+        if data.get("version") == CACHE_VERSION:
+            self.entries = data.get("files", {})
+
+    def save(self):
+        if not self.cache_path or not self.dirty:
+            return
+        try:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.cache_path.with_suffix(".tmp")
+            with self.lock:
+                payload = {"version": CACHE_VERSION, "files": self.entries}
+                tmp_path.write_text(json.dumps(payload, sort_keys=True))
+            os.replace(tmp_path, self.cache_path)
+            self.dirty = False
+        except OSError:
+            pass
+
+    def lookup(self, path, check):
+        """Return (passed, detail, cached) for a check on a working-tree file"""
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            passed, detail = check.evaluate(None)
+            return passed, detail, False
+
+        with self.lock:
+            entry = self.entries.get(str(path))
+        signature = [stat.st_mtime_ns, stat.st_size]
+
+        if entry and entry.get("signature") == signature and check.key in entry["results"]:
+            passed, detail = entry["results"][check.key]
+            return passed, detail, True
+
+        content = Path(path).read_bytes()
+        digest = hashlib.sha256(content).hexdigest()
+
+        # Touched but unchanged: keep prior results, just refresh the signature
+        if entry and entry.get("sha256") == digest and check.key in entry["results"]:
+            passed, detail = entry["results"][check.key]
+            with self.lock:
+                entry["signature"] = signature
+                self.dirty = True
+            return passed, detail, True
+
+        passed, detail = check.evaluate(content)
+        with self.lock:
+            if not entry or entry.get("sha256") != digest:
+                entry = {"sha256": digest, "results": {}}
+                self.entries[str(path)] = entry
+            entry["signature"] = signature
+            entry["results"][check.key] = [passed, detail]
+            self.dirty = True
+        return passed, detail, False
+
+
+class PreflightEngine:
+    """
+    Run declarative checks against a project working tree in a thread pool
+    """
+
+    def __init__(self, project_path, checks=None, group_minimums=None,
+                 cache_path=None, use_cache=True, max_workers=8):
+        self.project_path = Path(project_path)
+        self.checks = list(checks) if checks is not None else isbot_checks()
+        self.group_minimums = dict(group_minimums or {})
+        if use_cache and cache_path is None:
+            cache_path = self.project_path / CACHE_DIR / CACHE_FILE
+        self.cache = FileCache(cache_path if use_cache else None)
+        self.max_workers = max_workers
+
+    def _run_check(self, check):
+        started = time.perf_counter()
+        try:
+            passed, detail, cached = self.cache.lookup(self.project_path / check.path, check)
+        except OSError as e:
+            passed, detail, cached = False, f"error: {e}", False
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        return CheckResult(check, passed, detail, elapsed_ms, cached)
+
+    def run(self):
+        """Execute all checks concurrently and return a PreflightReport"""
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            results = list(pool.map(self._run_check, self.checks))
+        self.cache.save()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        return PreflightReport(results, self.group_minimums, elapsed_ms)
+
+
+def format_report(report):
+    """Render a report as human-readable lines"""
+    lines = []
+    for result in report.results:
+        mark = "✓" if result.passed else "✗"
+        source = " (cached)" if result.cached else ""
+        lines.append(
+            f"{mark} {result.check.name}: {result.detail} "
+            f"[{result.elapsed_ms:.2f} ms{source}]"
+        )
+    status = "passed" if report.passed else "failed"
+    lines.append(f"Preflight {status} in {report.elapsed_ms:.1f} ms")
+    return lines
+
+
+def run_preflight(project_path, **kwargs):
+    """Convenience wrapper used by the deployment scripts"""
+    return PreflightEngine(project_path, **kwargs).run()
+
+
+if __name__ == "__main__":
+    import sys
+
+    target = sys.argv[1] if len(sys.argv) > 1 else os.getcwd()
+    preflight = run_preflight(target)
+    print("\n".join(format_report(preflight)))
+    sys.exit(0 if preflight.passed else 1)
@@ -0,0 +1,344 @@
+"""
+Post-deploy health and latency probes
+Concurrent TTFB/latency sampling, cache-header checks and baseline regressions
+"""
+
+import json
+import math
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import urljoin
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from deploy_tools.preflight import CACHE_DIR
+from deploy_tools.tracing import span
+
+DEFAULT_PATHS = ("/",)
+DEFAULT_SAMPLES = 5
+DEFAULT_CONCURRENCY = 8
+# Slower than baseline p95 by both this ratio and this many ms is a regression
+DEFAULT_TOLERANCE = 0.25
+DEFAULT_MIN_DELTA_MS = 50.0
+MAX_DISCOVERED_ASSETS = 5
+BASELINE_FILE = "probe-baselines.json"
+
+_ASSET_REF = re.compile(r"""(?:src|href)=["'](/assets/[^"'?#]+)""")
+
+
+def _percentile(values, percentile):
+    """Nearest-rank percentile, matching DeploymentHistory.duration_percentile"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, min(len(ordered), math.ceil(percentile * len(ordered))))
+    return ordered[rank - 1]
+
+
+def _directives(value):
+    return {part.strip().lower() for part in (value or "").split(",") if part.strip()}
+
+
+def header_rules(vercel_json):
+    """[(compiled source pattern, {header: value})] from vercel.json "headers" """
+    try:
+        config = json.loads(Path(vercel_json).read_text())
+    except (OSError, ValueError):
+        return []
+    rules = []
+    for entry in config.get("headers", []):
+        # Vercel sources are path-to-regexp; "(.*)" groups are already regex
+        pattern = "^" + entry.get("source", "").replace(":path*", ".*") + "$"
+        headers = {h["key"].lower(): h["value"] for h in entry.get("headers", []) if "key" in h}
+        rules.append((re.compile(pattern), headers))
+    return rules
+
+
+def expected_headers(rules, path):
+    expected = {}
+    for pattern, headers in rules:
+        if pattern.match(path):
+            expected.update(headers)
+    return expected
+
+
+@dataclass
+class ProbeSample:
+    """One request"""
+
+    path: str
+    status: Optional[int]
+    ttfb_ms: Optional[float]
+    total_ms: Optional[float]
+    size: int = 0
+    headers: Dict[str, str] = field(default_factory=dict)
+    error: Optional[str] = None
+
+
+@dataclass
+class PathStats:
+    """Latency percentiles and status codes for one path"""
+
+    path: str
+    requests: int
+    errors: int
+    statuses: Dict[int, int]
+    ttfb_p50: Optional[float]
+    ttfb_p95: Optional[float]
+    total_p50: Optional[float]
+    total_p95: Optional[float]
+
+    def to_dict(self):
+        return {
+            "path": self.path,
+            "requests": self.requests,
+            "errors": self.errors,
+            "statuses": {str(k): v for k, v in self.statuses.items()},
+            "ttfb_p50": self.ttfb_p50,
+            "ttfb_p95": self.ttfb_p95,
+            "total_p50": self.total_p50,
+            "total_p95": self.total_p95,
+        }
+
+
+@dataclass
+class ProbeReport:
+    """Everything one probe run found"""
+
+    base_url: str
+    stats: List[PathStats]
+    failures: List[str]
+    warnings: List[str]
+    elapsed_ms: float
+
+    @property
+    def passed(self):
+        return not self.failures
+
+    def to_dict(self):
+        return {
+            "base_url": self.base_url,
+            "passed": self.passed,
+            "failures": self.failures,
+            "warnings": self.warnings,
+            "elapsed_ms": round(self.elapsed_ms, 1),
+            "paths": [s.to_dict() for s in self.stats],
+        }
+
+
+class BaselineStore:
+    """Last passing probe per project, for regression checks"""
+
+    def __init__(self, project_path):
+        self.path = Path(project_path) / CACHE_DIR / BASELINE_FILE
+
+    def _load(self):
+        try:
+            return json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            return {}
+
+    def last(self, project):
+        return self._load().get(project)
+
+    def record(self, project, report, commit=None):
+        data = self._load()
+        data[project] = {
+            "commit": commit,
+            "recorded_at": time.time(),
+            "paths": {s.path: s.to_dict() for s in report.stats},
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(data, indent=2))
+        os.replace(tmp, self.path)
+
+
+class HealthProbe:
+    """
+    Probe a deployed site. Every path is requested `samples` times over a
+    pooled keep-alive client with `concurrency` workers; TTFB is the time
+    until response headers arrive, total includes the body. Asset URLs
+    referenced by the HTML of the first path are probed too, and must
+    carry the Cache-Control configured for them in vercel.json.
+    """
+
+    def __init__(self, base_url, paths=DEFAULT_PATHS, samples=DEFAULT_SAMPLES,
+                 concurrency=DEFAULT_CONCURRENCY, timeout=15, header_rules=(),
+                 discover_assets=True, session=None):
+        self.base_url = base_url.rstrip("/")
+        self.paths = list(paths)
+        self.samples = samples
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.rules = list(header_rules)
+        self.discover_assets = discover_assets
+        self.session = session or self._session(concurrency)
+
+    @staticmethod
+    def _session(pool_size):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def fetch(self, path):
+        started = time.perf_counter()
+        try:
+            with self.session.get(
+                urljoin(self.base_url + "/", path.lstrip("/")), timeout=self.timeout,
+                stream=True, allow_redirects=False,
+            ) as response:
+                ttfb_ms = (time.perf_counter() - started) * 1000
+                body = response.content
+                total_ms = (time.perf_counter() - started) * 1000
+                headers = {k.lower(): v for k, v in response.headers.items()}
+                sample = ProbeSample(path, response.status_code, ttfb_ms, total_ms, len(body), headers)
+                return sample, body
+        except requests.RequestException as e:
+            return ProbeSample(path, None, None, None, error=f"{type(e).__name__}: {e}"), b""
+
+    def _assets(self, html):
+        found = []
+        for match in _ASSET_REF.finditer(html.decode(errors="replace")):
+            if match.group(1) not in found:
+                found.append(match.group(1))
+        return found[:MAX_DISCOVERED_ASSETS]
+
+    def run(self):
+        """Sample every path and return (paths, samples)"""
+        paths = list(self.paths)
+        samples = []
+        with span("probe", base_url=self.base_url), ThreadPoolExecutor(self.concurrency) as pool:
+            # The first request doubles as warm-up and asset discovery
+            first, body = self.fetch(paths[0])
+            if self.discover_assets and first.status == 200:
+                paths += [asset for asset in self._assets(body) if asset not in paths]
+            jobs = [path for path in paths for _ in range(self.samples)]
+            jobs.remove(paths[0])
+            samples = [first] + [sample for sample, _ in pool.map(self.fetch, jobs)]
+        return paths, samples
+
+    def check(self, baseline=None, tolerance=DEFAULT_TOLERANCE, min_delta_ms=DEFAULT_MIN_DELTA_MS):
+        """Run the probe and evaluate it; returns a ProbeReport"""
+        started = time.perf_counter()
+        paths, samples = self.run()
+        failures, warnings, stats = [], [], []
+        for path in paths:
+            mine = [s for s in samples if s.path == path]
+            ok = [s for s in mine if s.error is None]
+            statuses = {}
+            for s in ok:
+                statuses[s.status] = statuses.get(s.status, 0) + 1
+            path_stats = PathStats(
+                path,
+                len(mine),
+                len(mine) - len(ok),
+                statuses,
+                _percentile([s.ttfb_ms for s in ok], 0.5),
+                _percentile([s.ttfb_ms for s in ok], 0.95),
+                _percentile([s.total_ms for s in ok], 0.5),
+                _percentile([s.total_ms for s in ok], 0.95),
+            )
+            stats.append(path_stats)
+
+            errors = [s.error for s in mine if s.error]
+            if errors:
+                failures.append(f"{path}: {len(errors)}/{len(mine)} requests failed ({errors[0]})")
+            bad = sorted(code for code in statuses if code >= 400)
+            if bad:
+                failures.append(f"{path}: HTTP {', '.join(map(str, bad))}")
+
+            expected = expected_headers(self.rules, path)
+            for sample in ok[:1]:
+                for header, value in expected.items():
+                    actual = sample.headers.get(header)
+                    if header == "cache-control":
+                        missing = _directives(value) - _directives(actual)
+                        if missing:
+                            failures.append(
+                                f"{path}: Cache-Control {actual or 'missing'!r} lacks {', '.join(sorted(missing))}"
+                            )
+                    elif actual != value:
+                        failures.append(f"{path}: {header} {actual!r} != {value!r}")
+
+            previous = (baseline or {}).get("paths", {}).get(path)
+            if previous and previous.get("total_p95") and path_stats.total_p95 is not None:
+                limit = max(previous["total_p95"] * (1 + tolerance), previous["total_p95"] + min_delta_ms)
+                if path_stats.total_p95 > limit:
+                    failures.append(
+                        f"{path}: p95 {path_stats.total_p95:.0f} ms regressed from "
+                        f"{previous['total_p95']:.0f} ms (limit {limit:.0f} ms)"
+                    )
+
+        if baseline is None:
+            warnings.append("no baseline yet; latency regressions not checked")
+        if self.rules and not any(expected_headers(self.rules, p) for p in paths):
+            warnings.append("no probed path matched a vercel.json header rule")
+        return ProbeReport(self.base_url, stats, failures, warnings, (time.perf_counter() - started) * 1000)
+
+
+def probe_deployment(base_url, project_path, project, commit=None, paths=None, samples=None,
+                     update_baseline=True, **kwargs):
+    """
+    Probe a deployment against the project's vercel.json header rules and
+    its last passing baseline; a passing run becomes the new baseline
+    """
+    paths = paths or [p for p in os.environ.get("DEPLOY_PROBE_PATHS", "").split(",") if p] or DEFAULT_PATHS
+    samples = samples or int(os.environ.get("DEPLOY_PROBE_SAMPLES", DEFAULT_SAMPLES))
+    probe = HealthProbe(
+        base_url, paths, samples,
+        header_rules=header_rules(Path(project_path) / "vercel.json"), **kwargs
+    )
+    store = BaselineStore(project_path)
+    report = probe.check(store.last(project))
+    if report.passed and update_baseline:
+        store.record(project, report, commit)
+    return report
+
+
+def format_probe_report(report):
+    """Human-readable probe lines"""
+    lines = [f"{'PATH':<40} {'REQ':>4} {'ERR':>4} {'TTFB50':>8} {'TTFB95':>8} {'TOT50':>8} {'TOT95':>8}"]
+    for s in report.stats:
+        fmt = lambda v: f"{v:8.1f}" if v is not None else f"{'-':>8}"
+        lines.append(
+            f"{s.path[:39]:<40} {s.requests:>4} {s.errors:>4} "
+            f"{fmt(s.ttfb_p50)} {fmt(s.ttfb_p95)} {fmt(s.total_p50)} {fmt(s.total_p95)}"
+        )
+    lines.extend(f"✗ {failure}" for failure in report.failures)
+    lines.extend(f"! {warning}" for warning in report.warnings)
+    lines.append(f"Probe {'passed' if report.passed else 'failed'} in {report.elapsed_ms:.0f} ms")
+    return lines
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Probe a deployed site for health and latency")
+    parser.add_argument("base_url")
+    parser.add_argument("--path", action="append", help="Path to probe (repeatable, default /)")
+    parser.add_argument("--samples", type=int)
+    parser.add_argument("--project", default="webstudio")
+    parser.add_argument("--project-path", default=os.getcwd(), help="Checkout with vercel.json")
+    parser.add_argument("--no-baseline", action="store_true", help="Don't update the baseline")
+    args = parser.parse_args(argv)
+
+    report = probe_deployment(
+        args.base_url, args.project_path, args.project, paths=args.path,
+        samples=args.samples, update_baseline=not args.no_baseline,
+    )
+    print("\n".join(format_probe_report(report)))
+    return 0 if report.passed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
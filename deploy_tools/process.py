@@ -0,0 +1,241 @@
+"""
+Asynchronous subprocess helpers for deployment methods
+Child processes are killed when the awaiting task is cancelled
+"""
+
+import asyncio
+import os
+import re
+import signal
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from deploy_tools.tracing import span
+
+
+@dataclass
+class CommandResult:
+    """Exit status and output of a finished command"""
+
+    args: list
+    returncode: int
+    stdout: str
+    stderr: str
+
+
+class CommandTimeout(Exception):
+    """Raised when a command exceeds its timeout"""
+
+
+def _signal(proc, sig):
+    # Commands run in their own session so npx and its children go together
+    try:
+        if hasattr(os, "killpg"):
+            os.killpg(proc.pid, sig)
+        else:
+            proc.send_signal(sig)
+    except ProcessLookupError:
+        pass
+
+
+async def _terminate(proc, grace=5.0):
+    if proc.returncode is not None:
+        return
+    _signal(proc, signal.SIGTERM)
+    try:
+        await asyncio.wait_for(proc.wait(), grace)
+    except asyncio.TimeoutError:
+        _signal(proc, getattr(signal, "SIGKILL", signal.SIGTERM))
+        await proc.wait()
+
+
+async def run_command(args, cwd=None, timeout=None, env=None):
+    """Run a command to completion, killing it on timeout or cancellation"""
+    with span("subprocess", command=" ".join(args[:3])) as active:
+        result = await _run_command(args, cwd, timeout, env)
+        if active:
+            active.set_attribute("returncode", result.returncode)
+        return result
+
+
+async def _run_command(args, cwd, timeout, env):
+    proc = await asyncio.create_subprocess_exec(
+        *args,
+        cwd=cwd,
+        env=env,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        start_new_session=True,
+    )
+    try:
+        stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout)
+    except asyncio.TimeoutError:
+        await _terminate(proc)
+        raise CommandTimeout(f"{' '.join(args)} timed out after {timeout}s")
+    except asyncio.CancelledError:
+        await _terminate(proc)
+        raise
+    return CommandResult(
+        list(args),
+        proc.returncode,
+        stdout.decode(errors="replace"),
+        stderr.decode(errors="replace"),
+    )
+
+
+LINE_LIMIT = 1024 * 1024
+
+# Lines worth keeping from a build log even when they scroll out of the tail
+ERROR_PATTERNS = [
+    r"\berror\b",
+    r"ERR_PNPM_\w+",
+    r"\bfailed\b",
+]
+
+# Lines that mean the build is already dead: waiting for the timeout is pointless
+FATAL_PATTERNS = {
+    "isbot": r"Cannot set properties of undefined \(setting 'isbot'\)",
+    "oom": r"JavaScript heap out of memory|Reached heap limit|FATAL ERROR: .*Allocation failed",
+    "killed": r"^Killed$|\bENOMEM\b",
+}
+
+
+@dataclass
+class StreamResult:
+    """Bounded summary of a streamed command"""
+
+    args: list
+    returncode: Optional[int]
+    tail: List[str]
+    errors: List[str]
+    lines: int = 0
+    aborted: Optional[str] = None
+    elapsed_s: float = 0.0
+    error_lines_dropped: int = 0
+
+    @property
+    def ok(self):
+        return self.returncode == 0 and self.aborted is None
+
+    @property
+    def output(self):
+        return "\n".join(self.tail)
+
+
+@dataclass
+class _StreamState:
+    tail: deque
+    errors: List[str] = field(default_factory=list)
+    lines: int = 0
+    dropped: int = 0
+    fatal: Optional[str] = None
+
+
+async def _read_lines(reader, name, state, error_re, fatal_res, max_errors, on_line, fatal_event):
+    while True:
+        try:
+            raw = await reader.readline()
+        except ValueError:
+            # Line longer than the reader limit: take the next chunk as-is
+            raw = await reader.read(LINE_LIMIT)
+        if not raw:
+            return
+        line = raw.decode(errors="replace").rstrip("\r\n")
+        state.lines += 1
+        state.tail.append(line)
+        if on_line:
+            on_line(line, name)
+        if error_re and error_re.search(line):
+            if len(state.errors) < max_errors:
+                state.errors.append(line)
+            else:
+                state.dropped += 1
+        for label, fatal_re in fatal_res.items():
+            if fatal_re.search(line):
+                if state.fatal is None:
+                    state.fatal = label
+                    if line not in state.errors and len(state.errors) < max_errors:
+                        state.errors.append(line)
+                fatal_event.set()
+
+
+async def stream_command(args, cwd=None, timeout=None, env=None, tail_lines=200,
+                         error_patterns=ERROR_PATTERNS, fatal_patterns=FATAL_PATTERNS,
+                         max_errors=50, on_line=None):
+    """
+    Run a command reading stdout and stderr line by line as they arrive.
+
+    Memory stays bounded: only the last tail_lines lines and up to
+    max_errors error lines are kept. When a fatal pattern matches, the
+    command is terminated at once and the result records which one.
+    """
+    with span("subprocess", command=" ".join(args[:3]), streaming=True) as active:
+        result = await _stream_command(
+            args, cwd, timeout, env, tail_lines, error_patterns, fatal_patterns,
+            max_errors, on_line
+        )
+        if active:
+            active.set_attribute("returncode", result.returncode if result.returncode is not None else -1)
+            active.set_attribute("lines", result.lines)
+            if result.aborted:
+                active.set_attribute("aborted", result.aborted)
+        return result
+
+
+async def _stream_command(args, cwd, timeout, env, tail_lines, error_patterns, fatal_patterns,
+                          max_errors, on_line):
+    started = time.monotonic()
+    error_re = re.compile("|".join(error_patterns), re.IGNORECASE) if error_patterns else None
+    fatal_res = {label: re.compile(pattern) for label, pattern in (fatal_patterns or {}).items()}
+    state = _StreamState(deque(maxlen=tail_lines))
+    fatal_event = asyncio.Event()
+
+    proc = await asyncio.create_subprocess_exec(
+        *args,
+        cwd=cwd,
+        env=env,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        start_new_session=True,
+        limit=LINE_LIMIT,
+    )
+    readers = asyncio.gather(
+        _read_lines(proc.stdout, "stdout", state, error_re, fatal_res, max_errors, on_line, fatal_event),
+        _read_lines(proc.stderr, "stderr", state, error_re, fatal_res, max_errors, on_line, fatal_event),
+    )
+    fatal_wait = asyncio.ensure_future(fatal_event.wait())
+    try:
+        done, _ = await asyncio.wait(
+            [readers, fatal_wait], timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+        )
+        if not done:
+            raise CommandTimeout(f"{' '.join(args)} timed out after {timeout}s")
+        if readers in done:
+            await proc.wait()
+    except BaseException:
+        await _terminate(proc)
+        readers.cancel()
+        raise
+    finally:
+        fatal_wait.cancel()
+
+    if state.fatal:
+        await _terminate(proc)
+        readers.cancel()
+        try:
+            await readers
+        except asyncio.CancelledError:
+            pass
+
+    return StreamResult(
+        list(args),
+        proc.returncode,
+        list(state.tail),
+        state.errors,
+        state.lines,
+        state.fatal,
+        time.monotonic() - started,
+        state.dropped,
+    )
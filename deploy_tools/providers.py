@@ -0,0 +1,540 @@
+"""
+Pluggable deployment provider backends
+Vercel, Netlify, Cloudflare Pages and Docker Compose behind one interface
+"""
+
+import asyncio
+import inspect
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+import requests
+
+from deploy_tools.preflight import CACHE_DIR
+from deploy_tools.process import CommandTimeout, stream_command
+from deploy_tools.tracing import span
+from deploy_tools.vercel_status import API_URL as VERCEL_API_URL
+from deploy_tools.vercel_status import Backoff, is_triggered, shared_session
+
+NETLIFY_API_URL = os.environ.get("NETLIFY_API_URL", "https://api.netlify.com/api/v1")
+CLOUDFLARE_API_URL = os.environ.get("CLOUDFLARE_API_URL", "https://api.cloudflare.com/client/v4")
+
+# Every provider's states are mapped onto Vercel's vocabulary
+QUEUED = "QUEUED"
+BUILDING = "BUILDING"
+READY = "READY"
+ERROR = "ERROR"
+CANCELED = "CANCELED"
+FINAL_STATES = {READY, ERROR, CANCELED}
+
+# Relative cost of one production deploy, for prefer="cheapest"
+DEFAULT_COSTS = {"docker": 0.2, "cloudflare": 0.5, "netlify": 1.0, "vercel": 1.0}
+
+_URL = re.compile(r"https://\S+")
+
+# Self-contained stack (app built from the repo Dockerfile plus Postgres)
+DEFAULT_COMPOSE_FILE = "docker-compose.deploy.yaml"
+
+
+class ProviderError(Exception):
+    """A provider call failed or the provider is not configured"""
+
+
+@dataclass
+class ProviderDeployment:
+    """One deployment as a provider reports it"""
+
+    provider: str
+    deployment_id: str
+    state: str
+    url: Optional[str] = None
+    raw: Dict = field(default_factory=dict)
+
+    @property
+    def ready(self):
+        return self.state == READY
+
+    @property
+    def final(self):
+        return self.state in FINAL_STATES
+
+
+class _RestClient:
+    """JSON REST calls over the shared keep-alive session"""
+
+    def __init__(self, base_url, headers=None, session=None, timeout=15):
+        self.base_url = base_url.rstrip("/")
+        self.headers = dict(headers or {})
+        self.session = session or shared_session()
+        self.timeout = timeout
+
+    def request(self, method, path, **kwargs):
+        try:
+            response = self.session.request(
+                method, f"{self.base_url}{path}", headers=self.headers, timeout=self.timeout, **kwargs
+            )
+        except requests.RequestException as e:
+            raise ProviderError(f"{method} {path}: {type(e).__name__}: {e}") from e
+        if response.status_code >= 400:
+            raise ProviderError(f"{method} {path} returned {response.status_code}: {response.text[:200]}")
+        return response.json() if response.content else {}
+
+
+def _require(value, name):
+    if not value:
+        raise ProviderError(f"{name} is not configured")
+    return value
+
+
+class VercelProvider:
+    """
+    Vercel: a deploy hook or `vercel --prod` to trigger, the REST API for
+    status, build events and instant rollback
+    """
+
+    name = "vercel"
+
+    def __init__(self, project_path, project_id=None, token=None, team_id=None, hook_url=None,
+                 base_url=None, session=None, timeout=300, on_line=None, sleep=asyncio.sleep):
+        self.project_path = str(project_path)
+        # Bounds both `vercel --prod` and waiting for a hook's deployment to register
+        self.timeout = timeout
+        self.on_line = on_line
+        self.sleep = sleep
+        self.project_id = project_id or os.environ.get("VERCEL_PROJECT_ID")
+        self.hook_url = hook_url or os.environ.get("DEPLOY_HOOK_URL")
+        token = token or os.environ.get("VERCEL_TOKEN")
+        self.params = {"teamId": team_id or os.environ.get("VERCEL_TEAM_ID")}
+        self.params = {k: v for k, v in self.params.items() if v}
+        self.api = _RestClient(base_url or VERCEL_API_URL,
+                               {"Authorization": f"Bearer {token}"} if token else {}, session)
+
+    def _deployment(self, payload):
+        deployment_id = payload.get("uid") or payload.get("id")
+        state = payload.get("readyState") or payload.get("state") or QUEUED
+        return ProviderDeployment(self.name, deployment_id, state, payload.get("url"), payload)
+
+    def trigger(self, commit=None, key=None):
+        """trigger_async for callers outside an event loop"""
+        return asyncio.run(self.trigger_async(commit, key))
+
+    async def trigger_async(self, commit=None, key=None):
+        """
+        Start a production deploy. Awaited by the executor, so cancelling
+        it (e.g. when the deploy is superseded) kills `vercel --prod`'s
+        process group or stops waiting for a hook's deployment.
+        """
+        if self.hook_url:
+            from deploy_tools.deploy_hook import DeployHookError, idempotency_key, trigger_deploy
+
+            triggered_at = time.time()
+            try:
+                hook = await asyncio.to_thread(
+                    trigger_deploy, self.project_path, key or idempotency_key(self.name, commit or ""),
+                    self.hook_url,
+                )
+            except DeployHookError as e:
+                raise ProviderError(str(e)) from e
+            # A replayed key's deployment was created by the earlier trigger
+            return await self._registered(commit, None if hook.replayed else triggered_at)
+
+        try:
+            result = await stream_command(
+                ["npx", "vercel", "--prod", "--yes"], cwd=self.project_path, timeout=self.timeout,
+                on_line=self.on_line,
+            )
+        except CommandTimeout as e:
+            raise ProviderError(str(e)) from e
+        except FileNotFoundError as e:
+            raise ProviderError(f"Vercel CLI not available: {e}") from e
+        if not result.ok:
+            reason = f"fatal '{result.aborted}'" if result.aborted else f"exit {result.returncode}"
+            details = " | ".join(result.errors[-5:] or result.tail[-5:])
+            raise ProviderError(f"vercel --prod failed ({reason}): {details}")
+        urls = _URL.findall(result.output)
+        if not urls:
+            raise ProviderError("vercel --prod printed no deployment URL")
+        # The API accepts a deployment's hostname in place of its id
+        return await asyncio.to_thread(self.status, urls[-1].split("://", 1)[1].rstrip("/"))
+
+    async def _registered(self, commit, since):
+        """
+        The deployment a hook started. The hook answers with a job, not a
+        deployment, so the project's deployments are listed until one built
+        from commit and created after since appears.
+        """
+        params = {**self.params, "projectId": _require(self.project_id, "VERCEL_PROJECT_ID"),
+                  "target": "production", "limit": 20}
+        backoff = Backoff(initial=1.0, maximum=10.0)
+        started = time.monotonic()
+        while True:
+            body = await asyncio.to_thread(self.api.request, "GET", "/v6/deployments", params=params)
+            for payload in body.get("deployments") or []:
+                if is_triggered(payload, commit, since):
+                    return self._deployment(payload)
+            elapsed = time.monotonic() - started
+            if elapsed >= self.timeout:
+                raise ProviderError(f"Deploy hook accepted but no deployment of {(commit or '?')[:9]} "
+                                    f"registered within {self.timeout}s")
+            await self.sleep(min(backoff.next(), self.timeout - elapsed))
+
+    def status(self, deployment_id):
+        return self._deployment(self.api.request("GET", f"/v13/deployments/{deployment_id}", params=self.params))
+
+    def logs(self, deployment_id, limit=100):
+        events = self.api.request("GET", f"/v3/deployments/{deployment_id}/events",
+                                  params={**self.params, "limit": limit})
+        return [e.get("text") or (e.get("payload") or {}).get("text", "") for e in events][-limit:]
+
+    def find_deployment(self, commit, limit=20):
+        """Newest READY production deployment built from commit, or None"""
+        body = self.api.request("GET", "/v6/deployments", params={
+            **self.params, "projectId": _require(self.project_id, "VERCEL_PROJECT_ID"),
+            "target": "production", "state": READY, "limit": limit,
+        })
+        for payload in body.get("deployments") or []:
+            sha = (payload.get("meta") or {}).get("githubCommitSha") or ""
+            if sha and (sha.startswith(commit) or commit.startswith(sha)):
+                return self._deployment(payload)
+        return None
+
+    def rollback(self, deployment_id):
+        project_id = _require(self.project_id, "VERCEL_PROJECT_ID")
+        self.api.request("POST", f"/v9/projects/{project_id}/rollback/{deployment_id}", params=self.params)
+        return self.status(deployment_id)
+
+
+NETLIFY_STATES = {
+    "new": QUEUED, "enqueued": QUEUED, "pending_review": QUEUED,
+    "building": BUILDING, "uploading": BUILDING, "uploaded": BUILDING, "preparing": BUILDING,
+    "prepared": BUILDING, "processing": BUILDING, "processed": BUILDING, "retrying": BUILDING,
+    "ready": READY, "error": ERROR, "rejected": ERROR, "canceled": CANCELED,
+}
+
+
+class NetlifyProvider:
+    """Netlify: site builds, deploy state and summary, deploy restore"""
+
+    name = "netlify"
+
+    def __init__(self, project_path, site_id=None, token=None, base_url=None, session=None):
+        self.project_path = str(project_path)
+        self.site_id = site_id or os.environ.get("NETLIFY_SITE_ID")
+        token = token or os.environ.get("NETLIFY_AUTH_TOKEN")
+        self.api = _RestClient(base_url or NETLIFY_API_URL,
+                               {"Authorization": f"Bearer {token}"} if token else {}, session)
+
+    def _deployment(self, payload):
+        state = NETLIFY_STATES.get(payload.get("state"), BUILDING)
+        url = payload.get("deploy_ssl_url") or payload.get("ssl_url") or payload.get("url")
+        return ProviderDeployment(self.name, payload.get("id"), state, url, payload)
+
+    def trigger(self, commit=None, key=None):
+        site_id = _require(self.site_id, "NETLIFY_SITE_ID")
+        build = self.api.request("POST", f"/sites/{site_id}/builds")
+        return self.status(build.get("deploy_id") or build.get("id"))
+
+    def status(self, deployment_id):
+        return self._deployment(self.api.request("GET", f"/deploys/{deployment_id}"))
+
+    def logs(self, deployment_id, limit=100):
+        payload = self.status(deployment_id).raw
+        lines = [f"state: {payload.get('state')}"]
+        for message in (payload.get("summary") or {}).get("messages", []):
+            lines.append(f"{message.get('title', '')}: {message.get('description', '')}".strip(": "))
+        if payload.get("error_message"):
+            lines.append(f"error: {payload['error_message']}")
+        return lines[-limit:]
+
+    def rollback(self, deployment_id):
+        site_id = _require(self.site_id, "NETLIFY_SITE_ID")
+        return self._deployment(self.api.request("POST", f"/sites/{site_id}/deploys/{deployment_id}/restore"))
+
+
+class CloudflareProvider:
+    """Cloudflare Pages: git-branch deployments, stage status, build logs, rollback"""
+
+    name = "cloudflare"
+
+    def __init__(self, project_path, account_id=None, project=None, token=None, branch=None,
+                 base_url=None, session=None):
+        self.project_path = str(project_path)
+        self.account_id = account_id or os.environ.get("CLOUDFLARE_ACCOUNT_ID")
+        self.project = project or os.environ.get("CLOUDFLARE_PAGES_PROJECT")
+        self.branch = branch or os.environ.get("CLOUDFLARE_PAGES_BRANCH", "main")
+        token = token or os.environ.get("CLOUDFLARE_API_TOKEN")
+        self.api = _RestClient(base_url or CLOUDFLARE_API_URL,
+                               {"Authorization": f"Bearer {token}"} if token else {}, session)
+
+    @property
+    def _base(self):
+        account = _require(self.account_id, "CLOUDFLARE_ACCOUNT_ID")
+        return f"/accounts/{account}/pages/projects/{_require(self.project, 'CLOUDFLARE_PAGES_PROJECT')}/deployments"
+
+    def _result(self, method, path, **kwargs):
+        body = self.api.request(method, path, **kwargs)
+        if not body.get("success", True):
+            raise ProviderError(f"{method} {path}: {body.get('errors')}")
+        return body.get("result")
+
+    def _deployment(self, payload):
+        stage = payload.get("latest_stage") or {}
+        status = stage.get("status")
+        if status == "failure":
+            state = ERROR
+        elif status == "canceled":
+            state = CANCELED
+        elif stage.get("name") == "deploy" and status == "success":
+            state = READY
+        elif stage.get("name") in (None, "queued"):
+            state = QUEUED
+        else:
+            state = BUILDING
+        return ProviderDeployment(self.name, payload.get("id"), state, payload.get("url"), payload)
+
+    def trigger(self, commit=None, key=None):
+        return self._deployment(self._result("POST", self._base, data={"branch": self.branch}))
+
+    def status(self, deployment_id):
+        return self._deployment(self._result("GET", f"{self._base}/{deployment_id}"))
+
+    def logs(self, deployment_id, limit=100):
+        result = self._result("GET", f"{self._base}/{deployment_id}/history/logs") or {}
+        return [entry.get("line", "") for entry in result.get("data", [])][-limit:]
+
+    def rollback(self, deployment_id):
+        return self._deployment(self._result("POST", f"{self._base}/{deployment_id}/rollback"))
+
+
+def _compose_services(stdout):
+    """`docker compose ps --format json` prints an array or one object per line"""
+    text = stdout.strip()
+    if not text:
+        return []
+    if text.startswith("["):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+class DockerComposeProvider:
+    """
+    A Docker Compose target such as docker-compose.deploy.yaml. Each
+    deploy builds and starts the stack through a generated override that
+    tags every built service's image with the deploy's id, so a rollback
+    starts an earlier tag without rebuilding.
+    """
+
+    name = "docker"
+
+    def __init__(self, project_path, compose_file=None, project=None, runner=None):
+        self.project_path = str(project_path)
+        self.compose_file = compose_file or os.environ.get("DEPLOY_COMPOSE_FILE", DEFAULT_COMPOSE_FILE)
+        # Compose project and image names must be lowercase
+        self.project = (project or os.path.basename(os.path.normpath(self.project_path))).lower()
+        self.runner = runner or self._run
+        self._built = None
+
+    def _run(self, args, env=None):
+        return subprocess.run(args, cwd=self.project_path, capture_output=True, text=True,
+                              env={**os.environ, **(env or {})})
+
+    def _compose(self, *args, tag=None):
+        files = ["-f", self.compose_file]
+        if tag:
+            files += ["-f", self._override(tag)]
+        command = ["docker", "compose", *files, "-p", self.project, *args]
+        result = self.runner(command)
+        if result.returncode != 0:
+            raise ProviderError(f"docker compose {args[0]} failed: {(result.stderr or result.stdout)[-500:]}")
+        return result.stdout
+
+    def built_services(self):
+        """Services the compose file builds; only their images carry deploy tags"""
+        if self._built is None:
+            if not os.path.exists(os.path.join(self.project_path, self.compose_file)):
+                raise ProviderError(f"Compose file {self.compose_file} not found (set DEPLOY_COMPOSE_FILE)")
+            config = json.loads(self._compose("config", "--format", "json") or "{}")
+            self._built = sorted(name for name, service in (config.get("services") or {}).items()
+                                 if service.get("build"))
+            if not self._built:
+                raise ProviderError(f"{self.compose_file} builds no services; deploys could not be tagged")
+        return self._built
+
+    def image(self, service, tag):
+        return f"{self.project}-{service}:{tag}"
+
+    def _override(self, tag):
+        # JSON is YAML, so compose reads the override as is
+        services = {service: {"image": self.image(service, tag)} for service in self.built_services()}
+        path = os.path.join(self.project_path, CACHE_DIR, "docker", f"compose.{tag}.json")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump({"services": services}, f, indent=2)
+        return path
+
+    def trigger(self, commit=None, key=None):
+        tag = (commit or time.strftime("%Y%m%d%H%M%S"))[:12]
+        self._compose("up", "-d", "--build", "--remove-orphans", tag=tag)
+        return self.status(tag)
+
+    def status(self, deployment_id):
+        services = _compose_services(self._compose("ps", "--all", "--format", "json"))
+        states = [(s.get("State", ""), s.get("Health", "")) for s in services]
+        # Containers of another deploy's images mean this deployment is not the live one
+        stale = [s.get("Service") for s in services if s.get("Service") in self.built_services()
+                 and s.get("Image") != self.image(s.get("Service"), deployment_id)]
+        if not states:
+            state = QUEUED
+        elif stale or any(s in ("exited", "dead") or h == "unhealthy" for s, h in states):
+            state = ERROR
+        elif all(s == "running" and h in ("", "healthy") for s, h in states):
+            state = READY
+        else:
+            state = BUILDING
+        return ProviderDeployment(self.name, deployment_id, state, None, {"services": services, "stale": stale})
+
+    def logs(self, deployment_id, limit=100):
+        return self._compose("logs", "--no-color", "--tail", str(limit)).splitlines()[-limit:]
+
+    def rollback(self, deployment_id):
+        for service in self.built_services():
+            image = self.image(service, deployment_id)
+            if self.runner(["docker", "image", "inspect", image]).returncode != 0:
+                raise ProviderError(f"Image {image} is not available locally; deployment "
+                                    f"{deployment_id} can't be restored without a rebuild")
+        self._compose("up", "-d", "--no-build", "--remove-orphans", tag=deployment_id)
+        return self.status(deployment_id)
+
+
+PROVIDERS = {
+    "vercel": VercelProvider,
+    "netlify": NetlifyProvider,
+    "cloudflare": CloudflareProvider,
+    "docker": DockerComposeProvider,
+}
+
+
+def create_provider(kind, project_path, **options):
+    """Provider backend by name; options go to its constructor"""
+    try:
+        provider_cls = PROVIDERS[kind]
+    except KeyError:
+        raise ProviderError(f"Unknown provider {kind!r} (known: {', '.join(PROVIDERS)})") from None
+    return provider_cls(project_path, **options)
+
+
+def wait_for(provider, deployment, deadline=900, on_transition=None, backoff=None, sleep=time.sleep):
+    """Poll a deployment until it reaches a final state or the deadline"""
+    started = time.monotonic()
+    backoff = backoff or Backoff()
+    with span("status_wait", provider=provider.name) as active:
+        while not deployment.final and time.monotonic() - started < deadline:
+            sleep(min(backoff.next(), max(0.0, deadline - (time.monotonic() - started))))
+            previous = deployment.state
+            deployment = provider.status(deployment.deployment_id)
+            if deployment.state != previous:
+                backoff.reset()
+                if on_transition:
+                    on_transition(previous, deployment)
+        if active:
+            active.set_attribute("state", deployment.state)
+    return deployment
+
+
+async def trigger_async(provider, commit=None, key=None):
+    """Trigger through a provider from a coroutine; blocking triggers run in a worker thread"""
+    if inspect.iscoroutinefunction(getattr(provider, "trigger_async", None)):
+        return await provider.trigger_async(commit, key)
+    return await asyncio.to_thread(provider.trigger, commit, key)
+
+
+async def wait_for_async(provider, deployment, deadline=900, on_transition=None, backoff=None,
+                         sleep=asyncio.sleep):
+    """wait_for that can be cancelled between polls"""
+    started = time.monotonic()
+    backoff = backoff or Backoff()
+    with span("status_wait", provider=provider.name) as active:
+        while not deployment.final and time.monotonic() - started < deadline:
+            await sleep(min(backoff.next(), max(0.0, deadline - (time.monotonic() - started))))
+            previous = deployment.state
+            deployment = await asyncio.to_thread(provider.status, deployment.deployment_id)
+            if deployment.state != previous:
+                backoff.reset()
+                if on_transition:
+                    on_transition(previous, deployment)
+        if active:
+            active.set_attribute("state", deployment.state)
+    return deployment
+
+
+def provider_method_name(kind):
+    """Name deploys through kind are recorded under in the history store"""
+    return f"deploy_{kind}"
+
+
+def choose_provider(candidates, prefer="fastest", history=None, project=None, costs=None):
+    """
+    Pick the target for a site that can deploy to several providers.
+    fastest: lowest median deploy time in the history store (providers
+    without history go first, so each gets measured once); cheapest: the
+    lowest relative cost, ties broken by speed.
+    """
+    candidates = list(candidates)
+    if len(candidates) < 2:
+        return candidates[0] if candidates else None
+    costs = {**DEFAULT_COSTS, **(costs or {})}
+
+    def median_ms(kind):
+        if history is None:
+            return None
+        return history.duration_percentile(provider_method_name(kind), 0.5, project=project)
+
+    def speed(kind):
+        value = median_ms(kind)
+        return -1.0 if value is None else value
+
+    if prefer == "cheapest":
+        return min(candidates, key=lambda kind: (costs.get(kind, 1.0), speed(kind)))
+    return min(candidates, key=speed)
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Drive a deployment provider backend")
+    parser.add_argument("provider", choices=list(PROVIDERS))
+    parser.add_argument("action", choices=["trigger", "status", "logs", "rollback"])
+    parser.add_argument("deployment_id", nargs="?")
+    parser.add_argument("--path", default=os.getcwd(), help="Project checkout (default: cwd)")
+    parser.add_argument("--wait", action="store_true", help="With trigger, wait for a final state")
+    args = parser.parse_args(argv)
+
+    provider = create_provider(args.provider, args.path)
+    try:
+        if args.action == "trigger":
+            deployment = provider.trigger()
+            if args.wait:
+                deployment = wait_for(provider, deployment, on_transition=lambda previous, d: print(
+                    f"{d.deployment_id}: {previous} → {d.state}", flush=True))
+        elif not args.deployment_id:
+            parser.error(f"{args.action} needs a deployment id")
+        elif args.action == "logs":
+            print("\n".join(provider.logs(args.deployment_id)))
+            return 0
+        else:
+            deployment = getattr(provider, args.action)(args.deployment_id)
+    except ProviderError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    print(f"{deployment.provider} {deployment.deployment_id}: {deployment.state} {deployment.url or ''}".rstrip())
+    return 0 if deployment.state != ERROR else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,273 @@
+"""
+Rollback to the last known-good deployment
+Promotes an existing deployment, or re-uploads its cached build, without rebuilding
+"""
+
+import os
+import re
+import subprocess
+import sys
+import time
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+from deploy_tools.build_cache import BuildCache
+from deploy_tools.history import open_history
+from deploy_tools.providers import ProviderError, create_provider, wait_for
+from deploy_tools.tracing import span
+
+# How a rollback got the good build back into production
+PROMOTE = "promote"
+PREBUILT = "prebuilt"
+
+# Older good deploys tried when the newest one can no longer be promoted
+DEFAULT_MAX_TARGETS = 3
+
+# After these, the recorded commit is what production serves
+LIVE_STATUSES = ("success", "unhealthy", "rollback")
+# Deploy nothing; histories from before the "manual" status recorded their wins as success
+FALLBACK_METHODS = ("trigger_manual_deployment",)
+
+_URL = re.compile(r"https://\S+")
+
+
+@dataclass
+class RollbackTarget:
+    """A recorded healthy deploy that can be put back into production"""
+
+    commit_sha: str
+    started_at: float
+    fingerprint: Optional[str] = None
+    provider: Optional[str] = None
+    deployment_id: Optional[str] = None
+    url: Optional[str] = None
+
+    @classmethod
+    def from_history(cls, row):
+        deployment = (row.get("details") or {}).get("deployment") or {}
+        return cls(
+            row["commit_sha"],
+            row["started_at"],
+            row.get("fingerprint"),
+            deployment.get("provider"),
+            deployment.get("id"),
+            deployment.get("url"),
+        )
+
+
+@dataclass
+class RollbackResult:
+    """Outcome of a rollback"""
+
+    status: str  # rolled-back | failed | no-target
+    target: Optional[RollbackTarget] = None
+    strategy: Optional[str] = None
+    deployment_id: Optional[str] = None
+    url: Optional[str] = None
+    elapsed_ms: float = 0.0
+    error: Optional[str] = None
+
+    @property
+    def ok(self):
+        return self.status == "rolled-back"
+
+    def to_dict(self):
+        return asdict(self)
+
+
+def deployment_details(provider, deployment_id, url=None):
+    """History details that let a later rollback find this deployment"""
+    return {"deployment": {"provider": provider, "id": deployment_id, "url": url}}
+
+
+def _same_commit(a, b):
+    return a.startswith(b) or b.startswith(a)
+
+
+def live_commit(history, project, limit=20):
+    """Commit production serves according to the history: the newest deploy or rollback"""
+    for row in history.recent(project, limit):
+        if row["status"] in LIVE_STATUSES and row["method"] not in FALLBACK_METHODS and row["commit_sha"]:
+            return row["commit_sha"]
+    return None
+
+
+def rollback_targets(history, project, exclude_commit=None, to_commit=None, limit=20):
+    """
+    Healthy deploys to roll back to, newest first. Only successful deploys
+    whose post-deploy probe passed are candidates; deploys without a probe
+    are not known to be good. The live commit is always excluded, so a
+    rollback never re-promotes production onto itself, and so is
+    exclude_commit (the bad deploy, when it isn't recorded as live).
+    """
+    excluded = [commit for commit in (exclude_commit, live_commit(history, project)) if commit]
+    targets = []
+    seen = set()
+    for row in history.successful(project, limit):
+        commit = row["commit_sha"]
+        if not commit or commit in seen or row["method"] in FALLBACK_METHODS:
+            continue
+        if any(_same_commit(commit, other) for other in excluded):
+            continue
+        if to_commit and not commit.startswith(to_commit):
+            continue
+        if (row["details"].get("probe") or {}).get("passed") is not True:
+            continue
+        seen.add(commit)
+        targets.append(RollbackTarget.from_history(row))
+    return targets
+
+
+class Rollback:
+    """
+    Put a known-good deploy back into production. The provider's instant
+    rollback promotes the recorded deployment (found by commit when only
+    the SHA was recorded); failing that, the cached prebuilt output of the
+    deploy's fingerprint is uploaded with `vercel deploy --prebuilt`.
+    Neither path runs a build.
+    """
+
+    def __init__(self, project_path, project, provider=None, build_cache=None, deadline=300,
+                 log=None, runner=subprocess.run):
+        self.project_path = str(project_path)
+        self.project = project
+        self.provider = provider or create_provider("vercel", project_path)
+        self.build_cache = build_cache or BuildCache.for_project(project_path)
+        self.deadline = deadline
+        self.log = log or (lambda message, level="INFO", **fields: None)
+        self.runner = runner
+
+    def _promote(self, target):
+        deployment_id = target.deployment_id if target.provider in (None, self.provider.name) else None
+        if not deployment_id and hasattr(self.provider, "find_deployment"):
+            found = self.provider.find_deployment(target.commit_sha)
+            deployment_id = found.deployment_id if found else None
+        if not deployment_id:
+            return None
+        self.log(f"Promoting {self.provider.name} deployment {deployment_id} ({target.commit_sha[:9]})",
+                 "DEPLOY", deployment_id=deployment_id)
+        return self.provider.rollback(deployment_id)
+
+    def _upload_prebuilt(self, target):
+        # The cached output is Vercel's build output format
+        if self.provider.name != "vercel" or not target.fingerprint:
+            return None
+        if not self.build_cache.restore(target.fingerprint, self.project_path):
+            return None
+        self.log(f"Uploading cached build of {target.commit_sha[:9]} ({target.fingerprint[:12]})", "DEPLOY",
+                 cache="hit")
+        try:
+            result = self.runner(["npx", "vercel", "deploy", "--prebuilt", "--prod", "--yes"],
+                                 cwd=self.project_path, capture_output=True, text=True, timeout=self.deadline)
+        except subprocess.TimeoutExpired as e:
+            raise ProviderError(f"vercel deploy --prebuilt timed out after {self.deadline}s") from e
+        urls = _URL.findall(result.stdout or "")
+        if result.returncode != 0 or not urls:
+            raise ProviderError(f"vercel deploy --prebuilt failed: {(result.stderr or result.stdout)[-500:]}")
+        return self.provider.status(urls[-1].split("://", 1)[1].rstrip("/"))
+
+    def run(self, exclude_commit=None, to_commit=None, max_targets=DEFAULT_MAX_TARGETS):
+        """Roll back to the newest healthy deploy that can be restored; returns a RollbackResult"""
+        started = time.perf_counter()
+        history = open_history(self.project_path)
+        if history is None:
+            return RollbackResult("no-target", error="deployment history unavailable")
+        with history:
+            targets = rollback_targets(history, self.project, exclude_commit, to_commit)[:max_targets]
+        if not targets:
+            return RollbackResult("no-target", error="no probed healthy deploy other than the live one recorded")
+
+        errors = []
+        with span("rollback", provider=self.provider.name) as active:
+            for target in targets:
+                attempted = False
+                for strategy, restore in ((PROMOTE, self._promote), (PREBUILT, self._upload_prebuilt)):
+                    try:
+                        deployment = restore(target)
+                        if deployment is None:
+                            continue
+                        attempted = True
+                        deployment = wait_for(self.provider, deployment, deadline=self.deadline)
+                    except ProviderError as e:
+                        attempted = True
+                        errors.append(f"{target.commit_sha[:9]} {strategy}: {e}")
+                        continue
+                    if not deployment.ready:
+                        errors.append(f"{target.commit_sha[:9]} {strategy}: ended {deployment.state}")
+                        continue
+                    if active:
+                        active.set_attribute("strategy", strategy)
+                    result = RollbackResult(
+                        "rolled-back", target, strategy, deployment.deployment_id, deployment.url,
+                        (time.perf_counter() - started) * 1000,
+                    )
+                    self._record(result, exclude_commit)
+                    return result
+                if not attempted:
+                    errors.append(f"{target.commit_sha[:9]}: no deployment or cached build to restore")
+
+        result = RollbackResult("failed", targets[0], elapsed_ms=(time.perf_counter() - started) * 1000,
+                                error="; ".join(errors))
+        self._record(result, exclude_commit)
+        return result
+
+    def _record(self, result, rolled_back_from):
+        history = open_history(self.project_path)
+        if history is None:
+            return
+        details = {"strategy": result.strategy, "rolled_back_from": rolled_back_from, "error": result.error}
+        if result.deployment_id:
+            details.update(deployment_details(self.provider.name, result.deployment_id, result.url))
+        with history:
+            # Not "success": a rollback must not become the next rollback's target
+            history.record(
+                self.project,
+                "rollback" if result.ok else "rollback-failed",
+                commit_sha=result.target.commit_sha if result.target else None,
+                script="rollback",
+                fingerprint=result.target.fingerprint if result.target else None,
+                duration_ms=result.elapsed_ms,
+                details=details,
+            )
+
+
+def format_rollback(result):
+    if result.ok:
+        return (f"⏪ Rolled back to {result.target.commit_sha[:9]} via {result.strategy} "
+                f"({result.deployment_id}) in {result.elapsed_ms / 1000:.1f}s")
+    return f"❌ Rollback {result.status}: {result.error}"
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Roll back to the last known-good deployment")
+    parser.add_argument("project", help="Project name as recorded in the history")
+    parser.add_argument("--path", default=os.getcwd(), help="Project checkout (default: cwd)")
+    parser.add_argument("--provider", default=os.environ.get("DEPLOY_PROVIDER", "vercel"))
+    parser.add_argument("--to", metavar="SHA", help="Roll back to this healthy commit")
+    parser.add_argument("--exclude", metavar="SHA", help="Skip deploys of this (bad) commit")
+    parser.add_argument("--list", action="store_true", help="Only list rollback targets")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        history = open_history(args.path)
+        if history is None:
+            print("❌ deployment history unavailable", file=sys.stderr)
+            return 1
+        with history:
+            for target in rollback_targets(history, args.project, args.exclude, args.to):
+                started = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(target.started_at))
+                print(f"{started}  {target.commit_sha[:9]:<9} {target.provider or '-':<10} "
+                      f"{target.deployment_id or '-'}")
+        return 0
+
+    rollback = Rollback(args.path, args.project, create_provider(args.provider, args.path),
+                        log=lambda message, level="INFO", **fields: print(message, flush=True))
+    result = rollback.run(exclude_commit=args.exclude, to_commit=args.to)
+    print(format_rollback(result))
+    return 0 if result.ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
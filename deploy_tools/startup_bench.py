@@ -0,0 +1,89 @@
+"""
+Cold-start benchmark for the deployment scripts
+Times fresh interpreter runs and lists the slowest imports
+"""
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# Absolute, so the defaults time the real scripts whatever --cwd is
+DEFAULT_COMMANDS = [
+    [str(REPO_ROOT / "deploy-agent.py"), "tool", "GitMonitorTool", "--help"],
+    [str(REPO_ROOT / "smart-deploy.py"), "--help"],
+]
+
+_IMPORT_TIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+
+
+def time_command(args, runs=5, cwd=None):
+    """Wall time in ms of each fresh `python <args>` run; a failing run raises RuntimeError"""
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, *args],
+            cwd=cwd,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        samples.append((time.perf_counter() - started) * 1000)
+        # A crash exits early and would time as a fast start
+        if result.returncode != 0:
+            raise RuntimeError(f"{' '.join(args)} exited {result.returncode}: {result.stderr[-2000:].strip()}")
+    return samples
+
+
+def slowest_imports(args, top=10, cwd=None):
+    """(cumulative_ms, module) of the slowest top-level imports via -X importtime"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", *args],
+        cwd=cwd,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    imports = []
+    for line in result.stderr.splitlines():
+        match = _IMPORT_TIME.match(line)
+        # Nested imports are indented; their time is already in their parent's
+        if match and not match.group(3):
+            imports.append((int(match.group(2)) / 1000, match.group(4)))
+    return sorted(imports, reverse=True)[:top]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure cold-start time of the deploy scripts")
+    parser.add_argument("command", nargs="*", help="Script and arguments (default: the deploy scripts)")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--imports", type=int, default=0, help="Also show the N slowest imports")
+    parser.add_argument("--cwd", default=os.getcwd())
+    args = parser.parse_args(argv)
+
+    commands = [args.command] if args.command else DEFAULT_COMMANDS
+    failed = False
+    print(f"{'COMMAND':<48} {'MIN MS':>8} {'P50 MS':>8} {'MAX MS':>8}")
+    for command in commands:
+        label = " ".join([Path(command[0]).name, *command[1:]])[:47]
+        try:
+            samples = time_command(command, args.runs, args.cwd)
+        except RuntimeError as e:
+            print(f"✗ {e}")
+            failed = True
+            continue
+        print(f"{label:<48} {min(samples):8.1f} {statistics.median(samples):8.1f} {max(samples):8.1f}")
+        for cumulative_ms, module in slowest_imports(command, args.imports, args.cwd) if args.imports else []:
+            print(f"    {module:<44} {cumulative_ms:8.1f}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,484 @@
+"""
+Local stub HTTP servers for exercising deployment tooling offline
+Scripted subsets of the Vercel, Netlify and Cloudflare Pages APIs, a deploy
+hook, a Docker Compose runner and a stand-in site
+"""
+
+import hashlib
+import itertools
+import json
+import subprocess
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class _StubServer:
+    """Threaded local HTTP server usable as a context manager"""
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class StubVercelAPI(_StubServer):
+    """
+    Scripted Vercel API. Each deployment advances through its list of
+    states one step per request, then stays on the last. Repeating a state
+    in the script yields a 304 for clients that send If-None-Match.
+    commits maps a deployment to the git SHA it was built from, created to
+    its createdAt (epoch ms). A deployment in listed_after only shows up in
+    project listings after that many list requests, like a build that is
+    slow to register. The first `throttle` GETs are answered 429 with
+    Retry-After: retry_after.
+    """
+
+    def __init__(self, deployments=None, project_deployments=None, commits=None, created=None,
+                 listed_after=None, throttle=0, retry_after="0", host="127.0.0.1", port=0):
+        self.deployments = {key: list(states) for key, states in (deployments or {}).items()}
+        self.project_deployments = dict(project_deployments or {})
+        self.commits = dict(commits or {})
+        self.created = dict(created or {})
+        self.listed_after = dict(listed_after or {})
+        self.throttle = throttle
+        self.retry_after = retry_after
+        self.list_requests = 0
+        self.positions = {key: 0 for key in self.deployments}
+        self.rollbacks = []
+        self.log = []
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.thread = None
+
+    def current_state(self, deployment_id):
+        states = self.deployments[deployment_id]
+        return states[min(self.positions[deployment_id], len(states) - 1)]
+
+    def _deployment_body(self, deployment_id):
+        body = {
+            "id": deployment_id,
+            "uid": deployment_id,
+            "readyState": self.current_state(deployment_id),
+            "url": f"{deployment_id}.vercel.app",
+        }
+        if deployment_id in self.commits:
+            body["meta"] = {"githubCommitSha": self.commits[deployment_id]}
+        if deployment_id in self.created:
+            body["createdAt"] = self.created[deployment_id]
+        return body
+
+    def _route(self, path, query):
+        if path.startswith("/v3/deployments/") and path.endswith("/events"):
+            deployment_id = path.split("/")[3]
+            if deployment_id not in self.deployments:
+                return 404, {"error": {"code": "not_found"}}, None
+            seen = self.deployments[deployment_id][: self.positions[deployment_id] + 1]
+            return 200, [{"type": "stdout", "text": f"state: {state}"} for state in seen], None
+        if path.startswith("/v13/deployments/"):
+            # Deployments are also addressable by their hostname
+            deployment_id = path.rsplit("/", 1)[-1].removesuffix(".vercel.app")
+            if deployment_id not in self.deployments:
+                return 404, {"error": {"code": "not_found"}}, None
+            return 200, self._deployment_body(deployment_id), deployment_id
+        if path == "/v6/deployments":
+            project_id = query.get("projectId", [""])[0]
+            self.list_requests += 1
+            ids = [i for i in self.project_deployments.get(project_id, [])
+                   if self.list_requests > self.listed_after.get(i, 0)]
+            limit = int(query.get("limit", ["1"])[0])
+            return 200, {"deployments": [self._deployment_body(i) for i in ids[:limit]]}, None
+        return 404, {"error": {"code": "not_found"}}, None
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out in separate writes; don't let Nagle add 40 ms
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                path = urlparse(self.path).path
+                parts = path.strip("/").split("/")
+                with stub.lock:
+                    if len(parts) == 5 and parts[:2] == ["v9", "projects"] and parts[3] == "rollback" \
+                            and parts[4] in stub.deployments:
+                        stub.rollbacks.append((parts[2], parts[4]))
+                        status, body = 201, {}
+                    else:
+                        status, body = 404, {"error": {"code": "not_found"}}
+                    stub.log.append((path, status))
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                with stub.lock:
+                    throttled = stub.throttle > 0
+                    if throttled:
+                        stub.throttle -= 1
+                        stub.log.append((parsed.path, 429))
+                if throttled:
+                    self.send_response(429)
+                    self.send_header("Retry-After", stub.retry_after)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                with stub.lock:
+                    status, body, deployment_id = stub._route(parsed.path, parse_qs(parsed.query))
+                    data = json.dumps(body).encode()
+                    etag = '"' + hashlib.sha1(data).hexdigest() + '"'
+                    not_modified = status == 200 and self.headers.get("If-None-Match") == etag
+                    stub.log.append((parsed.path, 304 if not_modified else status))
+                    if deployment_id:
+                        stub.positions[deployment_id] += 1
+
+                if not_modified:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+
+class StubSite(_StubServer):
+    """
+    Stand-in for a deployed site. pages maps a path to (status, headers,
+    body); delays maps a path to seconds slept before the response, which
+    makes latency regressions reproducible.
+    """
+
+    def __init__(self, pages=None, delays=None, host="127.0.0.1", port=0):
+        self.pages = dict(pages if pages is not None else default_site_pages())
+        self.delays = dict(delays or {})
+        self.log = []
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.thread = None
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out in separate writes; don't let Nagle add 40 ms
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                path = urlparse(self.path).path
+                status, headers, body = stub.pages.get(path, (404, {}, b"not found"))
+                with stub.lock:
+                    stub.log.append((path, status))
+                delay = stub.delays.get(path)
+                if delay:
+                    time.sleep(delay)
+                self.send_response(status)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+
+class StubDeployHook(_StubServer):
+    """
+    Stand-in for a Vercel deploy hook. Every POST starts a "job" unless
+    its Idempotency-Key was seen before, in which case the original job is
+    returned. The first `fail_first` requests answer 503 and every request
+    waits `delay` seconds, for exercising retries.
+    """
+
+    def __init__(self, fail_first=0, delay=0.0, host="127.0.0.1", port=0):
+        self.fail_first = fail_first
+        self.delay = delay
+        self.jobs = []
+        self.keys = {}
+        self.log = []
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.thread = None
+
+    @property
+    def hook_url(self):
+        return f"{self.url}/v1/integrations/deploy/prj_stub/hook"
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out in separate writes; don't let Nagle add 40 ms
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, body):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                if stub.delay:
+                    time.sleep(stub.delay)
+                key = self.headers.get("Idempotency-Key")
+                with stub.lock:
+                    stub.log.append((urlparse(self.path).path, key))
+                    if len(stub.log) <= stub.fail_first:
+                        status, body = 503, {"error": {"code": "service_unavailable"}}
+                    elif not urlparse(self.path).path.startswith("/v1/integrations/deploy/"):
+                        status, body = 404, {"error": {"code": "not_found"}}
+                    elif key and key in stub.keys:
+                        status, body = 200, {"job": stub.keys[key]}
+                    else:
+                        job = {"id": f"job_{len(stub.jobs) + 1}", "state": "PENDING",
+                               "createdAt": int(time.time() * 1000)}
+                        stub.jobs.append(job)
+                        if key:
+                            stub.keys[key] = job
+                        status, body = 201, {"job": job}
+                self._reply(status, body)
+
+        return Handler
+
+
+class StubProviderAPI(_StubServer):
+    """
+    Scripted Netlify or Cloudflare Pages API. Every triggered deploy walks
+    through `script` one step per status request, then stays on the last
+    step: Netlify deploy states, or Cloudflare (stage, status) pairs.
+    `deployments` seeds earlier deploys, e.g. as rollback targets.
+    """
+
+    SCRIPTS = {
+        "netlify": ["enqueued", "building", "ready"],
+        "cloudflare": [("queued", "active"), ("build", "active"), ("deploy", "success")],
+    }
+
+    def __init__(self, kind, script=None, deployments=None, host="127.0.0.1", port=0):
+        if kind not in self.SCRIPTS:
+            raise ValueError(f"No stub API for {kind!r}")
+        self.kind = kind
+        self.script = list(script or self.SCRIPTS[kind])
+        self.deployments = {key: list(states) for key, states in (deployments or {}).items()}
+        self.positions = {key: 0 for key in self.deployments}
+        self.counter = itertools.count(1)
+        self.published = None
+        self.log = []
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.thread = None
+
+    def _current(self, deployment_id):
+        states = self.deployments[deployment_id]
+        return states[min(self.positions[deployment_id], len(states) - 1)]
+
+    def _create(self):
+        deployment_id = f"{self.kind[:2]}_{next(self.counter)}"
+        self.deployments[deployment_id] = list(self.script)
+        self.positions[deployment_id] = 0
+        return deployment_id
+
+    def _netlify_body(self, deployment_id):
+        state = self._current(deployment_id)
+        body = {
+            "id": deployment_id,
+            "state": state,
+            "deploy_ssl_url": f"https://{deployment_id}--stub.netlify.app",
+            "summary": {"messages": [{"title": f"Deploy is {state}", "description": ""}]},
+        }
+        if state == "error":
+            body["error_message"] = "Build script returned non-zero exit code: 2"
+        return body
+
+    def _cloudflare_body(self, deployment_id):
+        stage, status = self._current(deployment_id)
+        return {
+            "id": deployment_id,
+            "url": f"https://{deployment_id}.stub.pages.dev",
+            "latest_stage": {"name": stage, "status": status},
+        }
+
+    def _route(self, method, parts):
+        """(status, body, deployment id whose script advances)"""
+        if self.kind == "netlify":
+            if method == "POST" and len(parts) == 3 and parts[0] == "sites" and parts[2] == "builds":
+                deployment_id = self._create()
+                return 200, {"id": f"build_{deployment_id}", "deploy_id": deployment_id}, None
+            if method == "GET" and len(parts) == 2 and parts[0] == "deploys" and parts[1] in self.deployments:
+                return 200, self._netlify_body(parts[1]), parts[1]
+            if method == "POST" and len(parts) == 5 and parts[4] == "restore" and parts[3] in self.deployments:
+                self.published = parts[3]
+                return 200, self._netlify_body(parts[3]), None
+            return 404, {"code": 404, "message": "Not Found"}, None
+
+        # /accounts/{account}/pages/projects/{project}/deployments[/{id}[/...]]
+        if len(parts) < 6 or parts[0] != "accounts" or parts[5] != "deployments":
+            return 404, {"success": False, "errors": [{"message": "not found"}]}, None
+        rest = parts[6:]
+        if method == "POST" and not rest:
+            return 200, {"success": True, "result": self._cloudflare_body(self._create())}, None
+        if not rest or rest[0] not in self.deployments:
+            return 404, {"success": False, "errors": [{"message": "deployment not found"}]}, None
+        deployment_id = rest[0]
+        if method == "GET" and len(rest) == 1:
+            return 200, {"success": True, "result": self._cloudflare_body(deployment_id)}, deployment_id
+        if method == "GET" and rest[1:] == ["history", "logs"]:
+            seen = self.deployments[deployment_id][: self.positions[deployment_id] + 1]
+            lines = [{"line": f"{stage}: {status}"} for stage, status in seen]
+            return 200, {"success": True, "result": {"data": lines}}, None
+        if method == "POST" and rest[1:] == ["rollback"]:
+            self.published = deployment_id
+            return 200, {"success": True, "result": self._cloudflare_body(deployment_id)}, None
+        return 404, {"success": False, "errors": [{"message": "not found"}]}, None
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out in separate writes; don't let Nagle add 40 ms
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def _serve(self, method):
+                self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                path = urlparse(self.path).path
+                # Drop the /api/v1 or /client/v4 prefix that api_url carries
+                parts = [p for p in path.split("/") if p][2:]
+                with stub.lock:
+                    status, body, advance = stub._route(method, parts)
+                    stub.log.append((method, path, status))
+                    if advance:
+                        stub.positions[advance] += 1
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._serve("GET")
+
+            def do_POST(self):
+                self._serve("POST")
+
+        return Handler
+
+    @property
+    def api_url(self):
+        return f"{self.url}/api/v1" if self.kind == "netlify" else f"{self.url}/client/v4"
+
+
+class StubComposeRunner:
+    """
+    Stand-in for the `docker` CLI as DockerComposeProvider runs it. `config`
+    lists services as built; `up` starts the images named in the override
+    file (building them unless --no-build); `ps` reports each service
+    through `states` one step per call. fail_build makes `up --build` exit
+    non-zero; `image inspect` only finds images an `up --build` produced.
+    """
+
+    def __init__(self, services=("app",), states=("starting", "healthy"), fail_build=False):
+        self.services = list(services)
+        self.states = list(states)
+        self.fail_build = fail_build
+        self.position = 0
+        self.images = set()
+        self.running = {}
+        self.calls = []
+
+    def _ps(self):
+        state = self.states[min(self.position, len(self.states) - 1)]
+        self.position += 1
+        running = "exited" if state == "exited" else "running"
+        health = "" if state in ("running", "exited") else state
+        return [{"Service": name, "State": running, "Health": health, "Image": self.running.get(name, "")}
+                for name in self.services]
+
+    def __call__(self, args, env=None):
+        self.calls.append((list(args), dict(env or {})))
+        if args[1:3] == ["image", "inspect"]:
+            found = args[3] in self.images
+            return subprocess.CompletedProcess(args, 0 if found else 1, "[]" if found else "",
+                                               "" if found else f"No such image: {args[3]}")
+        compose_args = args[args.index("-p") + 2:] if "-p" in args else args[2:]
+        files = [args[i + 1] for i, arg in enumerate(args) if arg == "-f"]
+        action = compose_args[0] if compose_args else ""
+        stdout, returncode = "", 0
+        if action == "config":
+            stdout = json.dumps({"services": {name: {"build": {"context": "."}} for name in self.services}})
+        elif action == "up":
+            if "--build" in compose_args and self.fail_build:
+                return subprocess.CompletedProcess(args, 1, "", "failed to solve: exit code 1")
+            with open(files[-1]) as f:
+                images = {name: service["image"] for name, service in json.load(f)["services"].items()}
+            if "--build" in compose_args:
+                self.images.update(images.values())
+            self.running.update(images)
+            self.position = 0
+        elif action == "ps":
+            stdout = "\n".join(json.dumps(service) for service in self._ps())
+        elif action == "logs":
+            stdout = "\n".join(f"{name}  | listening on :3000 ({self.running.get(name)})" for name in self.services)
+        return subprocess.CompletedProcess(args, returncode, stdout, "")
+
+
+def default_site_pages(asset_cache_control="public, max-age=31536000, immutable"):
+    """A builder-like page with hashed assets served under /assets/"""
+    html = (
+        b'<!doctype html><html><head><link rel="stylesheet" href="/assets/root-3f2a.css">'
+        b'<script type="module" src="/assets/entry.client-9c1d.js"></script></head>'
+        b"<body>Webstudio</body></html>"
+    )
+    asset_headers = {"Cache-Control": asset_cache_control}
+    return {
+        "/": (200, {"Content-Type": "text/html"}, html),
+        "/assets/root-3f2a.css": (200, {"Content-Type": "text/css", **asset_headers}, b"body{}"),
+        "/assets/entry.client-9c1d.js": (200, {"Content-Type": "text/javascript", **asset_headers}, b"0;"),
+    }
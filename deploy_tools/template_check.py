@@ -0,0 +1,484 @@
+"""
+Cross-template isbot consistency checks
+Discovers every CLI template, parses its vite alias block and reports a template × check matrix
+"""
+
+import json
+import os
+import posixpath
+import re
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from deploy_tools.git_tree import GitTreeError, read_blobs
+from deploy_tools.preflight import CACHE_DIR, FileCache
+from deploy_tools.tracing import span
+
+TEMPLATES_DIR = "packages/cli/templates"
+# PROJECT_TEMPLATES / INTERNAL_TEMPLATES: `expand` lists which templates a project is layered from
+CLI_CONFIG = "packages/cli/src/config.ts"
+VITE_CONFIG_NAMES = ("vite.config.ts", "vite.config.mts", "vite.config.js", "vite.config.mjs")
+DEFAULT_MOCK = "app/shared/isbot-mock.ts"
+# Parsed vite configs and mocks per file, keyed like the preflight cache
+CACHE_FILE = "template-check.json"
+
+PASS = "pass"
+FAIL = "fail"
+NA = "n/a"
+
+CHECKS = ("vite-config", "isbot-alias", "mock-file", "mock-exports", "ssr-alias")
+# ssr-alias is reported but not required: only some runtimes resolve SSR imports separately
+REQUIRED_CHECKS = ("vite-config", "isbot-alias", "mock-file", "mock-exports")
+MOCK_EXPORTS = (re.compile(r"^export\s+default\b", re.M), re.compile(r"^export\s*\{[^}]*\bisbot\b", re.M))
+
+
+@dataclass
+class Alias:
+    """One entry of a vite alias block"""
+
+    find: str
+    replacement: Optional[str]
+    scope: str  # "resolve", "ssr.resolve", ...
+    regex: bool = False
+
+    def matches(self, module):
+        if self.regex:
+            try:
+                return re.search(self.find, module) is not None
+            except re.error:
+                return False
+        return self.find == module
+
+
+_TOKEN = re.compile(r"""
+    (?P<ws>\s+)
+  | (?P<comment>//[^\n]*|/\*.*?\*/)
+  | (?P<str>"(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*'|`(?:\\.|[^`\\])*`)
+  | (?P<id>[A-Za-z_$][\w$.]*|\d[\w.]*)
+  | (?P<p>[^\s])
+""", re.S | re.X)
+_REGEX = re.compile(r"/((?:\\.|\[(?:\\.|[^\]\\])*\]|[^/\\\n\[])+)/[a-z]*")
+# A "/" after these starts a regex literal rather than a division
+_REGEX_AFTER = set("(,=:[!&|?{};")
+
+
+def _tokens(source):
+    """(kind, value) tokens of a JS/TS source; comments are dropped"""
+    tokens = []
+    position = 0
+    while position < len(source):
+        if source[position] == "/" and (not tokens or tokens[-1] in (("p", c) for c in _REGEX_AFTER)):
+            match = _REGEX.match(source, position)
+            if match:
+                tokens.append(("re", match.group(1)))
+                position = match.end()
+                continue
+        match = _TOKEN.match(source, position)
+        kind = match.lastgroup
+        if kind == "str":
+            tokens.append(("str", match.group()[1:-1]))
+        elif kind in ("id", "p"):
+            tokens.append((kind, match.group()))
+        position = match.end()
+    return tokens
+
+
+@dataclass
+class _Frame:
+    kind: str
+    key: Optional[str]
+    props: Dict[str, list] = field(default_factory=dict)
+    current: Optional[str] = None
+
+
+def parse_aliases(source):
+    """
+    Alias entries of every `alias` key in a vite config, in both the array
+    form ({find, replacement} objects) and the object form ({module: path}).
+    A replacement is the last string in its expression, so
+    resolve("./x"), path.resolve(__dirname, "x") and plain strings all work.
+    """
+    closers = {")": "(", "]": "[", "}": "{"}
+    tokens = _tokens(source)
+    stack = [_Frame("root", None)]
+    aliases = []
+
+    def scope():
+        return ".".join(frame.key for frame in stack if frame.key and frame.key != "alias")
+
+    for index, (kind, value) in enumerate(tokens):
+        top = stack[-1]
+        following = tokens[index + 1] if index + 1 < len(tokens) else None
+        if kind in ("id", "str") and top.kind == "{" and following == ("p", ":"):
+            top.current = value
+            top.props.setdefault(value, [])
+        elif kind in ("str", "re"):
+            holder = next((frame for frame in reversed(stack) if frame.kind == "{"), None)
+            if holder and holder.current:
+                holder.props[holder.current].append((kind, value))
+        elif kind == "p" and value in "([{":
+            stack.append(_Frame(value, top.current if top.kind == "{" else None))
+        elif kind == "p" and value in closers:
+            if len(stack) == 1 or stack[-1].kind != closers[value]:
+                continue
+            frame = stack.pop()
+            parent = stack[-1]
+            if frame.kind == "{" and parent.kind == "[" and parent.key == "alias":
+                find = (frame.props.get("find") or [None])[0]
+                replacement = frame.props.get("replacement") or []
+                if find:
+                    aliases.append(Alias(find[1], replacement[-1][1] if replacement else None, scope(),
+                                         regex=find[0] == "re"))
+            elif frame.kind == "{" and frame.key == "alias":
+                for name, values in frame.props.items():
+                    aliases.append(Alias(name, values[-1][1] if values else None, scope()))
+        elif kind == "p" and value == "," and top.kind == "{":
+            top.current = None
+    return aliases
+
+
+def _alias_rows(source):
+    return [[a.find, a.replacement, a.scope, a.regex] for a in parse_aliases(source)]
+
+
+def _missing_exports(source):
+    return [label for label, pattern in zip(("default", "isbot"), MOCK_EXPORTS) if not pattern.search(source)]
+
+
+class _Scan:
+    """
+    A FileCache check whose cached detail is what parse made of the file,
+    so an unchanged file is neither read nor parsed again. Bump the key
+    when parse changes.
+    """
+
+    def __init__(self, key, parse):
+        self.key = key
+        self.parse = parse
+
+    def evaluate(self, content):
+        if content is None:
+            return False, None
+        return True, self.parse(content.decode("utf-8", errors="replace"))
+
+
+ALIAS_SCAN = _Scan("template:aliases:1", _alias_rows)
+MOCK_SCAN = _Scan("template:mock-exports:1", _missing_exports)
+
+
+def template_layers(config_source, names):
+    """
+    Layers each template is generated from, base first. A template that
+    some `expand` list places after others inherits their files; one that
+    no list mentions stands alone.
+    """
+    expansions = [re.findall(r"[\"']([^\"']+)[\"']", body)
+                  for body in re.findall(r"expand\s*:\s*\[([^\]]*)\]", config_source or "")]
+    layers = {}
+    for name in names:
+        prefixes = [expand[:expand.index(name) + 1] for expand in expansions if name in expand]
+        layers[name] = min(prefixes, key=len) if prefixes else [name]
+    return layers
+
+
+class _WorktreeSource:
+    """Template files from the working tree"""
+
+    label = "worktree"
+
+    def __init__(self, repo_path, cache=None):
+        self.root = Path(repo_path)
+        self.cache = cache or FileCache(None)
+
+    def templates(self):
+        directory = self.root / TEMPLATES_DIR
+        if not directory.is_dir():
+            return []
+        return sorted(p.name for p in directory.iterdir() if p.is_dir() and not p.name.startswith("."))
+
+    def exists(self, path):
+        return (self.root / path).exists()
+
+    def is_dir(self, path):
+        return (self.root / path).is_dir()
+
+    def read(self, path):
+        try:
+            return (self.root / path).read_text(errors="replace")
+        except (OSError, IsADirectoryError):
+            return None
+
+    def scan(self, path, scan):
+        """scan's result for a file, from the cache while the file is unchanged"""
+        try:
+            found, value, _ = self.cache.lookup(self.root / path, scan)
+        except OSError:
+            return None
+        return value if found else None
+
+
+class _CommitSource:
+    """
+    Template files from a commit's tree. The file list comes from one
+    ls-tree, and every vite config and isbot mock is fetched in one
+    cat-file batch up front.
+    """
+
+    def __init__(self, repo_path, commit):
+        self.label = commit
+        result = subprocess.run(
+            ["git", "ls-tree", "-r", "--name-only", commit, "--", TEMPLATES_DIR],
+            cwd=repo_path, capture_output=True, text=True,
+        )
+        if result.returncode != 0:
+            raise GitTreeError(f"git ls-tree {commit} failed: {result.stderr.strip()}")
+        self.files = set(result.stdout.split("\n")) - {""}
+        self.dirs = {posixpath.dirname(path) for path in self.files}
+        for directory in list(self.dirs):
+            while directory:
+                directory = posixpath.dirname(directory)
+                self.dirs.add(directory)
+        wanted = [path for path in self.files
+                  if posixpath.basename(path) in VITE_CONFIG_NAMES or "isbot" in posixpath.basename(path)]
+        blobs = read_blobs(repo_path, [f"{commit}:{path}" for path in [*wanted, CLI_CONFIG]])
+        self.blobs = {name.split(":", 1)[1]: blob for name, blob in blobs.items()}
+
+    def templates(self):
+        prefix = TEMPLATES_DIR + "/"
+        return sorted({path[len(prefix):].split("/", 1)[0] for path in self.files
+                       if path.startswith(prefix) and "/" in path[len(prefix):]})
+
+    def exists(self, path):
+        return path in self.files or path in self.dirs
+
+    def is_dir(self, path):
+        return path in self.dirs
+
+    def read(self, path):
+        blob = self.blobs.get(path)
+        return blob.decode("utf-8", errors="replace") if blob is not None else None
+
+    def scan(self, path, scan):
+        found, value = scan.evaluate(self.blobs.get(path))
+        return value if found else None
+
+
+@dataclass
+class Cell:
+    """One template × check outcome"""
+
+    status: str
+    detail: str = ""
+
+
+@dataclass
+class TemplateResult:
+    """Every check for one template"""
+
+    name: str
+    layers: List[str]
+    cells: Dict[str, Cell]
+    elapsed_ms: float = 0.0
+
+    @property
+    def passed(self):
+        return all(self.cells[check].status != FAIL for check in REQUIRED_CHECKS)
+
+    @property
+    def applicable(self):
+        return any(self.cells[check].status != NA for check in REQUIRED_CHECKS)
+
+
+@dataclass
+class TemplateMatrix:
+    """Aggregated template × check results"""
+
+    source: str
+    results: List[TemplateResult]
+    elapsed_ms: float = 0.0
+
+    @property
+    def passed(self):
+        return bool(self.results) and all(result.passed for result in self.results)
+
+    @property
+    def failures(self):
+        if not self.results:
+            return [f"no templates under {TEMPLATES_DIR}"]
+        return [
+            f"{result.name}: {check} {result.cells[check].detail}".rstrip()
+            for result in self.results
+            for check in REQUIRED_CHECKS
+            if result.cells[check].status == FAIL
+        ]
+
+    def to_dict(self):
+        return {
+            "source": self.source,
+            "passed": self.passed,
+            "elapsed_ms": round(self.elapsed_ms, 3),
+            "checks": list(CHECKS),
+            "required": list(REQUIRED_CHECKS),
+            "templates": {
+                result.name: {
+                    "passed": result.passed,
+                    "layers": result.layers,
+                    "elapsed_ms": round(result.elapsed_ms, 3),
+                    "checks": {check: {"status": cell.status, "detail": cell.detail}
+                               for check, cell in result.cells.items()},
+                }
+                for result in self.results
+            },
+        }
+
+
+def _effective(source, layers, relative):
+    """Template-relative path as generated: later layers override earlier ones"""
+    for layer in reversed(layers):
+        path = f"{TEMPLATES_DIR}/{layer}/{relative}"
+        if source.exists(path):
+            return path
+    return None
+
+
+def _alias_target(replacement):
+    """Template-relative path an alias replacement points at, or None if it leaves the template"""
+    if not replacement:
+        return None
+    path = posixpath.normpath(replacement.replace("\\", "/"))
+    if path.startswith(("/", "..")):
+        return None
+    return path
+
+
+def check_template(source, name, layers):
+    """Run every check for one template"""
+    started = time.perf_counter()
+    cells = {}
+    config_path = next(
+        (path for path in (_effective(source, layers, n) for n in VITE_CONFIG_NAMES) if path), None
+    )
+    has_app = any(source.is_dir(f"{TEMPLATES_DIR}/{layer}/app") for layer in layers)
+
+    if config_path is None:
+        status = FAIL if has_app else NA
+        cells["vite-config"] = Cell(status, "app without vite config" if has_app else "no app or vite config")
+        for check in CHECKS[1:]:
+            cells[check] = Cell(NA)
+        return TemplateResult(name, layers, cells, (time.perf_counter() - started) * 1000)
+
+    owner = config_path.split("/")[3]
+    cells["vite-config"] = Cell(PASS, config_path.split("/", 3)[3] + ("" if owner == name else f" from {owner}"))
+    aliases = [alias for alias in (Alias(*row) for row in source.scan(config_path, ALIAS_SCAN) or [])
+               if alias.matches("isbot")]
+    client = [alias for alias in aliases if alias.scope == "resolve"]
+    ssr = [alias for alias in aliases if alias.scope.endswith("ssr.resolve")]
+
+    if client:
+        cells["isbot-alias"] = Cell(PASS, f"→ {client[0].replacement}")
+    else:
+        other = f" (only in {aliases[0].scope})" if aliases else ""
+        cells["isbot-alias"] = Cell(FAIL, f"no resolve.alias for isbot{other}")
+    cells["ssr-alias"] = Cell(PASS, f"→ {ssr[0].replacement}") if ssr else Cell(NA, "none")
+
+    target = _alias_target(client[0].replacement) if client else DEFAULT_MOCK
+    mock_path = _effective(source, layers, target) if target else None
+    if client and target is None:
+        cells["mock-file"] = Cell(FAIL, f"{client[0].replacement} points outside the template")
+    elif mock_path is None:
+        cells["mock-file"] = Cell(FAIL, f"{target} missing")
+    else:
+        mock_owner = mock_path.split("/")[3]
+        cells["mock-file"] = Cell(PASS, target + ("" if mock_owner == name else f" from {mock_owner}"))
+
+    missing = source.scan(mock_path, MOCK_SCAN) if mock_path else None
+    if missing is None:
+        cells["mock-exports"] = Cell(NA)
+    else:
+        cells["mock-exports"] = Cell(FAIL, f"no {' or '.join(missing)} export") if missing else Cell(PASS)
+    return TemplateResult(name, layers, cells, (time.perf_counter() - started) * 1000)
+
+
+def check_templates(repo_path, commit=None, max_workers=8, cache_path=None, use_cache=True):
+    """
+    Check every template under packages/cli/templates; returns a
+    TemplateMatrix. Working-tree vite configs and mocks are parsed through
+    a persistent FileCache, so unchanged templates are not parsed again.
+    """
+    started = time.perf_counter()
+    with span("template_check", commit=commit or "worktree") as active:
+        cache = None
+        if commit:
+            source = _CommitSource(repo_path, commit)
+        else:
+            if use_cache and cache_path is None:
+                cache_path = Path(repo_path) / CACHE_DIR / CACHE_FILE
+            cache = FileCache(cache_path if use_cache else None)
+            source = _WorktreeSource(repo_path, cache)
+        names = source.templates()
+        layers = template_layers(source.read(CLI_CONFIG), names)
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            results = list(pool.map(lambda name: check_template(source, name, layers[name]), names))
+        if cache:
+            cache.save()
+        matrix = TemplateMatrix(source.label, results, (time.perf_counter() - started) * 1000)
+        if active:
+            active.set_attribute("templates", len(results))
+            active.set_attribute("passed", matrix.passed)
+    return matrix
+
+
+_MARKS = {PASS: "✓", FAIL: "✗", NA: "·"}
+
+
+def format_matrix(matrix, details=True):
+    """Template × check table, plus one line per required failure"""
+    headers = [check if check in REQUIRED_CHECKS else f"{check}*" for check in CHECKS]
+    width = max([len("TEMPLATE"), *(len(r.name) for r in matrix.results)]) + 2
+    lines = ["TEMPLATE".ljust(width) + "  ".join(headers) + "  LAYERS"]
+    for result in matrix.results:
+        marks = [_MARKS[result.cells[check].status].center(len(header)) for check, header in zip(CHECKS, headers)]
+        layers = " + ".join(result.layers) if len(result.layers) > 1 else ""
+        lines.append((result.name.ljust(width) + "  ".join(marks) + f"  {layers}").rstrip())
+    checked = [r for r in matrix.results if r.applicable]
+    passing = sum(1 for r in checked if r.passed)
+    lines.append(
+        f"{passing}/{len(checked)} templates consistent, {len(matrix.results) - len(checked)} not applicable "
+        f"({matrix.elapsed_ms:.1f} ms; * informational)"
+    )
+    if details:
+        lines += [f"✗ {failure}" for failure in matrix.failures]
+    return lines
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Check isbot fixes across every CLI template")
+    parser.add_argument("--path", default=os.getcwd(), help="Repository root (default: cwd)")
+    parser.add_argument("--commit", help="Check a commit's tree instead of the working tree")
+    parser.add_argument("--json", metavar="PATH", help="Write the matrix as JSON to PATH ('-' for stdout)")
+    args = parser.parse_args(argv)
+
+    try:
+        matrix = check_templates(args.path, args.commit)
+    except GitTreeError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    if args.json == "-":
+        json.dump(matrix.to_dict(), sys.stdout, indent=2)
+        print()
+    else:
+        if args.json:
+            Path(args.json).write_text(json.dumps(matrix.to_dict(), indent=2))
+        print("\n".join(format_matrix(matrix)))
+    return 0 if matrix.passed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+"""
+Shared fixtures for the deploy_tools tests
+Everything runs against deploy_tools.stub_server; nothing leaves localhost
+"""
+
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+import requests
+
+# The scripts import deploy_tools from the repository root
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+
+@pytest.fixture(autouse=True)
+def _stop_logging():
+    """Stop the log listener while pytest's captured stdout is still open"""
+    yield
+    from deploy_tools import log
+
+    log.shutdown()
+
+
+@pytest.fixture
+def session():
+    """A private keep-alive session, so tests don't share pooled connections"""
+    with requests.Session() as session:
+        yield session
+
+
+class Sleeps(list):
+    """Records requested delays instead of waiting"""
+
+    def __call__(self, seconds):
+        self.append(seconds)
+
+
+@pytest.fixture
+def sleep():
+    return Sleeps()
+
+
+def git(repo, *args):
+    subprocess.run(["git", *args], cwd=repo, check=True, capture_output=True)
+
+
+@pytest.fixture
+def repo(tmp_path):
+    """A committed minimal workspace: the builder app depending on one package"""
+    files = {
+        "package.json": '{"name": "root"}',
+        "pnpm-lock.yaml": "lockfileVersion: '9.0'\n",
+        "pnpm-workspace.yaml": "packages:\n  - packages/*\n  - apps/*\n",
+        "apps/builder/package.json": json.dumps({
+            "name": "@webstudio-is/builder", "scripts": {"build": "vite build"},
+            "dependencies": {"@webstudio-is/sdk": "workspace:*"},
+        }),
+        "apps/builder/app/root.tsx": "export default 1\n",
+        "packages/sdk/package.json": json.dumps({"name": "@webstudio-is/sdk", "scripts": {"build": "tsc"}}),
+        "packages/sdk/src/index.ts": "export const sdk = 1\n",
+    }
+    for path, text in files.items():
+        (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / path).write_text(text)
+    git(tmp_path, "init", "-q")
+    git(tmp_path, "add", "-A")
+    git(tmp_path, "-c", "user.name=test", "-c", "user.email=test@example.com", "commit", "-qm", "init")
+    return tmp_path
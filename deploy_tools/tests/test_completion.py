@@ -0,0 +1,99 @@
+import importlib.util
+import socket
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from deploy_tools import agent_tools
+from deploy_tools.completion import (
+    CachedBackend,
+    Completion,
+    ScriptedBackend,
+    ToolCall,
+    benchmark,
+    replayable,
+)
+
+ROOT = Path(__file__).resolve().parents[2]
+
+
+class Blocked(AssertionError):
+    pass
+
+
+@pytest.fixture
+def no_side_effects(monkeypatch, tmp_path):
+    """Fail the test on any subprocess or network connection"""
+
+    def refuse(*args, **kwargs):
+        raise Blocked(f"side effect attempted: {args[:2]}")
+
+    monkeypatch.setattr(subprocess.Popen, "__init__", refuse)
+    monkeypatch.setattr(socket.socket, "connect", refuse)
+    monkeypatch.setattr(socket, "create_connection", refuse)
+    monkeypatch.setattr(agent_tools, "PROJECT_PATH", str(tmp_path))
+    monkeypatch.setattr(agent_tools, "_compactor", None)
+    return tmp_path
+
+
+@pytest.fixture
+def deploy_agent():
+    spec = importlib.util.spec_from_file_location("deploy_agent", ROOT / "deploy-agent.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class RecordingTool:
+    runs = []
+
+    def __init__(self, **args):
+        self.args = args
+
+    def run(self):
+        RecordingTool.runs.append(self.args)
+        return "Success: deployed"
+
+
+@pytest.mark.parametrize("cache", [True, False])
+def test_offline_benchmark_runs_nothing(no_side_effects, deploy_agent, cache):
+    backend = deploy_agent.create_backend(offline=True, cache=cache)
+    summary = benchmark(backend, deploy_agent.DEPLOYMENT_PROMPT, iterations=3)
+
+    assert summary["iterations"] == 3
+    assert summary["cached"] == (2 if cache else 0)
+    assert set(summary["tool_calls_ms"]) == {"GitMonitorTool", "VercelDeploymentTool", "VercelStatusTool"}
+
+
+def test_offline_cli_benchmark_runs_nothing(no_side_effects, deploy_agent):
+    assert deploy_agent.main(["agency", "--offline", "--benchmark", "2"]) == 0
+
+
+def test_scripted_deploys_need_opt_in():
+    RecordingTool.runs = []
+    tools = {"VercelDeploymentTool": RecordingTool}
+    script = [{"tool": "VercelDeploymentTool", "args": {"commit_sha": "abc"}}]
+
+    refused = ScriptedBackend(script, tools).complete("deploy")
+    assert refused.tool_calls[0].output.startswith("❌ VercelDeploymentTool deploys")
+    assert RecordingTool.runs == []
+
+    allowed = ScriptedBackend(script, tools, allow_deploy=True).complete("deploy")
+    assert allowed.tool_calls[0].output == "Success: deployed"
+    assert RecordingTool.runs == [{"commit_sha": "abc"}]
+    assert not replayable(allowed)
+
+
+def test_canned_deploys_are_replayable():
+    canned = ToolCall("VercelDeploymentTool", {}, "🚀 ok", 1.0, canned=True)
+    assert replayable(Completion("ok", "scripted", 1.0, [canned]))
+
+
+def test_cache_key_skips_tool_state_for_canned_scripts(tmp_path):
+    def state(path):
+        raise AssertionError("tool state read for a canned script")
+
+    cached = CachedBackend(ScriptedBackend(tools={}), tmp_path, state=state)
+    assert cached.complete("deploy").cached is False
+    assert cached.complete("deploy").cached is True
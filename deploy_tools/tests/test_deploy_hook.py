@@ -0,0 +1,103 @@
+import json
+
+import pytest
+
+from deploy_tools.deploy_hook import (
+    LEDGER_FILE,
+    DeployHookClient,
+    DeployHookError,
+    HookLedger,
+    idempotency_key,
+    trigger_deploy,
+)
+from deploy_tools.preflight import CACHE_DIR
+from deploy_tools.stub_server import StubDeployHook
+from deploy_tools.vercel_status import Backoff
+
+
+def client(hook, session, sleep, **kwargs):
+    backoff = Backoff(initial=0.5, maximum=5.0, multiplier=2.0, jitter=0.0)
+    return DeployHookClient(kwargs.pop("url", hook.hook_url), session=session,
+                            backoff=backoff, sleep=sleep, **kwargs)
+
+
+def test_idempotency_key_is_stable_per_deploy():
+    assert idempotency_key("webstudio", "abc") == idempotency_key("webstudio", "abc")
+    assert idempotency_key("webstudio", "abc") != idempotency_key("webstudio", "abd")
+    assert idempotency_key("webstudio", "abc") != idempotency_key("webstudio", "abc", "1700000000")
+
+
+def test_trigger_starts_one_job(session, sleep):
+    with StubDeployHook() as hook:
+        result = client(hook, session, sleep).trigger("key-1")
+
+    assert result.job_id == "job_1" and result.state == "PENDING"
+    assert result.status_code == 201 and result.attempts == 1 and not result.replayed
+    assert hook.log == [("/v1/integrations/deploy/prj_stub/hook", "key-1")]
+
+
+def test_retries_transient_failures_with_the_same_key(session, sleep):
+    with StubDeployHook(fail_first=2) as hook:
+        result = client(hook, session, sleep).trigger("key-1")
+
+    assert result.job_id == "job_1" and result.attempts == 3
+    assert [key for _, key in hook.log] == ["key-1"] * 3
+    assert len(hook.jobs) == 1
+    assert sleep == [0.5, 1.0]
+
+
+def test_gives_up_after_the_last_attempt(session, sleep):
+    with StubDeployHook(fail_first=10) as hook:
+        with pytest.raises(DeployHookError, match="after 3 attempt"):
+            client(hook, session, sleep).trigger("key-1")
+
+    assert len(hook.log) == 3 and hook.jobs == []
+
+
+def test_client_errors_are_not_retried(session, sleep):
+    with StubDeployHook() as hook:
+        with pytest.raises(DeployHookError, match="HTTP 404"):
+            client(hook, session, sleep, url=f"{hook.url}/not-a-hook").trigger("key-1")
+
+    assert len(hook.log) == 1 and sleep == []
+
+
+def test_hook_deduplicates_a_repeated_key(session, sleep):
+    with StubDeployHook() as hook:
+        first = client(hook, session, sleep).trigger("key-1")
+        again = client(hook, session, sleep).trigger("key-1")
+        other = client(hook, session, sleep).trigger("key-2")
+
+    assert again.job_id == first.job_id and again.status_code == 200
+    assert other.job_id != first.job_id
+    assert len(hook.jobs) == 2
+
+
+def test_ledger_replays_without_posting(tmp_path, session, sleep):
+    ledger = HookLedger(tmp_path)
+    with StubDeployHook() as hook:
+        first = client(hook, session, sleep, ledger=ledger).trigger("key-1")
+        again = client(hook, session, sleep, ledger=HookLedger(tmp_path)).trigger("key-1")
+
+    assert again.replayed and again.attempts == 0 and again.status_code is None
+    assert (again.job_id, again.state) == (first.job_id, first.state)
+    assert len(hook.log) == 1
+
+
+def test_expired_ledger_entries_trigger_again(tmp_path, session, sleep):
+    with StubDeployHook() as hook:
+        client(hook, session, sleep, ledger=HookLedger(tmp_path, ttl_s=0)).trigger("key-1")
+        again = client(hook, session, sleep, ledger=HookLedger(tmp_path, ttl_s=0)).trigger("key-1")
+
+    assert not again.replayed
+    assert len(hook.log) == 2
+
+
+def test_trigger_deploy_records_in_the_project_cache(tmp_path, session, sleep):
+    with StubDeployHook() as hook:
+        result = trigger_deploy(tmp_path, "key-1", hook.hook_url, session=session, sleep=sleep)
+        replayed = trigger_deploy(tmp_path, "key-1", hook.hook_url, session=session, sleep=sleep)
+
+    ledger = json.loads((tmp_path / CACHE_DIR / LEDGER_FILE).read_text())
+    assert ledger["key-1"]["job_id"] == result.job_id
+    assert replayed.replayed and len(hook.log) == 1
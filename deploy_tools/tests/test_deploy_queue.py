@@ -0,0 +1,94 @@
+import importlib.util
+import os
+from pathlib import Path
+
+import pytest
+
+from deploy_tools.deploy_queue import CLAIMED, DUPLICATE, QUEUED, DeployQueue
+
+ROOT = Path(__file__).resolve().parents[2]
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return DeployQueue(tmp_path, "webstudio")
+
+
+def test_newer_commits_coalesce_behind_the_active_deploy(queue):
+    first = queue.submit("c1", source="smart-deploy")
+    assert first.status == CLAIMED
+    assert queue.submit("c1").status == DUPLICATE
+    assert queue.submit("c2").status == QUEUED
+    replaced = queue.submit("c3", source="deploy-agent")
+    assert replaced.status == QUEUED and replaced.superseded == "c2"
+    assert queue.superseded(first.ticket)
+
+
+def test_finish_hands_the_pending_commit_over_as_a_claim(queue):
+    first = queue.submit("c1").ticket
+    queue.submit("c2", source="deploy-agent")
+
+    handed = queue.finish(first)
+    assert (handed.commit, handed.source, handed.pid) == ("c2", "deploy-agent", os.getpid())
+    state = queue.status()
+    assert state["active"]["commit"] == "c2" and state["pending"] is None
+    # The slot is held for c2 until it finishes too
+    assert queue.submit("c2").status == DUPLICATE
+
+    assert queue.finish(handed) is None
+    assert queue.status()["active"] is None and not queue.busy()
+
+
+def test_finish_leaves_the_pending_commit_to_a_new_slot_holder(queue):
+    first = queue.submit("c1").ticket
+    queue.submit("c2")
+    with queue._locked() as state:
+        # Our claim went stale and a live process took the slot over
+        state["active"] = {**state["active"], "pid": os.getppid(), "claimed_at": first.claimed_at + 1}
+
+    assert queue.finish(first) is None
+    assert queue.status()["pending"]["commit"] == "c2"
+
+
+@pytest.fixture
+def agent(tmp_path, monkeypatch):
+    spec = importlib.util.spec_from_file_location("smart_deploy", ROOT / "smart-deploy.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    agent = module.SmartDeploymentAgent(project_path=str(tmp_path), project_name="webstudio")
+    agent.prepared, agent.deployed = [], []
+    return agent
+
+
+def script(agent, monkeypatch, skip=()):
+    def prepare_deploy(commit=None, skip_preflight=False, force=False, started_at=None):
+        agent.prepared.append(commit)
+        return commit or "c1", None, (True if commit in skip else None)
+
+    def run_deployment_methods(ticket, started_at, fingerprint):
+        agent.deployed.append(ticket.commit)
+        if ticket.commit == "c1":
+            # Another checkout asks for a newer commit mid-deploy
+            DeployQueue(agent.project_path, "webstudio").submit("c2", source="deploy-agent")
+        return True
+
+    monkeypatch.setattr(agent, "prepare_deploy", prepare_deploy)
+    monkeypatch.setattr(agent, "run_deployment_methods", run_deployment_methods)
+
+
+def test_smart_deploy_deploys_the_handed_over_commit(agent, monkeypatch):
+    script(agent, monkeypatch)
+
+    assert agent.intelligent_deployment() is True
+    assert agent.prepared == [None, "c2"]
+    assert agent.deployed == ["c1", "c2"]
+    assert not DeployQueue(agent.project_path, "webstudio").busy()
+
+
+def test_smart_deploy_releases_a_handed_over_commit_it_skips(agent, monkeypatch):
+    script(agent, monkeypatch, skip=("c2",))
+
+    assert agent.intelligent_deployment() is True
+    assert agent.deployed == ["c1"]
+    state = DeployQueue(agent.project_path, "webstudio").status()
+    assert state["active"] is None and state["pending"] is None
@@ -0,0 +1,53 @@
+from conftest import git
+
+from deploy_tools.build_cache import output_units
+from deploy_tools.fingerprint import compute_fingerprint, dirty_paths
+
+
+def test_untracked_directories_are_listed_file_by_file(repo):
+    (repo / "apps/builder/app/routes").mkdir()
+    (repo / "apps/builder/app/routes/new.tsx").write_text("export default 2\n")
+    (repo / "apps/builder/app/routes/nested").mkdir()
+    (repo / "apps/builder/app/routes/nested/deep.tsx").write_text("export default 3\n")
+
+    assert sorted(dirty_paths(repo, "apps/builder")) == [
+        "apps/builder/app/routes/nested/deep.tsx",
+        "apps/builder/app/routes/new.tsx",
+    ]
+
+
+def test_renames_report_both_paths(repo):
+    git(repo, "mv", "apps/builder/app/root.tsx", "apps/builder/app/main.tsx")
+
+    assert sorted(dirty_paths(repo, "apps/builder")) == [
+        "apps/builder/app/main.tsx",
+        "apps/builder/app/root.tsx",
+    ]
+
+
+def test_edits_inside_a_new_directory_change_the_fingerprint(repo):
+    clean = compute_fingerprint(repo)
+    (repo / "apps/builder/app/routes").mkdir()
+    new_file = repo / "apps/builder/app/routes/new.tsx"
+    new_file.write_text("export default 2\n")
+    added = compute_fingerprint(repo)
+    new_file.write_text("export default 3\n")
+    edited = compute_fingerprint(repo)
+
+    assert len({clean.digest, added.digest, edited.digest}) == 3
+    assert edited.dirty == ["apps/builder/app/routes/new.tsx"]
+
+
+def test_edits_inside_a_new_directory_change_cache_keys(repo):
+    def keys():
+        return {unit.name: unit.key for unit in output_units(repo)}
+
+    (repo / "packages/sdk/src/extra").mkdir()
+    new_file = repo / "packages/sdk/src/extra/util.ts"
+    new_file.write_text("export const a = 1\n")
+    before = keys()
+    new_file.write_text("export const a = 2\n")
+    after = keys()
+
+    assert before["packages/sdk"] != after["packages/sdk"]
+    assert before["apps/builder"] != after["apps/builder"]
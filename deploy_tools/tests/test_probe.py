@@ -0,0 +1,94 @@
+import json
+import socket
+
+import pytest
+
+from deploy_tools.preflight import CACHE_DIR
+from deploy_tools.probe import (
+    BASELINE_FILE,
+    BaselineStore,
+    HealthProbe,
+    header_rules,
+    probe_deployment,
+)
+from deploy_tools.stub_server import StubSite, default_site_pages
+
+ASSETS = ["/assets/root-3f2a.css", "/assets/entry.client-9c1d.js"]
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+@pytest.fixture
+def project(tmp_path):
+    config = {"headers": [{"source": "/assets/(.*)",
+                           "headers": [{"key": "Cache-Control", "value": IMMUTABLE}]}]}
+    (tmp_path / "vercel.json").write_text(json.dumps(config))
+    return tmp_path
+
+
+def probe(site, project, **kwargs):
+    return HealthProbe(site.url, samples=3, header_rules=header_rules(project / "vercel.json"), **kwargs)
+
+
+def test_healthy_site_passes_and_discovers_assets(project):
+    with StubSite() as site:
+        report = probe(site, project).check(baseline={"paths": {}})
+
+    assert report.passed, report.failures
+    assert [s.path for s in report.stats] == ["/", *ASSETS]
+    assert all(s.requests == 3 and s.errors == 0 and s.statuses == {200: 3} for s in report.stats)
+    assert all(s.ttfb_p50 <= s.total_p95 for s in report.stats)
+    assert report.warnings == []
+
+
+def test_missing_cache_directives_fail(project):
+    with StubSite(default_site_pages(asset_cache_control="public, max-age=60")) as site:
+        report = probe(site, project).check()
+
+    assert not report.passed
+    assert all("Cache-Control" in f and "immutable" in f for f in report.failures)
+    assert len(report.failures) == len(ASSETS)
+    assert report.warnings == ["no baseline yet; latency regressions not checked"]
+
+
+def test_error_statuses_fail(project):
+    pages = default_site_pages()
+    pages["/"] = (500, {}, b"boom")
+    with StubSite(pages) as site:
+        report = probe(site, project).check()
+
+    assert report.failures == ["/: HTTP 500"]
+    # Nothing to discover assets from on an error page
+    assert [s.path for s in report.stats] == ["/"]
+
+
+def test_latency_regression_against_baseline(project):
+    baseline = {"paths": {"/": {"total_p95": 1.0}}}
+    with StubSite(delays={"/": 0.1}) as site:
+        report = probe(site, project, discover_assets=False).check(baseline)
+
+    assert len(report.failures) == 1
+    assert report.failures[0].startswith("/: p95") and "regressed from 1 ms" in report.failures[0]
+
+
+def test_unreachable_site_fails():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    report = HealthProbe(f"http://127.0.0.1:{port}", samples=2, timeout=2).check()
+
+    assert len(report.failures) == 1 and "2/2 requests failed" in report.failures[0]
+    assert report.stats[0].errors == 2 and report.stats[0].total_p95 is None
+
+
+def test_probe_deployment_records_passing_baselines_only(project):
+    with StubSite() as site:
+        first = probe_deployment(site.url, project, "webstudio", commit="abc", samples=2)
+    stored = BaselineStore(project).last("webstudio")
+    assert first.passed
+    assert stored["commit"] == "abc" and set(stored["paths"]) == {"/", *ASSETS}
+
+    with StubSite(default_site_pages(asset_cache_control="no-cache")) as site:
+        failed = probe_deployment(site.url, project, "webstudio", commit="def", samples=2)
+    assert not failed.passed
+    saved = json.loads((project / CACHE_DIR / BASELINE_FILE).read_text())
+    assert saved["webstudio"]["commit"] == "abc"
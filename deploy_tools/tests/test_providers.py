@@ -0,0 +1,243 @@
+import os
+import time
+
+import pytest
+
+from deploy_tools.executor import DeploymentExecutor
+from deploy_tools.providers import (
+    BUILDING,
+    ERROR,
+    READY,
+    CloudflareProvider,
+    DockerComposeProvider,
+    NetlifyProvider,
+    ProviderError,
+    VercelProvider,
+    trigger_async,
+    wait_for,
+)
+from deploy_tools.stub_server import StubComposeRunner, StubDeployHook, StubProviderAPI, StubVercelAPI
+from deploy_tools.vercel_status import Backoff
+
+
+async def no_sleep(seconds):
+    pass
+
+
+def follow(provider, deployment, sleep):
+    backoff = Backoff(initial=1.0, maximum=4.0, jitter=0.0)
+    transitions = []
+    final = wait_for(provider, deployment, deadline=60, backoff=backoff, sleep=sleep,
+                     on_transition=lambda previous, d: transitions.append((previous, d.state)))
+    return final, transitions
+
+
+def fake_cli(tmp_path, monkeypatch, script):
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    npx = bin_dir / "npx"
+    npx.write_text(f"#!/bin/sh\n{script}\n")
+    npx.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+
+
+def alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+def test_superseded_cli_deploy_kills_the_build(tmp_path, monkeypatch):
+    pid_file = tmp_path / "vercel.pid"
+    fake_cli(tmp_path, monkeypatch, f"echo $$ > {pid_file}\nexec sleep 30")
+    provider = VercelProvider(tmp_path, timeout=60)
+
+    async def deploy():
+        return await trigger_async(provider, "abc1234")
+
+    executor = DeploymentExecutor([deploy], cancel_when=lambda: pid_file.exists() and "superseded",
+                                  cancel_poll=0.05)
+    started = time.monotonic()
+    report = executor.run()
+
+    assert report.cancelled == "superseded" and report.winner is None
+    assert report.outcomes[0].status == "cancelled"
+    assert time.monotonic() - started < 10
+    assert not alive(int(pid_file.read_text()))
+
+
+def test_sync_trigger_runs_outside_an_event_loop(tmp_path, monkeypatch):
+    fake_cli(tmp_path, monkeypatch, "echo 'vercel: deploy failed' >&2; exit 1")
+    provider = VercelProvider(tmp_path, timeout=10)
+
+    with pytest.raises(ProviderError, match=r"vercel --prod failed \(exit 1\)"):
+        provider.trigger("abc1234")
+
+
+@pytest.fixture
+def vercel_api():
+    started = time.time()
+    api = StubVercelAPI(
+        {"dpl_old": ["READY"], "dpl_new": ["BUILDING", "BUILDING", "READY"],
+         "dpl_bad": ["BUILDING", "ERROR"], "dpl_cli": ["BUILDING", "READY"]},
+        project_deployments={"prj_1": ["dpl_new", "dpl_old"]},
+        commits={"dpl_old": "aaa1111", "dpl_new": "bbb2222"},
+        created={"dpl_old": int((started - 3600) * 1000), "dpl_new": int(started * 1000)},
+        listed_after={"dpl_new": 1},
+    )
+    with api:
+        yield api
+
+
+def vercel(tmp_path, api, session, **kwargs):
+    return VercelProvider(tmp_path, project_id="prj_1", token="t", base_url=api.url,
+                          session=session, sleep=no_sleep, **kwargs)
+
+
+def test_vercel_hook_deploy_follows_the_registered_deployment(tmp_path, vercel_api, session, sleep):
+    with StubDeployHook() as hook:
+        provider = vercel(tmp_path, vercel_api, session, hook_url=hook.hook_url, timeout=30)
+        deployment = provider.trigger("bbb2222", key="deploy-1")
+        assert len(hook.jobs) == 1
+
+    assert deployment.deployment_id == "dpl_new" and deployment.state == BUILDING
+    assert vercel_api.list_requests == 2
+    final, transitions = follow(provider, deployment, sleep)
+    assert final.ready and final.url == "dpl_new.vercel.app"
+    assert transitions == [(BUILDING, READY)]
+    assert provider.logs("dpl_new")[-1] == "state: READY"
+
+
+def test_vercel_hook_deploy_that_never_registers(tmp_path, vercel_api, session):
+    with StubDeployHook() as hook:
+        provider = vercel(tmp_path, vercel_api, session, hook_url=hook.hook_url, timeout=0)
+        with pytest.raises(ProviderError, match="no deployment of ccc3333 registered"):
+            provider.trigger("ccc3333", key="deploy-1")
+
+
+def test_vercel_hook_errors(tmp_path, vercel_api, session):
+    with StubDeployHook() as hook:
+        provider = vercel(tmp_path, vercel_api, session, hook_url=f"{hook.url}/not-a-hook")
+        with pytest.raises(ProviderError, match="HTTP 404"):
+            provider.trigger("bbb2222", key="deploy-1")
+
+
+def test_vercel_cli_deploy_and_failed_build(tmp_path, monkeypatch, vercel_api, session, sleep):
+    fake_cli(tmp_path, monkeypatch, "echo 'Production: https://dpl_cli.vercel.app [3s]'")
+    provider = vercel(tmp_path, vercel_api, session)
+    final, _ = follow(provider, provider.trigger("abc1234"), sleep)
+    assert final.deployment_id == "dpl_cli" and final.ready
+
+    failed, transitions = follow(provider, provider.status("dpl_bad"), sleep)
+    assert failed.state == ERROR and transitions == [(BUILDING, ERROR)]
+    assert provider.logs("dpl_bad") == ["state: BUILDING", "state: ERROR"]
+
+
+def test_vercel_rollback_and_unknown_deployment(tmp_path, vercel_api, session):
+    provider = vercel(tmp_path, vercel_api, session)
+    assert provider.rollback("dpl_old").ready
+    assert vercel_api.rollbacks == [("prj_1", "dpl_old")]
+    with pytest.raises(ProviderError, match="404"):
+        provider.status("dpl_missing")
+
+
+def test_netlify_deploy_logs_and_restore(tmp_path, session, sleep):
+    with StubProviderAPI("netlify") as api:
+        provider = NetlifyProvider(tmp_path, site_id="site_1", token="t", base_url=api.api_url, session=session)
+        first = provider.trigger("abc1234")
+        final, transitions = follow(provider, first, sleep)
+        assert final.ready and final.url == f"https://{first.deployment_id}--stub.netlify.app"
+        assert transitions == [("QUEUED", BUILDING), (BUILDING, READY)]
+        assert provider.logs(final.deployment_id) == ["state: ready", "Deploy is ready"]
+
+        provider.trigger("def5678")
+        assert provider.rollback(first.deployment_id).deployment_id == first.deployment_id
+        assert api.published == first.deployment_id
+
+
+def test_netlify_failed_build_and_errors(tmp_path, session, sleep):
+    with StubProviderAPI("netlify", ["building", "error"]) as api:
+        provider = NetlifyProvider(tmp_path, site_id="site_1", token="t", base_url=api.api_url, session=session)
+        final, _ = follow(provider, provider.trigger(), sleep)
+        assert final.state == ERROR
+        assert provider.logs(final.deployment_id)[-1] == "error: Build script returned non-zero exit code: 2"
+        with pytest.raises(ProviderError, match="404"):
+            provider.status("nope")
+
+    with pytest.raises(ProviderError, match="NETLIFY_SITE_ID"):
+        NetlifyProvider(tmp_path, site_id="", base_url=api.api_url, session=session).trigger()
+
+
+def cloudflare(tmp_path, api, session):
+    return CloudflareProvider(tmp_path, account_id="acc_1", project="webstudio", token="t",
+                              base_url=api.api_url, session=session)
+
+
+def test_cloudflare_deploy_logs_and_rollback(tmp_path, session, sleep):
+    with StubProviderAPI("cloudflare") as api:
+        provider = cloudflare(tmp_path, api, session)
+        first = provider.trigger()
+        final, transitions = follow(provider, first, sleep)
+        assert final.ready and final.url == f"https://{first.deployment_id}.stub.pages.dev"
+        assert transitions == [("QUEUED", BUILDING), (BUILDING, READY)]
+        assert provider.logs(final.deployment_id) == ["queued: active", "build: active", "deploy: success"]
+
+        provider.trigger()
+        assert provider.rollback(first.deployment_id).ready
+        assert api.published == first.deployment_id
+
+
+def test_cloudflare_failed_build_and_errors(tmp_path, session, sleep):
+    with StubProviderAPI("cloudflare", [("build", "active"), ("build", "failure")]) as api:
+        provider = cloudflare(tmp_path, api, session)
+        final, _ = follow(provider, provider.trigger(), sleep)
+        assert final.state == ERROR
+        assert provider.logs(final.deployment_id)[-1] == "build: failure"
+        with pytest.raises(ProviderError, match="404"):
+            provider.status("nope")
+
+
+@pytest.fixture
+def compose_project(tmp_path):
+    (tmp_path / "docker-compose.deploy.yaml").write_text("services:\n  app:\n    build: .\n")
+    return tmp_path
+
+
+def test_docker_deploy_tags_images_and_rolls_back(compose_project, sleep):
+    runner = StubComposeRunner(services=("app", "worker"))
+    provider = DockerComposeProvider(compose_project, project="Webstudio", runner=runner)
+    first = provider.trigger("aaaa11112222333")
+    assert first.deployment_id == "aaaa11112222" and first.state == BUILDING
+    final, _ = follow(provider, first, sleep)
+    assert final.ready
+    assert runner.running == {"app": "webstudio-app:aaaa11112222", "worker": "webstudio-worker:aaaa11112222"}
+    assert provider.logs(final.deployment_id)[0] == "app  | listening on :3000 (webstudio-app:aaaa11112222)"
+
+    second, _ = follow(provider, provider.trigger("bbbb11112222333"), sleep)
+    assert second.ready
+    # Containers now run the second deploy's images
+    assert provider.status(first.deployment_id).state == ERROR
+
+    restored, _ = follow(provider, provider.rollback(first.deployment_id), sleep)
+    assert restored.ready and runner.running["app"] == "webstudio-app:aaaa11112222"
+    up = [args for args, _ in runner.calls if "up" in args]
+    assert "--no-build" in up[-1] and "--build" not in up[-1]
+
+
+def test_docker_failed_build_unhealthy_and_missing_images(compose_project, sleep):
+    provider = DockerComposeProvider(compose_project, runner=StubComposeRunner(fail_build=True))
+    with pytest.raises(ProviderError, match="docker compose up failed: failed to solve"):
+        provider.trigger("abc1234")
+
+    provider = DockerComposeProvider(compose_project, runner=StubComposeRunner(states=("starting", "unhealthy")))
+    final, _ = follow(provider, provider.trigger("abc1234"), sleep)
+    assert final.state == ERROR
+    with pytest.raises(ProviderError, match="can't be restored without a rebuild"):
+        provider.rollback("never-built")
+
+
+def test_docker_requires_a_compose_file(tmp_path):
+    with pytest.raises(ProviderError, match="not found"):
+        DockerComposeProvider(tmp_path, runner=StubComposeRunner()).trigger("abc1234")
@@ -0,0 +1,17 @@
+import pytest
+
+from deploy_tools import startup_bench
+
+
+def test_default_commands_run_from_any_directory(tmp_path, capsys):
+    assert startup_bench.main(["--runs", "1", "--cwd", str(tmp_path)]) == 0
+    out = capsys.readouterr().out
+    assert "smart-deploy.py --help" in out and "✗" not in out
+
+
+def test_failing_command_is_reported_not_timed(tmp_path, capsys):
+    with pytest.raises(RuntimeError, match="exited 2"):
+        startup_bench.time_command(["missing.py"], runs=1, cwd=tmp_path)
+
+    assert startup_bench.main(["--runs", "1", "--cwd", str(tmp_path), "missing.py"]) == 1
+    assert "✗ missing.py exited 2" in capsys.readouterr().out
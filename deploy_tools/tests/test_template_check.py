@@ -0,0 +1,67 @@
+import pytest
+
+from deploy_tools import template_check
+from deploy_tools.template_check import FAIL, NA, PASS, check_templates
+
+VITE_CONFIG = """
+import { defineConfig } from "vite";
+export default defineConfig({
+  resolve: { alias: [{ find: "isbot", replacement: "./app/shared/isbot-mock.ts" }] },
+});
+"""
+MOCK = "const isbot = () => false;\nexport { isbot };\nexport default isbot;\n"
+
+
+@pytest.fixture
+def templates(tmp_path):
+    files = {
+        "packages/cli/src/config.ts": 'export const PROJECT_TEMPLATES = [{ expand: ["base", "base-vercel"] }];\n',
+        "packages/cli/templates/base/vite.config.ts": VITE_CONFIG,
+        "packages/cli/templates/base/app/shared/isbot-mock.ts": MOCK,
+        "packages/cli/templates/base-vercel/vercel.json": "{}",
+        "packages/cli/templates/broken/vite.config.ts": "export default {};\n",
+        "packages/cli/templates/broken/app/root.tsx": "",
+        "packages/cli/templates/defaults/.gitkeep": "",
+    }
+    for path, text in files.items():
+        (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / path).write_text(text)
+    return tmp_path
+
+
+def statuses(matrix):
+    return {r.name: {check: cell.status for check, cell in r.cells.items()} for r in matrix.results}
+
+
+def test_matrix_follows_layers_and_reports_failures(templates):
+    matrix = check_templates(templates)
+
+    cells = statuses(matrix)
+    assert cells["base-vercel"]["vite-config"] == PASS and cells["base-vercel"]["mock-exports"] == PASS
+    assert cells["broken"]["isbot-alias"] == FAIL
+    assert cells["defaults"]["vite-config"] == NA
+    assert not matrix.passed
+    assert matrix.failures == ["broken: isbot-alias no resolve.alias for isbot",
+                               "broken: mock-file app/shared/isbot-mock.ts missing"]
+
+
+def test_unchanged_templates_are_not_parsed_again(templates, monkeypatch):
+    first = check_templates(templates)
+    parsed = []
+    monkeypatch.setattr(template_check, "parse_aliases", lambda source: parsed.append(source) or [])
+
+    again = check_templates(templates)
+    assert parsed == []
+    assert statuses(again) == statuses(first)
+
+    config = templates / "packages/cli/templates/broken/vite.config.ts"
+    config.write_text(VITE_CONFIG + "// edited\n")
+    check_templates(templates)
+    assert len(parsed) == 1
+
+
+def test_edited_mock_is_rechecked(templates):
+    assert statuses(check_templates(templates))["base"]["mock-exports"] == PASS
+    (templates / "packages/cli/templates/base/app/shared/isbot-mock.ts").write_text("export const other = 1;\n")
+
+    assert statuses(check_templates(templates))["base"]["mock-exports"] == FAIL
@@ -0,0 +1,129 @@
+import time
+from email.utils import formatdate
+
+import pytest
+
+from deploy_tools.stub_server import StubVercelAPI
+from deploy_tools.vercel_status import (
+    MAX_RATE_LIMITED,
+    Backoff,
+    VercelAPIError,
+    VercelStatusPoller,
+    is_triggered,
+    retry_after_seconds,
+)
+
+
+def poller(api, session, sleep, **kwargs):
+    backoff = Backoff(initial=1.0, maximum=8.0, multiplier=2.0, jitter=0.0)
+    return VercelStatusPoller(token="t", base_url=api.url, session=session,
+                              backoff=backoff, sleep=sleep, **kwargs)
+
+
+def test_follows_deployment_to_ready_with_etag_revalidation(session, sleep):
+    states = ["QUEUED", "BUILDING", "BUILDING", "BUILDING", "READY"]
+    with StubVercelAPI({"dpl_1": states}) as api:
+        seen = []
+        result = poller(api, session, sleep).wait("dpl_1", on_transition=seen.append)
+
+    assert result.ready and not result.timed_out
+    assert [t.state for t in result.transitions] == ["QUEUED", "BUILDING", "READY"]
+    assert [t.previous for t in seen] == [None, "QUEUED", "BUILDING"]
+    assert result.requests == 5
+    assert result.not_modified == 2
+    assert [code for _, code in api.log] == [200, 200, 304, 304, 200]
+    assert result.url == "dpl_1.vercel.app"
+
+
+def test_backoff_grows_while_idle_and_resets_on_progress(session, sleep):
+    states = ["BUILDING", "BUILDING", "BUILDING", "BUILDING", "ERROR"]
+    with StubVercelAPI({"dpl_1": states}) as api:
+        result = poller(api, session, sleep).wait("dpl_1")
+
+    assert result.state == "ERROR" and not result.ready
+    assert sleep == [1.0, 2.0, 4.0, 8.0]
+
+
+@pytest.mark.parametrize("final", ["READY", "ERROR", "CANCELED"])
+def test_stops_at_terminal_state(session, sleep, final):
+    with StubVercelAPI({"dpl_1": [final, "BUILDING"]}) as api:
+        result = poller(api, session, sleep).wait("dpl_1")
+
+    assert result.state == final
+    assert result.requests == 1 and sleep == []
+
+
+def test_deadline_times_out_pending_deployment(session, sleep):
+    with StubVercelAPI({"dpl_1": ["BUILDING"]}) as api:
+        result = poller(api, session, sleep).wait("dpl_1", deadline=0)
+
+    assert result.state == "BUILDING" and result.timed_out
+
+
+def test_waits_out_rate_limiting(session, sleep):
+    with StubVercelAPI({"dpl_1": ["READY"]}, throttle=2, retry_after="3") as api:
+        result = poller(api, session, sleep).wait("dpl_1")
+
+    assert result.ready
+    assert sleep == [3.0, 3.0]
+    assert [code for _, code in api.log] == [429, 429, 200]
+
+
+def test_gives_up_after_bounded_rate_limiting(session, sleep):
+    with StubVercelAPI({"dpl_1": ["READY"]}, throttle=MAX_RATE_LIMITED + 1) as api:
+        with pytest.raises(VercelAPIError, match="rate limited"):
+            poller(api, session, sleep).wait("dpl_1")
+
+    assert len(api.log) == MAX_RATE_LIMITED + 1
+
+
+def test_retry_after_accepts_seconds_and_http_dates():
+    assert retry_after_seconds("7", 1.0) == 7.0
+    assert retry_after_seconds(None, 1.0) == 1.0
+    assert retry_after_seconds("soon", 1.0) == 1.0
+    assert retry_after_seconds(formatdate(time.time() - 60, usegmt=True), 1.0) == 0.0
+    assert 25 <= retry_after_seconds(formatdate(time.time() + 30, usegmt=True), 1.0) <= 30
+
+
+def test_is_triggered_matches_commit_and_creation_time():
+    now = time.time()
+    payload = {"meta": {"githubCommitSha": "abc1234def"}, "createdAt": int(now * 1000)}
+    assert is_triggered(payload, "abc1234")
+    assert is_triggered(payload, "abc1234def", since=now)
+    assert not is_triggered(payload, "fff0000")
+    assert not is_triggered(payload, since=now + 3600)
+    assert not is_triggered({}, "abc1234")
+    assert is_triggered({})
+
+
+def test_follows_the_triggered_deployment_once_it_registers(session, sleep):
+    started = time.time()
+    api = StubVercelAPI(
+        {"dpl_old": ["READY"], "dpl_new": ["BUILDING", "READY"]},
+        project_deployments={"prj_1": ["dpl_new", "dpl_old"]},
+        commits={"dpl_old": "aaa111", "dpl_new": "bbb222"},
+        created={"dpl_old": int((started - 3600) * 1000), "dpl_new": int(started * 1000)},
+        listed_after={"dpl_new": 2},
+    )
+    with api:
+        result = poller(api, session, sleep).wait(project_id="prj_1", commit_sha="bbb222", since=started)
+
+    assert result.deployment_id == "dpl_new" and result.ready
+    assert api.list_requests == 3
+    assert [t.state for t in result.transitions] == ["BUILDING", "READY"]
+
+
+def test_previous_deployment_is_not_mistaken_for_the_new_one(session, sleep):
+    started = time.time()
+    api = StubVercelAPI(
+        {"dpl_old": ["READY"]},
+        project_deployments={"prj_1": ["dpl_old"]},
+        commits={"dpl_old": "aaa111"},
+        created={"dpl_old": int((started - 3600) * 1000)},
+    )
+    with api:
+        result = poller(api, session, sleep).wait(project_id="prj_1", commit_sha="bbb222",
+                                                  since=started, deadline=0)
+
+    assert result.deployment_id is None and result.timed_out
+    assert not any(path.startswith("/v13/") for path, _ in api.log)
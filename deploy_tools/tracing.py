@@ -0,0 +1,223 @@
+"""
+Lightweight deployment tracing
+Nested spans exported as OpenTelemetry (OTLP/JSON) compatible files
+"""
+
+import contextvars
+import functools
+import inspect
+import json
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from deploy_tools.preflight import CACHE_DIR
+
+SCOPE_NAME = "deploy_tools"
+
+STATUS_UNSET = 0
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+_current_span = contextvars.ContextVar("deploy_current_span", default=None)
+_tracer = None
+
+
+@dataclass
+class Span:
+    """One timed operation"""
+
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    start_ns: int
+    end_ns: Optional[int] = None
+    attributes: Dict = field(default_factory=dict)
+    status: int = STATUS_UNSET
+    status_message: str = ""
+
+    @property
+    def duration_ms(self):
+        end = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end - self.start_ns) / 1e6
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def set_error(self, message):
+        self.status = STATUS_ERROR
+        self.status_message = str(message)
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, (list, tuple)):
+        return {"arrayValue": {"values": [_otlp_value(v) for v in value]}}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes):
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items()]
+
+
+class Tracer:
+    """Collects spans for one deployment run"""
+
+    def __init__(self, service="webstudio-deploy", attributes=None):
+        self.service = service
+        self.attributes = dict(attributes or {})
+        self.trace_id = secrets.token_hex(16)
+        self.spans: List[Span] = []
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name, **attributes):
+        parent = _current_span.get()
+        span = Span(
+            name=name,
+            trace_id=self.trace_id,
+            span_id=secrets.token_hex(8),
+            parent_id=parent.span_id if parent else None,
+            start_ns=time.time_ns(),
+            attributes=attributes,
+        )
+        # perf_counter keeps durations monotonic even if the wall clock jumps
+        started = time.perf_counter_ns()
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.set_error(f"{type(e).__name__}: {e}")
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end_ns = span.start_ns + (time.perf_counter_ns() - started)
+            with self.lock:
+                self.spans.append(span)
+
+    def to_otlp(self):
+        """Spans in the OTLP/JSON ExportTraceServiceRequest shape"""
+        resource = {"service.name": self.service, **self.attributes}
+        with self.lock:
+            spans = sorted(self.spans, key=lambda s: s.start_ns)
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": _otlp_attributes(resource)},
+                "scopeSpans": [{
+                    "scope": {"name": SCOPE_NAME},
+                    "spans": [
+                        {
+                            "traceId": span.trace_id,
+                            "spanId": span.span_id,
+                            "parentSpanId": span.parent_id or "",
+                            "name": span.name,
+                            "kind": 1,
+                            "startTimeUnixNano": str(span.start_ns),
+                            "endTimeUnixNano": str(span.end_ns),
+                            "attributes": _otlp_attributes(span.attributes),
+                            "status": {"code": span.status, "message": span.status_message},
+                        }
+                        for span in spans
+                    ],
+                }],
+            }]
+        }
+
+    def export(self, path):
+        """Write the trace as an OTLP/JSON file"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.to_otlp(), indent=2))
+        return path
+
+    def summary(self):
+        """Indented per-span timing table, children under their parents"""
+        with self.lock:
+            spans = sorted(self.spans, key=lambda s: s.start_ns)
+        children = {}
+        for span in spans:
+            children.setdefault(span.parent_id, []).append(span)
+        roots = children.get(None, [])
+        total_ms = sum(span.duration_ms for span in roots) or 1.0
+
+        lines = [f"{'SPAN':<48} {'MS':>10} {'%':>6}"]
+
+        def walk(span, depth):
+            label = ("  " * depth + span.name)[:47]
+            marker = " !" if span.status == STATUS_ERROR else ""
+            lines.append(
+                f"{label:<48} {span.duration_ms:10.1f} {span.duration_ms / total_ms * 100:6.1f}{marker}"
+            )
+            for child in children.get(span.span_id, []):
+                walk(child, depth + 1)
+
+        for root in roots:
+            walk(root, 0)
+        return lines
+
+
+def start_trace(service="webstudio-deploy", **attributes):
+    """Install a process-wide tracer; spans are no-ops until one exists"""
+    global _tracer
+    _tracer = Tracer(service, attributes)
+    return _tracer
+
+
+def current_tracer():
+    return _tracer
+
+
+def stop_trace():
+    global _tracer
+    tracer, _tracer = _tracer, None
+    return tracer
+
+
+@contextmanager
+def span(name, **attributes):
+    """Span on the active tracer, or a cheap no-op when tracing is off"""
+    tracer = _tracer
+    if tracer is None:
+        yield None
+        return
+    with tracer.span(name, **attributes) as active:
+        yield active
+
+
+def traced(name=None, **attributes):
+    """Decorator wrapping a function or coroutine function in a span"""
+
+    def decorate(func):
+        span_name = name or func.__name__
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(span_name, **attributes):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name, **attributes):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+def default_trace_path(project_path, tracer):
+    """Where a run's trace goes when no explicit path is given"""
+    return Path(project_path) / CACHE_DIR / "traces" / f"{tracer.trace_id}.json"
@@ -0,0 +1,277 @@
+"""
+Vercel deployment status poller
+Pooled keep-alive HTTP, ETag revalidation and adaptive backoff
+"""
+
+import email.utils
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from deploy_tools.tracing import span
+
+API_URL = os.environ.get("VERCEL_API_URL", "https://api.vercel.com")
+PENDING_STATES = {"QUEUED", "INITIALIZING", "BUILDING"}
+FINAL_STATES = {"READY", "ERROR", "CANCELED"}
+# Consecutive 429 responses tolerated before a request gives up
+MAX_RATE_LIMITED = 5
+# Local and Vercel clocks disagree a little; createdAt is compared with this much slack
+CLOCK_SKEW_S = 30
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def shared_session(pool_size=10):
+    """One keep-alive session reused by every poller in the process"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+
+class VercelAPIError(Exception):
+    """Raised for unexpected Vercel API responses"""
+
+
+def retry_after_seconds(value, default):
+    """Seconds a Retry-After header asks to wait: delta-seconds or an HTTP-date"""
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return default
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+def is_triggered(payload, commit_sha=None, since=None):
+    """
+    Whether a listed deployment can be the one just triggered: built from
+    commit_sha (when the deployment records its commit) and created no
+    earlier than since (epoch seconds). With neither, any deployment is.
+    """
+    sha = (payload.get("meta") or {}).get("githubCommitSha")
+    if commit_sha and sha and not (sha.startswith(commit_sha) or commit_sha.startswith(sha)):
+        return False
+    if since is not None:
+        created = payload.get("createdAt") or payload.get("created")
+        return bool(created) and created / 1000 >= since - CLOCK_SKEW_S
+    return bool(sha) or not commit_sha
+
+
+@dataclass
+class Transition:
+    """A deployment state change observed by the poller"""
+
+    deployment_id: str
+    state: str
+    previous: Optional[str]
+    elapsed_s: float
+    payload: dict = field(default_factory=dict)
+
+
+@dataclass
+class StatusResult:
+    """Final outcome of a polling run"""
+
+    deployment_id: Optional[str]
+    state: Optional[str]
+    url: Optional[str]
+    transitions: List[Transition]
+    requests: int
+    not_modified: int
+    elapsed_s: float
+
+    @property
+    def ready(self):
+        return self.state == "READY"
+
+    @property
+    def timed_out(self):
+        return self.state not in FINAL_STATES
+
+
+class Backoff:
+    """Exponential backoff with jitter that resets on progress"""
+
+    def __init__(self, initial=2.0, maximum=30.0, multiplier=1.6, jitter=0.2, rng=random.random):
+        self.initial = initial
+        self.maximum = maximum
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.rng = rng
+        self.current = initial
+
+    def reset(self):
+        self.current = self.initial
+
+    def next(self):
+        delay = self.current
+        self.current = min(self.current * self.multiplier, self.maximum)
+        spread = delay * self.jitter
+        return max(0.0, delay - spread + 2 * spread * self.rng())
+
+
+class VercelStatusPoller:
+    """
+    Poll deployment state from the Vercel REST API.
+    Cached ETags make unchanged polls cheap 304 responses.
+    """
+
+    def __init__(self, token=None, team_id=None, base_url=API_URL, session=None,
+                 backoff=None, timeout=10, sleep=time.sleep):
+        self.token = token or os.environ.get("VERCEL_TOKEN")
+        self.team_id = team_id or os.environ.get("VERCEL_TEAM_ID")
+        self.base_url = base_url.rstrip("/")
+        self.session = session or shared_session()
+        self.backoff = backoff or Backoff()
+        self.timeout = timeout
+        self.sleep = sleep
+        self.etags = {}
+        self.bodies = {}
+        self.requests = 0
+        self.not_modified = 0
+
+    def _get(self, path, params=None):
+        params = dict(params or {})
+        if self.team_id:
+            params["teamId"] = self.team_id
+        headers = {}
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        cache_key = (path, tuple(sorted(params.items())))
+        if cache_key in self.etags:
+            headers["If-None-Match"] = self.etags[cache_key]
+
+        for attempt in range(MAX_RATE_LIMITED + 1):
+            self.requests += 1
+            response = self.session.get(
+                f"{self.base_url}{path}", params=params, headers=headers, timeout=self.timeout
+            )
+            if response.status_code != 429:
+                break
+            if attempt == MAX_RATE_LIMITED:
+                raise VercelAPIError(f"GET {path} still rate limited after {MAX_RATE_LIMITED} retries")
+            self.sleep(retry_after_seconds(response.headers.get("Retry-After"), self.backoff.maximum))
+        if response.status_code == 304 and cache_key in self.bodies:
+            self.not_modified += 1
+            return self.bodies[cache_key], False
+        if response.status_code != 200:
+            raise VercelAPIError(f"GET {path} returned {response.status_code}: {response.text[:200]}")
+
+        body = response.json()
+        etag = response.headers.get("ETag")
+        if etag:
+            self.etags[cache_key] = etag
+            self.bodies[cache_key] = body
+        return body, True
+
+    def latest_deployment(self, project_id, target="production"):
+        """Most recent deployment of a project, or None"""
+        params = {"projectId": project_id, "limit": 1}
+        if target:
+            params["target"] = target
+        body, _ = self._get("/v6/deployments", params)
+        deployments = body.get("deployments") or []
+        return deployments[0] if deployments else None
+
+    def find_deployment(self, project_id, commit_sha=None, since=None, target="production", limit=20):
+        """Newest deployment of a project that is_triggered accepts, or None"""
+        params = {"projectId": project_id, "limit": limit}
+        if target:
+            params["target"] = target
+        body, _ = self._get("/v6/deployments", params)
+        for payload in body.get("deployments") or []:
+            if is_triggered(payload, commit_sha, since):
+                return payload
+        return None
+
+    def deployment(self, deployment_id):
+        """Current deployment payload and whether it changed since the last poll"""
+        return self._get(f"/v13/deployments/{deployment_id}")
+
+    def wait(self, deployment_id=None, project_id=None, on_transition=None, deadline=900,
+             commit_sha=None, since=None):
+        """
+        Follow a deployment until it reaches a final state or the deadline.
+        Without a deployment_id, the project's newest deployment built from
+        commit_sha and created after since is followed; polling continues
+        until it is listed, since a new build can take a while to register.
+        """
+        with span("status_wait", project_id=project_id or "") as active:
+            result = self._wait(deployment_id, project_id, on_transition, deadline, commit_sha, since)
+            if active:
+                active.set_attribute("state", result.state or "")
+                active.set_attribute("requests", result.requests)
+            return result
+
+    def _wait(self, deployment_id, project_id, on_transition, deadline, commit_sha=None, since=None):
+        started = time.monotonic()
+        transitions = []
+        state = None
+        url = None
+        self.backoff.reset()
+        while deployment_id is None:
+            found = self.find_deployment(project_id, commit_sha, since)
+            if found:
+                deployment_id = found.get("uid") or found.get("id")
+                break
+            elapsed = time.monotonic() - started
+            if elapsed >= deadline:
+                # Never registered: timed out, with nothing to report on
+                return StatusResult(None, None, None, transitions, self.requests, self.not_modified, elapsed)
+            self.sleep(min(self.backoff.next(), max(0.0, deadline - elapsed)))
+
+        self.backoff.reset()
+        while True:
+            payload, changed = self.deployment(deployment_id)
+            new_state = payload.get("readyState") or payload.get("state")
+            url = payload.get("url") or url
+            elapsed = time.monotonic() - started
+            if changed and new_state != state:
+                transition = Transition(deployment_id, new_state, state, elapsed, payload)
+                transitions.append(transition)
+                if on_transition:
+                    on_transition(transition)
+                state = new_state
+                # Progress means something is happening: look again soon
+                self.backoff.reset()
+            if state in FINAL_STATES or elapsed >= deadline:
+                break
+            self.sleep(min(self.backoff.next(), max(0.0, deadline - elapsed)))
+
+        return StatusResult(
+            deployment_id,
+            state,
+            url,
+            transitions,
+            self.requests,
+            self.not_modified,
+            time.monotonic() - started,
+        )
+
+
+def poll_deployment(project_id, deployment_id=None, on_transition=None, deadline=900,
+                    commit_sha=None, since=None, **kwargs):
+    """Convenience wrapper used by the deployment scripts"""
+    poller = VercelStatusPoller(**kwargs)
+    return poller.wait(deployment_id, project_id, on_transition, deadline, commit_sha, since)
@@ -4,125 +4,170 @@ Smart Deployment Automation for Webstudio
 Intelligent deployment without OpenAI dependency
 """
 
+import argparse
+import asyncio
 import os
+import queue
 import subprocess
+import threading
 import time
 import sys
-from datetime import datetime
-from pathlib import Path
+
+from deploy_tools.build_cache import PREBUILT_OUTPUT, PREBUILT_UNIT, BuildCache, output_units, restore_units, save_units
+from deploy_tools.deploy_queue import CLAIMED, DeployQueue
+from deploy_tools.executor import SEQUENTIAL, DeploymentExecutor, format_outcomes
+from deploy_tools.fingerprint import FingerprintStore, compute_fingerprint
+from deploy_tools.fleet import FleetScheduler, format_results, load_manifest
+from deploy_tools.git_tree import GitTreeError, preflight_commit
+from deploy_tools.git_watch import RefWatcher, git_dir, head_ref, read_refs
+from deploy_tools.history import open_history
+from deploy_tools.log import configure, event_logger, get_logger, log_event
+from deploy_tools.preflight import run_preflight
+from deploy_tools.method_order import adaptive_order
+from deploy_tools.process import CommandTimeout, run_command, stream_command
+from deploy_tools.providers import PROVIDERS, ProviderError, choose_provider, create_provider, provider_method_name, trigger_async, wait_for_async
+from deploy_tools.rollback import Rollback, deployment_details, format_rollback
+from deploy_tools.template_check import check_templates, format_matrix
+from deploy_tools.tracing import default_trace_path, start_trace, stop_trace, traced
+
+DEFAULT_PROJECT_PATH = os.environ.get("DEPLOY_PROJECT_PATH", "/home/arthur/webstudio")
+
+log = event_logger("smart-deploy")
+
 
 class SmartDeploymentAgent:
     """
     Intelligent deployment agent for Vercel automation
     """
     
-    def __init__(self, project_path="/home/arthur/webstudio"):
+    def __init__(self, project_path=DEFAULT_PROJECT_PATH, policy=None, hedge_delay=None,
+                 vercel_project_id=None, project_name=None, prebuilt=None, deploy_hook_url=None,
+                 provider=None, provider_options=None, auto_rollback=None):
         self.project_path = project_path
+        self.vercel_project_id = vercel_project_id or os.environ.get("VERCEL_PROJECT_ID")
+        # Key for fingerprints and history, shared with deploy-agent.py's project_name
+        self.project_name = project_name or os.path.basename(os.path.normpath(project_path))
+        self.logger = get_logger("smart-deploy")
+        self.deploy_hook_url = deploy_hook_url or os.environ.get("DEPLOY_HOOK_URL")
+        # A deploy hook starts the build with one POST; without one, fall back
+        # to pushing an empty commit to fire the git integration
         self.deployment_methods = [
-            self.trigger_webhook_deployment,
-            self.trigger_vercel_cli_deployment,
-            self.trigger_manual_deployment
+            self.trigger_deploy_hook if self.deploy_hook_url else self.trigger_webhook_deployment,
+            self.trigger_vercel_cli_deployment
         ]
+        # A provider backend replaces the Vercel methods with one that
+        # triggers through the provider's API and waits for the result
+        provider = provider or os.environ.get("DEPLOY_PROVIDER")
+        provider_options = dict(provider_options or {})
+        if provider == "vercel":
+            provider_options.setdefault("on_line", lambda line, stream: self.log(line, "BUILD", stream=stream))
+        self.provider = create_provider(provider, project_path, **provider_options) if provider else None
+        if self.provider:
+            async def deploy():
+                return await self.trigger_provider_deployment()
+            # Recorded under the provider's name, which choose_provider ranks by
+            deploy.__name__ = provider_method_name(self.provider.name)
+            self.deployment_methods = [deploy]
+        # Manual instructions always "succeed", so they only run once every
+        # automated method has failed, whatever the execution policy
+        self.fallback_methods = [self.trigger_manual_deployment]
+        self.policy = policy or os.environ.get("DEPLOY_POLICY", SEQUENTIAL)
+        self.hedge_delay = float(hedge_delay or os.environ.get("DEPLOY_HEDGE_DELAY", 30))
+        # Set while this agent holds the project's deploy slot
+        self.deploy_queue = None
+        # Empty commits pushed by the webhook method; watchers must not redeploy them
+        self.synthetic_commits = set()
+        # Deployment monitor_deployment_status followed: URL for the probe, id for rollbacks
+        self.deployment_url = None
+        self.deployment_id = None
+        # Put the last healthy deploy back when the post-deploy probe fails
+        self.auto_rollback = (auto_rollback if auto_rollback is not None
+                              else os.environ.get("DEPLOY_AUTO_ROLLBACK") == "1")
+        # Build locally with `vercel build` and upload the cached output
+        self.prebuilt = prebuilt if prebuilt is not None else os.environ.get("DEPLOY_PREBUILT") == "1"
+        self.build_cache = BuildCache.for_project(project_path)
+        # Fingerprint of the commit being deployed; keys the prebuilt output
+        self.fingerprint = None
+        # Deploy-slot claim of the current deploy; keys deploy-hook idempotency
+        self.deploy_ticket = None
+        # Final state of the last deploy through the provider backend
+        self.provider_deployment = None
+        # Commit the triggered build runs on (the empty commit for the webhook
+        # method) and when it was triggered; status polling matches on both
+        self.deployed_commit = None
+        self.triggered_at = None
+        
+    def log(self, message, level="INFO", **fields):
+        """Structured event logging (JSON lines and/or emoji output)"""
+        log_event(self.logger, message, level, **fields)
         
-    def log(self, message, level="INFO"):
-        """Enhanced logging with timestamps"""
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        prefix_map = {
-            "INFO": "ℹ️",
-            "SUCCESS": "✅", 
-            "WARNING": "⚠️",
-            "ERROR": "❌",
-            "DEPLOY": "🚀",
-            "CHECK": "🔍"
-        }
-        prefix = prefix_map.get(level, "📝")
-        print(f"[{timestamp}] {prefix} {message}")
-        
-    def verify_isbot_fixes(self):
-        """Intelligent verification of isbot fixes"""
+    @traced("preflight")
+    def verify_isbot_fixes(self, commit=None):
+        """Intelligent verification of isbot fixes
+        
+        With a commit, files are read from that commit's tree instead of
+        the working tree, so any SHA can be verified without a checkout.
+        """
         self.log("Verifying isbot fixes are properly implemented...", "CHECK")
         
-        required_fixes = [
-            # Mock files for templates
-            "packages/cli/templates/defaults/app/shared/isbot-mock.ts",
-            "packages/cli/templates/react-router/app/shared/isbot-mock.ts", 
-            "packages/cli/templates/react-router-cloudflare/app/shared/isbot-mock.ts",
-            "packages/cli/templates/cloudflare/app/shared/isbot-mock.ts",
-            "packages/cli/templates/react-router-netlify/app/shared/isbot-mock.ts",
-            "packages/cli/templates/ssg/app/shared/isbot-mock.ts",
-            "packages/cli/templates/saas-helpers/isbot-mock.ts",
-            # Enhanced vercel.json
-            "vercel.json"
-        ]
+        if commit:
+            try:
+                report = preflight_commit(self.project_path, commit)
+                matrix = check_templates(self.project_path, commit)
+            except GitTreeError as e:
+                self.log(f"Cannot read commit tree: {e}", "ERROR")
+                return False
+        else:
+            report = run_preflight(self.project_path)
+            matrix = check_templates(self.project_path)
         
-        missing_fixes = []
-        present_fixes = []
+        for result in report.results:
+            level = "INFO" if result.passed or not result.check.required else "WARNING"
+            mark = "✓" if result.passed else "✗"
+            self.log(f"{mark} {result.check.name}: {result.detail}", level)
         
-        for fix_path in required_fixes:
-            full_path = Path(self.project_path) / fix_path
-            if full_path.exists():
-                present_fixes.append(fix_path)
-                self.log(f"✓ Found: {fix_path}")
-            else:
-                missing_fixes.append(fix_path)
-                self.log(f"✗ Missing: {fix_path}", "WARNING")
+        # One template × check matrix instead of a line per mock and config
+        self.log(
+            "Template consistency:\n" + "\n".join(format_matrix(matrix)),
+            "INFO" if matrix.passed else "WARNING",
+            templates=matrix.to_dict()
+        )
         
-        self.log(f"Fix status: {len(present_fixes)}/{len(required_fixes)} implemented")
+        missing = len(report.missing) + len(matrix.failures)
+        if missing:
+            self.log(f"Missing {missing} critical fixes!", "ERROR")
+        elif report.group_passed("vercel-config"):
+            self.log("✓ Vercel configuration enhanced", "SUCCESS")
+        else:
+            self.log("✗ Vercel configuration needs enhancement", "WARNING")
         
-        if missing_fixes:
-            self.log(f"Missing {len(missing_fixes)} critical fixes!", "ERROR")
-            return False
+        if not commit:
+            from deploy_tools.build_profile import heap_advice
             
-        # Verify vite.config.ts files have isbot aliases
-        vite_configs = [
-            "packages/cli/templates/defaults/vite.config.ts",
-            "packages/cli/templates/react-router/vite.config.ts",
-            "packages/cli/templates/react-router-cloudflare/vite.config.ts"
-        ]
-        
-        alias_verified = 0
-        for config_path in vite_configs:
-            full_path = Path(self.project_path) / config_path
-            if full_path.exists():
-                try:
-                    content = full_path.read_text()
-                    if "isbot-mock.ts" in content and "alias:" in content:
-                        alias_verified += 1
-                        self.log(f"✓ Vite alias verified: {config_path}")
-                    else:
-                        self.log(f"✗ Vite alias missing: {config_path}", "WARNING")
-                except Exception as e:
-                    self.log(f"✗ Error reading {config_path}: {e}", "ERROR")
-        
-        # Verify vercel.json enhancements
-        vercel_json = Path(self.project_path) / "vercel.json"
-        if vercel_json.exists():
             try:
-                content = vercel_json.read_text()
-                enhancements = [
-                    "NODE_OPTIONS", 
-                    "max-old-space-size",
-                    "SKIP_GLOBAL_ASSIGN_CHECK"
-                ]
-                
-                found_enhancements = sum(1 for enhancement in enhancements if enhancement in content)
-                self.log(f"Vercel.json enhancements: {found_enhancements}/{len(enhancements)}")
-                
-                if found_enhancements >= 2:
-                    self.log("✓ Vercel configuration enhanced", "SUCCESS")
-                else:
-                    self.log("✗ Vercel configuration needs enhancement", "WARNING")
-                    
-            except Exception as e:
-                self.log(f"Error reading vercel.json: {e}", "ERROR")
+                advice = heap_advice(self.project_path)
+            except FileNotFoundError:
+                advice = None
+            if advice:
+                ok, message = advice
+                self.log(f"{'✓' if ok else '✗'} Build memory: {message}", "INFO" if ok else "WARNING")
         
-        return len(missing_fixes) == 0 and alias_verified >= 2
+        slowest = ", ".join(f"{name} {ms:.1f}ms" for name, ms, _ in report.timings()[:3])
+        cached = sum(1 for result in report.results if result.cached)
+        self.log(
+            f"Preflight finished in {report.elapsed_ms:.1f} ms "
+            f"({cached}/{len(report.results)} cached; slowest: {slowest})",
+            preflight=report.to_dict()
+        )
+        
+        return report.passed and matrix.passed
     
-    def get_latest_commit(self):
-        """Get latest commit information"""
+    @traced()
+    def get_latest_commit(self, commit=None):
+        """Get latest commit information (of commit when given)"""
         try:
             result = subprocess.run(
-                ["git", "log", "--oneline", "-n", "1"],
+                ["git", "log", "--oneline", "-n", "1", *([commit] if commit else [])],
                 cwd=self.project_path,
                 capture_output=True,
                 text=True,
@@ -135,83 +180,191 @@ class SmartDeploymentAgent:
             self.log(f"Failed to get commit info: {e}", "ERROR")
             return None
     
-    def trigger_webhook_deployment(self):
+    async def trigger_webhook_deployment(self):
         """Method 1: Trigger via webhook with empty commit"""
         self.log("Attempting webhook deployment via empty commit...", "DEPLOY")
         
+        # A newer commit is about to deploy anyway: don't queue another build for this one
+        if self.deploy_queue and self.deploy_queue.pending():
+            self.log("Newer commit pending; not pushing an empty commit", "WARNING")
+            return False
+        
+        # Create timestamped commit message
+        timestamp = int(time.time())
+        commit_msg = f"deploy: smart auto-deploy {timestamp} with isbot fixes"
+        
+        # Create empty commit
+        result = await run_command(
+            ["git", "commit", "--allow-empty", "-m", commit_msg],
+            cwd=self.project_path
+        )
+        if result.returncode != 0:
+            self.log(f"Webhook deployment failed: {result.stderr.strip()}", "ERROR")
+            return False
+        head = await run_command(["git", "rev-parse", "HEAD"], cwd=self.project_path)
+        self.synthetic_commits.add(head.stdout.strip())
+        self.log("✓ Empty commit created")
+        
+        # Push to trigger webhook
+        result = await run_command(["git", "push", "origin", "main"], cwd=self.project_path)
+        
+        if result.returncode == 0:
+            # The git integration builds the empty commit, not the one claimed
+            self.deployed_commit = head.stdout.strip() or self.deployed_commit
+            self.log("✓ Webhook deployment triggered successfully!", "SUCCESS")
+            return True
+        else:
+            self.log(f"Push failed: {result.stderr}", "ERROR")
+            return False
+    
+    def deploy_key(self):
+        """Idempotency key of the current deploy"""
+        from deploy_tools.deploy_hook import idempotency_key
+        
+        # Every trigger of this deploy shares the key, so retries can't start a second build
+        ticket = self.deploy_ticket
+        if ticket:
+            return idempotency_key(self.project_name, ticket.commit, ticket.claimed_at)
+        # Without a deploy slot, hedged or raced calls of one deploy still agree: key on HEAD
+        head = subprocess.run(["git", "rev-parse", "HEAD"], cwd=self.project_path, capture_output=True, text=True)
+        return idempotency_key(self.project_name, head.stdout.strip())
+    
+    def trigger_deploy_hook(self):
+        """Method 1: POST to the project's deploy hook"""
+        self.log("Triggering deploy hook...", "DEPLOY")
+        
+        from deploy_tools.deploy_hook import DeployHookError, trigger_deploy
+        
         try:
-            # Create timestamped commit message
-            timestamp = int(time.time())
-            commit_msg = f"deploy: smart auto-deploy {timestamp} with isbot fixes"
-            
-            # Create empty commit
-            result = subprocess.run(
-                ["git", "commit", "--allow-empty", "-m", commit_msg],
-                cwd=self.project_path,
-                capture_output=True,
-                text=True,
-                check=True
-            )
-            self.log("✓ Empty commit created")
-            
-            # Push to trigger webhook
-            result = subprocess.run(
-                ["git", "push", "origin", "main"],
-                cwd=self.project_path,
-                capture_output=True,
-                text=True,
-                check=True
-            )
-            
-            if result.returncode == 0:
-                self.log("✓ Webhook deployment triggered successfully!", "SUCCESS")
-                return True
-            else:
-                self.log(f"Push failed: {result.stderr}", "ERROR")
-                return False
-                
-        except subprocess.CalledProcessError as e:
-            self.log(f"Webhook deployment failed: {e}", "ERROR")
+            result = trigger_deploy(self.project_path, self.deploy_key(), self.deploy_hook_url)
+        except DeployHookError as e:
+            self.log(f"Deploy hook failed: {e}", "ERROR")
             return False
+        
+        if result.replayed:
+            self.log(f"✓ Deploy hook already triggered for this deploy (job {result.job_id})", "SUCCESS",
+                     job_id=result.job_id)
+        else:
+            self.log(f"✓ Deploy hook triggered: job {result.job_id} in {result.elapsed_ms:.0f} ms "
+                     f"({result.attempts} attempt(s))", "SUCCESS", job_id=result.job_id)
+        return True
     
-    def trigger_vercel_cli_deployment(self):
+    async def trigger_provider_deployment(self):
+        """Deploy through the provider backend and wait for a final state"""
+        provider = self.provider
+        self.log(f"Deploying via {provider.name}...", "DEPLOY", provider=provider.name)
+        
+        ticket = self.deploy_ticket
+        try:
+            deployment = await trigger_async(provider, ticket.commit if ticket else None, self.deploy_key())
+            self.log(f"{provider.name} deployment {deployment.deployment_id}: {deployment.state}", "DEPLOY",
+                     deployment_id=deployment.deployment_id)
+            deployment = await wait_for_async(provider, deployment, on_transition=lambda previous, d: self.log(
+                f"Deployment {d.deployment_id}: {previous} → {d.state}", "CHECK"
+            ))
+        except ProviderError as e:
+            self.log(f"{provider.name} deployment failed: {e}", "ERROR")
+            return False
+        
+        self.provider_deployment = deployment
+        self.deployment_id = deployment.deployment_id
+        if deployment.url:
+            self.deployment_url = deployment.url.split("://", 1)[-1].rstrip("/")
+        if deployment.ready:
+            self.log(f"✓ {provider.name} deployment {deployment.deployment_id} is ready", "SUCCESS")
+            return True
+        try:
+            tail = "\n".join(await asyncio.to_thread(provider.logs, deployment.deployment_id, limit=20))
+        except ProviderError as e:
+            tail = f"(logs unavailable: {e})"
+        self.log(f"{provider.name} deployment {deployment.deployment_id} ended {deployment.state}:\n{tail}",
+                 "ERROR", state=deployment.state)
+        return False
+    
+    async def trigger_vercel_cli_deployment(self):
         """Method 2: Direct Vercel CLI deployment"""
         self.log("Attempting direct Vercel CLI deployment...", "DEPLOY")
         
         try:
             # Check if Vercel CLI is available
-            subprocess.run(["npx", "vercel", "--version"], 
-                         capture_output=True, check=True)
+            version = await run_command(["npx", "vercel", "--version"])
+            if version.returncode != 0:
+                self.log("Vercel CLI not available", "WARNING")
+                return False
             
-            # Deploy with Vercel CLI
-            result = subprocess.run(
-                ["npx", "vercel", "--prod", "--yes"],
+            # A cached prebuilt output skips the build on every retry and method
+            args = ["npx", "vercel", "--prod", "--yes"]
+            key = self.fingerprint.digest if self.fingerprint else None
+            if key and self.build_cache.restore(key, self.project_path):
+                self.log(f"Uploading cached prebuilt output ({key[:12]})", "BUILD", cache="hit")
+                args = ["npx", "vercel", "deploy", "--prebuilt", "--prod", "--yes"]
+            elif key and self.prebuilt:
+                if not await self.prebuild_output(key):
+                    return False
+                args = ["npx", "vercel", "deploy", "--prebuilt", "--prod", "--yes"]
+            
+            # Deploy with Vercel CLI, streaming the build log as it arrives
+            result = await stream_command(
+                args,
                 cwd=self.project_path,
-                capture_output=True,
-                text=True,
-                timeout=300  # 5 minute timeout
+                timeout=300,  # 5 minute timeout
+                on_line=lambda line, stream: self.log(line, "BUILD", stream=stream)
             )
             
-            if result.returncode == 0:
+            if result.ok:
                 self.log("✓ Vercel CLI deployment successful!", "SUCCESS")
-                self.log(f"Deployment output: {result.stdout[:200]}...")
+                self.log(f"Deployment output: {' | '.join(result.tail[-3:])}")
                 return True
+            elif result.aborted:
+                self.log(f"Vercel CLI aborted early: fatal '{result.aborted}' pattern after "
+                         f"{result.elapsed_s:.0f}s", "ERROR", errors=result.errors)
+                return False
             else:
-                self.log(f"Vercel CLI failed: {result.stderr}", "ERROR")
+                self.log(f"Vercel CLI failed: {' | '.join(result.errors[-5:] or result.tail[-5:])}",
+                         "ERROR", errors=result.errors)
                 return False
                 
-        except subprocess.CalledProcessError:
+        except FileNotFoundError:
             self.log("Vercel CLI not available", "WARNING")
             return False
-        except subprocess.TimeoutExpired:
+        except CommandTimeout:
             self.log("Vercel CLI deployment timed out", "ERROR")
             return False
     
+    async def prebuild_output(self, key):
+        """Run `vercel build` locally, restoring and saving cached package outputs around it"""
+        try:
+            units = [unit for unit in output_units(self.project_path) if unit.name != PREBUILT_UNIT]
+        except GitTreeError as e:
+            self.log(f"Cannot key build outputs: {e}", "WARNING")
+            units = []
+        hits, misses = restore_units(self.build_cache, self.project_path, units)
+        self.log(f"Building locally: {len(hits)} package outputs restored, {len(misses)} to build",
+                 "BUILD", cache="miss", restored=[unit.name for unit in hits])
+        
+        result = await stream_command(
+            ["npx", "vercel", "build", "--prod", "--yes"],
+            cwd=self.project_path,
+            timeout=900,
+            on_line=lambda line, stream: self.log(line, "BUILD", stream=stream)
+        )
+        if not result.ok:
+            reason = f"fatal '{result.aborted}' pattern" if result.aborted else f"exit {result.returncode}"
+            self.log(f"Local vercel build failed ({reason}): {' | '.join(result.errors[-5:] or result.tail[-5:])}",
+                     "ERROR", errors=result.errors)
+            return False
+        
+        saved = save_units(self.build_cache, self.project_path, misses)
+        self.build_cache.save(key, self.project_path, [PREBUILT_OUTPUT], unit=PREBUILT_UNIT)
+        self.log(f"Cached prebuilt output and {len(saved)} package outputs", "BUILD",
+                 cache=self.build_cache.stats())
+        return True
+    
     def trigger_manual_deployment(self):
         """Method 3: Manual instructions for deployment"""
         self.log("Providing manual deployment instructions...", "DEPLOY")
         
-        print("""
+        self.log("""
 🎯 MANUAL DEPLOYMENT INSTRUCTIONS:
 
 1. Go to your Vercel Dashboard:
@@ -223,6 +376,9 @@ class SmartDeploymentAgent:
 
 4. The deployment should succeed with isbot fixes!
 
+   If production is broken, put the last healthy deploy back without
+   rebuilding: python3 smart-deploy.py --rollback
+
 📊 FIXES IMPLEMENTED:
    ✅ Isbot mock files in all CLI templates
    ✅ Vite config aliases for isbot redirection
@@ -232,55 +388,257 @@ class SmartDeploymentAgent:
 🔧 EXPECTED RESULT:
    The deployment will no longer fail with:
    "Cannot set properties of undefined (setting 'isbot')"
-        """)
+        """, "RAW")
         
         return True
     
-    def intelligent_deployment(self):
-        """Execute intelligent deployment with multiple fallback methods"""
-        self.log("🤖 Starting Smart Deployment Agent...", "INFO")
-        self.log("="*60, "INFO")
+    @traced("fingerprint")
+    def check_fingerprint(self, commit=None):
+        """
+        Fingerprint build inputs of the working tree, or of commit's tree
+        when given; returns (fingerprint, unchanged_since_last_deploy)
+        """
+        try:
+            fingerprint = compute_fingerprint(self.project_path, commit or "HEAD", include_worktree=commit is None)
+        except (GitTreeError, OSError) as e:
+            self.log(f"Cannot fingerprint build inputs: {e}", "WARNING")
+            return None, False
         
-        # Step 1: Verify fixes
-        if not self.verify_isbot_fixes():
-            self.log("❌ Critical isbot fixes missing! Deployment aborted.", "ERROR")
-            return False
+        store = FingerprintStore(self.project_path)
+        previous = store.last(self.project_name)
+        if store.matches(self.project_name, fingerprint):
+            self.log(
+                f"Build inputs unchanged since {previous.get('commit', '?')[:9]} "
+                f"({fingerprint.digest[:12]})", "CHECK"
+            )
+            return fingerprint, True
         
-        self.log("✅ All isbot fixes verified and ready!", "SUCCESS")
+        changed = fingerprint.changed_inputs(previous) if previous else []
+        self.log(f"Build inputs changed: {', '.join(changed[:5]) or 'first deploy'}", "CHECK")
+        return fingerprint, False
+    
+    def record_history(self, status, commit_sha, started_at, execution=None, fingerprint=None,
+                       details=None):
+        """Append this deploy to the persistent history store"""
+        history = open_history(self.project_path)
+        if history is None:
+            return
+        with history:
+            history.record(
+                self.project_name,
+                status,
+                commit_sha=commit_sha,
+                script="smart-deploy",
+                execution=execution,
+                fingerprint=fingerprint.digest if fingerprint else None,
+                started_at=started_at,
+                duration_ms=(time.time() - started_at) * 1000,
+                details=details
+            )
+    
+    def prepare_deploy(self, commit=None, skip_preflight=False, force=False, started_at=None):
+        """
+        Steps 1-3 for commit (the working tree when None): verify the isbot
+        fixes, read the commit and fingerprint its build inputs. Returns
+        (commit_sha, fingerprint, outcome); outcome is None when the commit
+        should deploy, otherwise the result to report without deploying.
+        """
+        # Step 1: Verify fixes (the fleet scheduler runs this as its own stage)
+        if not skip_preflight:
+            if not self.verify_isbot_fixes(commit):
+                self.log("❌ Critical isbot fixes missing! Deployment aborted.", "ERROR")
+                return commit, None, False
+            
+            self.log("✅ All isbot fixes verified and ready!", "SUCCESS")
         
         # Step 2: Get current state
-        commit_info = self.get_latest_commit()
+        commit_info = self.get_latest_commit(commit)
         if not commit_info:
             self.log("❌ Cannot access git repository!", "ERROR")
-            return False
+            return commit, None, False
         
-        # Step 3: Try deployment methods
-        self.log("🚀 Attempting deployment with multiple methods...", "DEPLOY")
+        # Step 3: Skip deploys whose build inputs match the last successful one
+        fingerprint, unchanged = self.check_fingerprint(commit)
+        commit_sha = fingerprint.commit if fingerprint else commit_info.split()[0]
+        if unchanged and not force:
+            self.log("⏭️  Nothing to deploy: build output would be identical (use --force to redeploy)", "SUCCESS")
+            self.record_history("skipped", commit_sha, started_at or time.time(), fingerprint=fingerprint)
+            return commit_sha, fingerprint, True
+        return commit_sha, fingerprint, None
+    
+    @traced("deploy")
+    def intelligent_deployment(self, skip_preflight=False, force=False):
+        """Execute intelligent deployment with multiple fallback methods"""
+        self.log("🤖 Starting Smart Deployment Agent...", "INFO")
+        self.log("="*60, "INFO")
         
-        for i, method in enumerate(self.deployment_methods, 1):
-            self.log(f"Method {i}/{len(self.deployment_methods)}: {method.__name__}", "INFO")
-            
+        started_at = time.time()
+        commit_sha, fingerprint, outcome = self.prepare_deploy(None, skip_preflight, force, started_at)
+        if outcome is not None:
+            return outcome
+        
+        # Step 4: Take the project's deploy slot; newer requests queue behind it
+        deploy_queue = DeployQueue(self.project_path, self.project_name)
+        submission = deploy_queue.submit(commit_sha, source="smart-deploy")
+        if submission.status != CLAIMED:
+            replaced = f", replacing pending {submission.superseded[:9]}" if submission.superseded else ""
+            self.log(
+                f"⏳ Deploy of {submission.active[:9]} in progress: {commit_sha[:9]} {submission.status}{replaced}",
+                "DEPLOY",
+                queue=submission.status,
+                active=submission.active
+            )
+            return True
+        
+        ticket = submission.ticket
+        handed_over = False
+        while ticket:
+            self.deploy_queue = deploy_queue
             try:
-                if method():
-                    self.log(f"🎉 Deployment successful using {method.__name__}!", "SUCCESS")
-                    self.log("="*60, "SUCCESS")
-                    self.monitor_deployment_status()
-                    return True
-                else:
-                    self.log(f"Method {i} failed, trying next method...", "WARNING")
-                    
-            except Exception as e:
-                self.log(f"Method {i} error: {e}", "ERROR")
-                continue
+                if handed_over:
+                    # finish() claimed the queued commit for us, wherever it came
+                    # from: verify and deploy exactly that commit, not HEAD
+                    self.log(f"⏭️  Newer commit {ticket.commit[:9]} queued; deploying it next", "DEPLOY")
+                    started_at = time.time()
+                    _, fingerprint, outcome = self.prepare_deploy(ticket.commit, False, force, started_at)
+                if outcome is None:
+                    outcome = self.run_deployment_methods(ticket, started_at, fingerprint)
+            finally:
+                self.deploy_queue = None
+                ticket = deploy_queue.finish(ticket)
+            handed_over = True
+        return outcome
+    
+    def run_deployment_methods(self, ticket, started_at, fingerprint):
+        """Step 5: run the deployment methods for a claimed commit"""
+        commit_sha = ticket.commit
+        self.fingerprint = fingerprint
+        self.deploy_ticket = ticket
+        self.deployed_commit = commit_sha
+        self.triggered_at = time.time()
+        self.provider_deployment = None
+        self.deployment_id = self.deployment_url = None
+        self.log("🚀 Attempting deployment with multiple methods...", "DEPLOY")
         
-        self.log("❌ All automated methods failed. Manual intervention required.", "ERROR")
-        return False
+        history = open_history(self.project_path)
+        try:
+            methods = adaptive_order(self.deployment_methods, history, self.project_name, self.log)
+        finally:
+            if history:
+                history.close()
+        
+        executor = DeploymentExecutor(
+            methods,
+            policy=self.policy,
+            hedge_delay=self.hedge_delay,
+            fallbacks=self.fallback_methods,
+            log=self.log,
+            # A newer commit makes this build worthless: stop it and deploy that one
+            cancel_when=lambda: "superseded by a newer commit" if self.deploy_queue.superseded(ticket) else None
+        )
+        report = executor.run()
+        
+        for line in format_outcomes(report):
+            self.log(line, "INFO")
+        
+        if report.cancelled:
+            self.record_history("superseded", commit_sha, started_at, report, fingerprint)
+            self.log(f"⏹️  Deploy of {commit_sha[:9]} cancelled: {report.cancelled}", "WARNING",
+                     execution=report.to_dict())
+            return False
+        
+        if not report.success:
+            self.record_history("failed", commit_sha, started_at, report, fingerprint)
+            self.log("❌ All automated methods failed. Manual intervention required.", "ERROR",
+                     execution=report.to_dict())
+            return False
+        
+        # Manual instructions deploy nothing: not a deploy to monitor, probe or roll back to
+        fallbacks = [method.__name__ for method in self.fallback_methods]
+        if report.winner in fallbacks:
+            self.record_history("manual", commit_sha, started_at, report, fingerprint)
+            self.log(f"📋 No automated method deployed {commit_sha[:9]}; follow the manual steps above",
+                     "WARNING", execution=report.to_dict())
+            return True
+        
+        self.log(f"🎉 Deployment successful using {report.winner}!", "SUCCESS",
+                 execution=report.to_dict())
+        self.log("="*60, "SUCCESS")
+        self.monitor_deployment_status()
+        
+        # A deploy that serves errors or regressed latency is not a good deploy
+        probe = self.probe_deployment(commit_sha)
+        healthy = probe is None or probe.passed
+        details = {"probe": probe.to_dict()} if probe else {}
+        if self.deployment_id:
+            # Lets a later rollback promote this deployment instead of rebuilding it
+            details.update(deployment_details(self.provider.name if self.provider else "vercel",
+                                              self.deployment_id, self.deployment_url))
+        self.record_history(
+            "success" if healthy else "unhealthy", commit_sha, started_at, report, fingerprint,
+            details=details or None
+        )
+        if healthy and fingerprint:
+            FingerprintStore(self.project_path).record(
+                self.project_name, fingerprint, report.winner
+            )
+        if not healthy and self.auto_rollback:
+            self.log("Post-deploy checks failed; rolling back to the last healthy deploy", "WARNING")
+            self.rollback(exclude_commit=commit_sha)
+        return healthy
     
+    @traced("rollback")
+    def rollback(self, exclude_commit=None, to_commit=None):
+        """Promote the last healthy deployment (or its cached build) without rebuilding"""
+        self.log("⏪ Rolling back to the last known-good deployment...", "DEPLOY")
+        provider = self.provider or create_provider("vercel", self.project_path,
+                                                    project_id=self.vercel_project_id)
+        result = Rollback(self.project_path, self.project_name, provider, self.build_cache,
+                          log=self.log).run(exclude_commit=exclude_commit, to_commit=to_commit)
+        self.log(format_rollback(result), "SUCCESS" if result.ok else "ERROR", rollback=result.to_dict())
+        return result
+    
+    @traced()
     def monitor_deployment_status(self):
         """Monitor deployment progress"""
         self.log("👀 Monitoring deployment status...", "CHECK")
         
-        print("""
+        # The provider method already followed its deployment to the end
+        if self.provider_deployment:
+            self.log(f"Deployment {self.provider_deployment.state} on {self.provider.name}", "SUCCESS")
+            return self.provider_deployment.ready
+        
+        project_id = self.vercel_project_id
+        if os.environ.get("VERCEL_TOKEN") and project_id:
+            try:
+                from deploy_tools.vercel_status import poll_deployment
+                
+                # Follow this deploy's build, not whatever production deployment is newest
+                result = poll_deployment(
+                    project_id,
+                    on_transition=lambda t: self.log(
+                        f"Deployment {t.deployment_id}: {t.previous or 'START'} → {t.state}", "CHECK"
+                    ),
+                    commit_sha=self.deployed_commit,
+                    since=self.triggered_at
+                )
+                if result.deployment_id is None:
+                    self.log(f"No deployment of {(self.deployed_commit or '?')[:9]} registered "
+                             f"after {result.elapsed_s:.0f}s", "ERROR")
+                    return False
+                self.deployment_url = result.url
+                self.deployment_id = result.deployment_id
+                level = "SUCCESS" if result.ready else "ERROR"
+                self.log(
+                    f"Deployment {result.state} after {result.elapsed_s:.0f}s "
+                    f"({result.requests} API requests, {result.not_modified} not modified)",
+                    level
+                )
+                return result.ready
+            except Exception as e:
+                self.log(f"Status polling unavailable: {e}", "WARNING")
+        
+        self.log("""
 🔍 MONITORING GUIDE:
 
 1. Check Vercel Dashboard for deployment progress:
@@ -298,23 +656,255 @@ class SmartDeploymentAgent:
    - Memory allocation sufficient for build
 
 💡 The isbot fixes should resolve the global property assignment error!
-        """)
+        """, "RAW")
+        return None
+    
+    @traced("probe")
+    def probe_deployment(self, commit_sha=None):
+        """Health and latency probe of the deployed site; None when there is no URL"""
+        base_url = os.environ.get("DEPLOY_PROBE_URL") or (
+            f"https://{self.deployment_url}" if self.deployment_url else None
+        )
+        if not base_url:
+            self.log("No deployment URL to probe (set DEPLOY_PROBE_URL)", "INFO")
+            return None
+        
+        from deploy_tools.probe import format_probe_report, probe_deployment
+        
+        report = probe_deployment(base_url, self.project_path, self.project_name, commit_sha)
+        self.log(
+            "\n".join(format_probe_report(report)),
+            "SUCCESS" if report.passed else "ERROR",
+            probe=report.to_dict()
+        )
+        return report
+    
+    @traced("build_profile")
+    def profile_build(self, apply=False):
+        """Build locally under memory sampling and size NODE_OPTIONS from the peak"""
+        from deploy_tools.build_profile import BuildProfiler, apply_heap, format_profile, save_profile
+        
+        self.log("📏 Profiling build memory...", "BUILD")
+        profile = BuildProfiler(self.project_path).run()
+        path = save_profile(self.project_path, profile)
+        self.log(
+            "\n".join(format_profile(profile)),
+            "SUCCESS" if profile.passed else "ERROR",
+            build_profile=profile.to_dict(),
+            path=str(path)
+        )
+        if apply and profile.returncode == 0 and profile.fits_machine and profile.peak_node_rss_mb:
+            node_options = apply_heap(self.project_path, profile.recommended_heap_mb)
+            self.log(f"vercel.json NODE_OPTIONS → {node_options}", "SUCCESS", node_options=node_options)
+        return profile
+    
+    @traced("docker_build")
+    def docker_build(self, tag=None):
+        """Build the app image from a generated multi-stage Dockerfile with a local BuildKit cache"""
+        from deploy_tools.docker_build import DockerImageBuilder, format_build, record_report
+        
+        self.log("🐳 Building Docker image (BuildKit cache in .deploy-cache)...", "BUILD")
+        result = DockerImageBuilder(self.project_path, tag, log=self.log).run()
+        previous = record_report(self.project_path, result)
+        self.log(
+            "\n".join(format_build(result, previous)),
+            "SUCCESS" if result.ok else "ERROR",
+            docker_build=result.to_dict()
+        )
+        return result
+
+
+def fleet_deployment(manifest_path, workers=None, force=False):
+    """Preflight and deploy every project listed in a fleet manifest"""
+    manifest = load_manifest(manifest_path)
+    if workers:
+        manifest.workers = workers
+    
+    # Sites that can go to several providers deploy to the fastest or cheapest
+    for project in manifest.projects:
+        candidates = project.options.get("providers")
+        if not candidates:
+            continue
+        unknown = [kind for kind in candidates if kind not in PROVIDERS]
+        if unknown:
+            log(f"[{project.name}] unknown providers {', '.join(unknown)}", "ERROR")
+            return False
+        history = open_history(project.path)
+        try:
+            project.provider = choose_provider(
+                candidates, project.options.get("prefer", "fastest"), history, project.name,
+                project.options.get("provider_costs")
+            )
+        finally:
+            if history:
+                history.close()
+        log(f"[{project.name}] deploying to {project.provider} "
+            f"({project.options.get('prefer', 'fastest')} of {', '.join(candidates)})", "INFO")
+    
+    def build_agent(project):
+        # Vercel sites keep the hook/CLI methods unless they pick among providers
+        use_backend = project.provider != "vercel" or project.options.get("providers")
+        agent = SmartDeploymentAgent(
+            project.path,
+            policy=project.options.get("policy"),
+            hedge_delay=project.options.get("hedge_delay"),
+            vercel_project_id=project.options.get("vercel_project_id"),
+            project_name=project.name,
+            deploy_hook_url=project.options.get("deploy_hook_url"),
+            provider=project.provider if use_backend else None,
+            provider_options=project.options.get("provider_options", {}).get(project.provider),
+            auto_rollback=project.options.get("auto_rollback")
+        )
+        # Printing manual instructions for dozens of sites helps nobody
+        agent.fallback_methods = []
+        return agent
+    
+    scheduler = FleetScheduler(
+        manifest,
+        preflight=lambda project: build_agent(project).verify_isbot_fixes(),
+        deploy=lambda project: build_agent(project).intelligent_deployment(skip_preflight=True, force=force)
+    )
+    results = scheduler.run()
+    
+    log("\n".join(format_results(results)), "RAW", results=[
+        {"project": r.project.name, "provider": r.project.provider, "status": r.status,
+         "preflight_s": r.preflight_s, "queued_s": r.queued_s, "deploy_s": r.deploy_s}
+        for r in results
+    ])
+    return all(result.status == "deployed" for result in results)
+
+
+def watch_deployment(project_path=DEFAULT_PROJECT_PATH, force=False, debounce=None):
+    """
+    Deploy whenever the checked-out branch moves. Ref changes are watched
+    with inotify (or a stat poller), debounced, and queued; commits that
+    arrive while a deploy runs are coalesced into one deploy of the tip.
+    """
+    agent = SmartDeploymentAgent(project_path)
+    watcher = RefWatcher(project_path, debounce=debounce or float(os.environ.get("DEPLOY_WATCH_DEBOUNCE", 2)))
+    events = queue.Queue()
+    
+    def produce():
+        for event in watcher.events():
+            # Mid-deploy, a new commit goes to the persistent queue so the
+            # running build is cancelled and the tip deploys next
+            deploy_queue = agent.deploy_queue
+            if deploy_queue and event.new and event.new not in agent.synthetic_commits:
+                deploy_queue.submit(event.new, source="watch")
+            events.put(event)
+    
+    threading.Thread(target=produce, name="ref-watcher", daemon=True).start()
+    log(f"👀 Watching {project_path} for new commits ({watcher.mode})", "RAW")
+    deployed_tip = None
+    try:
+        while True:
+            event = events.get()
+            # Anything queued during the last deploy is superseded by the newest event
+            while True:
+                try:
+                    event = events.get_nowait()
+                except queue.Empty:
+                    break
+            if event.new is None or event.new == deployed_tip or event.new in agent.synthetic_commits:
+                # Our own webhook trigger commit, or a deleted branch
+                continue
+            agent.log(
+                f"New commit on {event.ref}: {(event.old or '-')[:9]} → {event.new[:9]}",
+                "DEPLOY",
+                ref=event.ref,
+                old=event.old,
+                new=event.new,
+                latency_ms=round((time.time() - event.at) * 1000, 1)
+            )
+            agent.intelligent_deployment(force=force)
+            gitdir = git_dir(project_path)
+            deployed_tip = read_refs(gitdir).get(head_ref(gitdir))
+    except KeyboardInterrupt:
+        log("Stopped watching", "INFO")
+    finally:
+        watcher.close()
+    return 0
 
 
 def main():
     """Main execution function"""
-    print("🤖 Smart Deployment Agent for Webstudio")
-    print("🎯 Mission: Deploy with comprehensive isbot fixes")
-    print("=" * 60)
+    parser = argparse.ArgumentParser(description="Smart Deployment Agent for Webstudio")
+    parser.add_argument("--fleet", metavar="MANIFEST", help="Deploy every project in a JSON fleet manifest")
+    parser.add_argument("--workers", type=int, help="Fleet worker pool size")
+    parser.add_argument("--force", action="store_true", help="Deploy even if build inputs are unchanged")
+    parser.add_argument("--watch", action="store_true", help="Keep running and deploy each new commit")
+    parser.add_argument("--debounce", type=float, help="Seconds of quiet before a burst of commits deploys")
+    parser.add_argument("--provider", choices=list(PROVIDERS), default=os.environ.get("DEPLOY_PROVIDER"),
+                        help="Deploy through a provider backend instead of the Vercel hook/CLI methods")
+    parser.add_argument("--prebuilt", action="store_true",
+                        help="Build locally and upload the output, reusing cached build outputs")
+    parser.add_argument("--profile-build", action="store_true",
+                        help="Build locally, report peak memory per package and recommend a heap size")
+    parser.add_argument("--apply-heap", action="store_true",
+                        help="With --profile-build, write the recommended heap to vercel.json")
+    parser.add_argument("--docker-build", metavar="TAG", nargs="?", const="",
+                        help="Build the builder image with a cache-friendly multi-stage Dockerfile")
+    parser.add_argument("--rollback", metavar="SHA", nargs="?", const="",
+                        help="Promote the last healthy deploy (or the given healthy commit) without rebuilding")
+    parser.add_argument("--auto-rollback", action="store_true",
+                        help="Roll back automatically when post-deploy checks fail")
+    parser.add_argument("--log-json", metavar="PATH", help="Write JSON-lines events to PATH ('-' for stdout)")
+    parser.add_argument("--quiet", action="store_true", help="Disable the human-readable emoji output")
+    parser.add_argument("--trace", metavar="PATH", nargs="?", const="",
+                        default=os.environ.get("DEPLOY_TRACE"),
+                        help="Record phase timings as an OTLP/JSON trace (default under .deploy-cache/traces)")
+    args = parser.parse_args()
+    configure(json_path=args.log_json, human=False if args.quiet else None)
+    
+    if args.trace is None:
+        return run(args)
+    
+    mode = ("fleet" if args.fleet else "watch" if args.watch else "profile" if args.profile_build
+            else "docker" if args.docker_build is not None
+            else "rollback" if args.rollback is not None else "single")
+    tracer = start_trace(mode=mode)
+    try:
+        return run(args)
+    finally:
+        stop_trace()
+        path = tracer.export(args.trace or default_trace_path(DEFAULT_PROJECT_PATH, tracer))
+        log("\n".join(tracer.summary()), "RAW")
+        log(f"Trace written to {path}", "INFO", trace_id=tracer.trace_id)
+
+
+def run(args):
+    """Run the deployment selected on the command line"""
+    if args.fleet:
+        log(f"🤖 Smart Deployment Agent: fleet mode ({args.fleet})", "RAW")
+        log("=" * 60, "RAW")
+        return 0 if fleet_deployment(args.fleet, args.workers, args.force) else 1
+    
+    if args.watch:
+        return watch_deployment(force=args.force, debounce=args.debounce)
+    
+    if args.profile_build:
+        return 0 if SmartDeploymentAgent().profile_build(apply=args.apply_heap).passed else 1
+    
+    if args.docker_build is not None:
+        return 0 if SmartDeploymentAgent().docker_build(args.docker_build or None).ok else 1
+    
+    if args.rollback is not None:
+        agent = SmartDeploymentAgent(provider=args.provider)
+        return 0 if agent.rollback(to_commit=args.rollback or None).ok else 1
+    
+    log("🤖 Smart Deployment Agent for Webstudio", "RAW")
+    log("🎯 Mission: Deploy with comprehensive isbot fixes", "RAW")
+    log("=" * 60, "RAW")
     
-    agent = SmartDeploymentAgent()
-    success = agent.intelligent_deployment()
+    agent = SmartDeploymentAgent(prebuilt=args.prebuilt or None, provider=args.provider,
+                                 auto_rollback=args.auto_rollback or None)
+    success = agent.intelligent_deployment(force=args.force)
     
     if success:
-        print("\n🎉 Smart deployment automation completed successfully!")
+        log("\n🎉 Smart deployment automation completed successfully!", "RAW", success=True)
         return 0
     else:
-        print("\n❌ Smart deployment automation requires manual intervention.")
+        log("\n❌ Smart deployment automation requires manual intervention.", "RAW", success=False)
         return 1
 
 